@@ -0,0 +1,84 @@
+"""Evaluates the compute saved and the positives missed by the cascade at several floors.
+
+Every head is run on every text once. Each floor is then evaluated offline, as
+the cascade only decides which texts the other heads skip. A text is a positive
+of a head if its label is 1, given a CSV with Jigsaw label columns, or else if
+the full model of the head, the teacher, judges it so. Compute saved is the
+fraction of the tokens the other heads do not score.
+
+Run from the repository root with ``python -m benchmarks.cascade``.
+
+"""
+import click
+
+import numpy as np
+
+import pandas as pd
+
+from benchmarks.corpus import tweets
+from youtoxic.app.config import Config
+from youtoxic.app.services.pipeline import Pipeline
+
+# The Jigsaw label column of each head.
+LABELS = {
+    "toxicity": "toxic",
+    "insult": "insult",
+    "obscenity": "obscene",
+    "identity": "identity_hate",
+}
+
+
+@click.command()
+@click.option("--corpus", default=None, help="CSV file, synthetic tweets if not given")
+@click.option("--text-column", default="comment_text", help="column of the texts")
+@click.option("--floors", default="0.01,0.02,0.05,0.1,0.2,0.3", help="comma separated")
+@click.option("--threshold", default=0.5, help="teacher threshold for positives")
+def main(corpus, text_column, floors, threshold):
+    config = Config()
+    config.cascade_floor = 0
+    config.prediction_cache_entries = 0
+    pipeline = Pipeline(threshold, config)
+    if corpus:
+        df = pd.read_csv(corpus)
+        texts = df[text_column].astype(str).tolist()
+    else:
+        df, texts = pd.DataFrame(), tweets(2000)
+
+    others = [head for head in pipeline.heads.enabled if head != "toxicity"]
+    heads = ["toxicity"] + others
+    indices, positions, _ = looked_up = pipeline.lookup(texts)
+    preds = pipeline.predict_looked_up_ulm(len(texts), looked_up, heads)
+    # The tokens each distinct text costs every other head.
+    lengths = np.zeros(len(texts))
+    for group, length in zip(indices, positions[1]):
+        lengths[group[0]] = length
+    toxicity = np.array(preds["toxicity"][0], dtype=float)
+    positives = dict()
+    for head in heads[1:]:
+        if LABELS[head] in df:
+            positives[head] = df[LABELS[head]].values == 1
+        else:
+            positives[head] = np.array(preds[head][0], dtype=float) > threshold
+
+    click.echo(
+        "{:>6} {:>8} {:>8} {:>8}".format("floor", "passed", "saved", "overall")
+        + "".join(" {:>16}".format(head + " missed") for head in heads[1:])
+    )
+    for floor in [float(f) for f in floors.split(",")]:
+        gated = toxicity < floor
+        saved = lengths[gated].sum() / lengths.sum()
+        row = "{:>6.2f} {:>8.1%} {:>8.1%} {:>8.1%}".format(
+            floor,
+            1 - gated[lengths > 0].mean(),
+            saved,
+            saved * (len(heads) - 1) / len(heads),
+        )
+        for head in heads[1:]:
+            missed = (positives[head] & gated).sum()
+            row += " {:>16}".format("{} of {}".format(missed, positives[head].sum()))
+        click.echo(row)
+    pipeline.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""Builds synthetic corpora of tweet-sized and document-sized texts for the benchmarks.
+
+"""
+import random
+
+
+WORDS = (
+    "you are the worst thing I have ever SEEN on this site , honestly what a joke ! "
+    "please stop posting this stupid garbage . I love this video so much , thanks "
+    "for sharing it with everyone . @someone http://t.co/abc <br /> don't won't "
+    "isn't it's really really really good people idiot hate kill dumb nice great"
+).split()
+
+
+def make_texts(n_texts, n_words, seed=0):
+    """Returns a list of random texts built from a fixed word list.
+
+    Parameters
+    ----------
+    n_texts : int
+        The number of texts.
+    n_words : int
+        The number of words in each text.
+    seed : int
+        The random seed.
+
+    Returns
+    -------
+    list of str
+        The texts.
+
+    """
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(WORDS) for _ in range(n_words)) for _ in range(n_texts)]
+
+
+def tweets(n_texts=3240, seed=0):
+    """Returns tweet-sized texts of 20 words."""
+    return make_texts(n_texts, 20, seed)
+
+
+def documents(n_texts=200, seed=0):
+    """Returns document-sized texts of 1000 words."""
+    return make_texts(n_texts, 1000, seed)
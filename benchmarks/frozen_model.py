@@ -0,0 +1,47 @@
+"""Compares per-call latency of the trained SequentialRNN and its frozen eval-only version.
+
+Run from the repository root with ``python -m benchmarks.frozen_model``.
+
+"""
+import time
+
+import click
+
+import numpy as np
+
+import torch
+
+from benchmarks.models import trained_or_random_head
+from youtoxic.app.utils.inference_rnn import freeze_for_inference
+
+
+def latency(model, variable, repeats):
+    model(variable)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        model(variable)
+    return (time.perf_counter() - start) / repeats
+
+
+@click.command()
+@click.option("--head", default="toxicity", help="model to benchmark")
+@click.option("--repeats", default=20, help="calls per measurement")
+def main(head, repeats):
+    model, _ = trained_or_random_head(head)
+    vocab_size = model[0].encoder.weight.size(0)
+    frozen = freeze_for_inference(model)
+    rng = np.random.RandomState(0)
+    for seq_len in [20, 100, 500, 2000]:
+        ary = rng.randint(2, vocab_size, size=(seq_len, 1))
+        variable = torch.from_numpy(ary)
+        before, after = latency(model, variable, repeats), latency(frozen, variable, repeats)
+        diff = (model(variable)[0] - frozen(variable)[0]).abs().max().item()
+        click.echo(
+            "{:5d} tokens: {:8.2f} ms -> {:8.2f} ms ({:.2f}x), max abs diff {:.2e}".format(
+                seq_len, 1000 * before, 1000 * after, before / after, diff
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Compares truncated and windowed scoring of long texts with full-length scoring.
+
+Each text is scored once in full, then with the last ``--max-tokens`` tokens
+only and with windows of ``--max-tokens`` tokens aggregated by their max and
+mean, the way Pipeline does in its long text modes. Agreement is the fraction
+of the judgements that match full-length scoring.
+
+Run from the repository root with ``python -m benchmarks.long_texts``.
+
+"""
+import time
+
+import click
+
+import numpy as np
+
+import torch
+
+from benchmarks.corpus import make_texts
+from benchmarks.models import trained_or_random_head
+from youtoxic.app.utils.batching import (
+    aggregate_windows,
+    pad_batch,
+    predict_bucketed,
+    split_windows,
+)
+from youtoxic.app.utils.functions import softmax
+from youtoxic.app.utils.tokenizer import Tokenizer
+
+
+@click.command()
+@click.option("--head", default="toxicity", help="model to benchmark")
+@click.option("--n-texts", default=20, help="texts of each length")
+@click.option("--words", default="500,2000,5000", help="comma separated text lengths")
+@click.option("--max-tokens", default=1400, help="tokens kept or per window")
+@click.option("--stride", default=700, help="tokens between windows")
+@click.option("--threshold", default=0.5, help="threshold of the judgements")
+def main(head, n_texts, words, max_tokens, stride, threshold):
+    model, mappings = trained_or_random_head(head, freeze=True)
+
+    def predict(batch):
+        ary, lengths = pad_batch(batch)
+        with torch.no_grad():
+            logits = model(torch.from_numpy(ary), torch.from_numpy(lengths))[0]
+        return softmax(logits.numpy())[:, 1]
+
+    def run(encoded):
+        start = time.perf_counter()
+        results, _ = predict_bucketed(encoded, predict, 8192, 64)
+        return results, time.perf_counter() - start
+
+    click.echo(
+        "{:>6} {:>12} {:>10} {:>12} {:>10}".format(
+            "words", "mode", "seconds", "mean |diff|", "agreement"
+        )
+    )
+    for n_words in [int(n) for n in words.split(",")]:
+        texts = make_texts(n_texts, n_words, seed=n_words)
+        toks = Tokenizer().process_all(texts)
+        encoded = [[mappings[tok] for tok in tok_list] for tok_list in toks]
+        full, seconds = run(encoded)
+        rows = [("full", full, seconds)]
+        truncated, seconds = run([ids[-max_tokens:] for ids in encoded])
+        rows.append(("truncate", truncated, seconds))
+        windows, owners = split_windows(encoded, max_tokens, stride)
+        windowed, seconds = run(windows)
+        for aggregation in ("max", "mean"):
+            preds = aggregate_windows(windowed, owners, len(encoded), aggregation)
+            rows.append(("window " + aggregation, preds, seconds))
+        for mode, preds, seconds in rows:
+            click.echo(
+                "{:>6} {:>12} {:>10.2f} {:>12.4f} {:>10.1%}".format(
+                    n_words,
+                    mode,
+                    seconds,
+                    np.abs(preds - full).mean(),
+                    np.mean((preds > threshold) == (full > threshold)),
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Measures resident memory for the benchmarks.
+
+"""
+import multiprocessing
+
+from youtoxic.app.utils.memory import rss_mb  # noqa: F401
+
+
+def shared_memory_mb():
+    """Returns the resident, proportional and private memory of this process in MB.
+
+    Pages shared with other processes count fully towards the resident set size
+    of each process but are split between them in the proportional set size.
+    The private memory is what each extra process costs. All three are the
+    resident set size where /proc/self/smaps_rollup is not available.
+
+    Returns
+    -------
+    dict
+        The 'rss', 'pss' and 'private' memory in MB.
+
+    """
+    fields = dict()
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == "kB":
+                    fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    except OSError:
+        rss = rss_mb()
+        return dict(rss=rss, pss=rss, private=rss)
+    return dict(
+        rss=fields["Rss"],
+        pss=fields["Pss"],
+        private=fields["Private_Clean"] + fields["Private_Dirty"],
+    )
+
+
+def in_subprocess(func, *args):
+    """Runs func(*args) in a fresh process so that its memory is measured in isolation.
+
+    Parameters
+    ----------
+    func : callable
+        A module-level function returning a picklable result.
+
+    Returns
+    -------
+    object
+        The result of func.
+
+    """
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(1) as pool:
+        return pool.apply(func, args)
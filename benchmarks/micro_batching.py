@@ -0,0 +1,92 @@
+"""Compares per-request forwards with the cross-request MicroBatcher under concurrent load.
+
+Run from the repository root with ``python -m benchmarks.micro_batching``.
+
+"""
+import threading
+import time
+
+import click
+
+import numpy as np
+
+from benchmarks.corpus import tweets
+from benchmarks.models import score, trained_or_random_head
+from youtoxic.app.services.micro_batcher import MicroBatcher
+from youtoxic.app.utils.tokenizer import Tokenizer
+
+
+class ScoringPipeline:
+    """Predicts the toxicity head the way Pipeline does, without its model files."""
+
+    def __init__(self):
+        self.model, self.mappings = trained_or_random_head(freeze=True)
+        self.tokenizer = Tokenizer()
+
+    def predict_heads_ulm(self, texts, heads):
+        preds, _ = score(self.model, self.mappings, self.tokenizer.process_all(texts))
+        return {head: (list(preds), [None] * len(texts)) for head in heads}
+
+
+def run_clients(predict, texts, clients, interval):
+    """Sends the texts one at a time from concurrent clients and returns the latencies."""
+    latencies, lock = list(), threading.Lock()
+
+    def client(i):
+        rng = np.random.RandomState(i)
+        for text in texts[i::clients]:
+            time.sleep(rng.exponential(interval))
+            start = time.perf_counter()
+            predict([text], ["toxicity"])
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return np.array(latencies), time.perf_counter() - start
+
+
+@click.command()
+@click.option("--texts", default=600, help="texts sent in total")
+@click.option("--clients", default="1,8,32", help="comma separated concurrent clients")
+@click.option("--interval-ms", default=20.0, help="mean pause between requests")
+@click.option("--max-wait-ms", default=5.0, help="maximum batching window")
+@click.option("--max-batch", default=64, help="maximum texts in a batch")
+def main(texts, clients, interval_ms, max_wait_ms, max_batch):
+    pipeline = ScoringPipeline()
+    texts = tweets(texts)
+    click.echo(
+        "{:>7} {:>9} {:>10} {:>10} {:>10} {:>8} {:>10}".format(
+            "clients", "mode", "texts/s", "p50 ms", "p99 ms", "fill", "wait p99"
+        )
+    )
+    for n_clients in [int(n) for n in clients.split(",")]:
+        batcher = MicroBatcher(pipeline, max_batch, max_wait_ms / 1000)
+        for mode, predict in [
+            ("direct", pipeline.predict_heads_ulm),
+            ("batched", batcher.predict_heads_ulm),
+        ]:
+            latencies, seconds = run_clients(
+                predict, texts, n_clients, interval_ms / 1000
+            )
+            stats = batcher.stats() if mode == "batched" else dict()
+            click.echo(
+                "{:>7} {:>9} {:>10.0f} {:>10.2f} {:>10.2f} {:>8.1%} {:>10.2f}".format(
+                    n_clients,
+                    mode,
+                    len(latencies) / seconds,
+                    np.percentile(latencies, 50) * 1000,
+                    np.percentile(latencies, 99) * 1000,
+                    stats.get("batch_fill", 1 / max_batch),
+                    stats.get("queue_wait_ms_p99", 0.0),
+                )
+            )
+        batcher.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Builds full-size classifiers for the benchmarks, from trained weights when they are available.
+
+"""
+import collections
+import os
+
+import torch
+
+from benchmarks.corpus import WORDS
+from benchmarks.vocabulary import load_mappings
+from youtoxic.app.utils.batching import pad_batch, predict_bucketed
+from youtoxic.app.utils.functions import softmax
+from youtoxic.app.utils.inference_rnn import freeze_for_inference, quantize_for_inference
+from youtoxic.app.utils.load_files import build_model, load_model
+from youtoxic.app.utils.tokenizer import Tokenizer
+
+
+def head_filenames(head):
+    """Returns the model and mappings filenames of a head."""
+    return (
+        "youtoxic/app/models/{}_model.h5".format(head),
+        "youtoxic/app/models/{}_mappings.pkl".format(head),
+    )
+
+
+def trained_or_random_head(head="toxicity", vocab_size=60000, freeze=False, quantize=False):
+    """Returns a head's trained model and mappings, or random ones if its files are missing.
+
+    Parameters
+    ----------
+    head : str
+        One of 'toxicity', 'insult', 'obscenity' and 'identity'.
+    vocab_size : int
+        The vocabulary size of the random model.
+    freeze : bool
+        Whether to return the frozen eval-only model.
+    quantize : bool
+        Whether to return the frozen model with dynamic int8 layers.
+
+    Returns
+    -------
+    SequentialRNN or FrozenRNNClassifier
+        The classifier in eval mode.
+    defaultdict
+        The vocabulary mappings.
+
+    """
+    model_filename, mappings_filename = head_filenames(head)
+    if os.path.exists(model_filename) and os.path.exists(mappings_filename):
+        mappings = load_mappings(mappings_filename)
+        return load_model(len(mappings), model_filename, freeze, quantize), mappings
+    torch.manual_seed(0)
+    model = build_model(vocab_size)
+    model.reset()
+    model.eval()
+    if freeze or quantize:
+        model = freeze_for_inference(model)
+    if quantize:
+        model = quantize_for_inference(model)
+    toks = sorted(set(tok for toks in Tokenizer().process_all(WORDS) for tok in toks))
+    mappings = collections.defaultdict(lambda: 0, {tok: i + 2 for i, tok in enumerate(toks)})
+    return model, mappings
+
+
+def score(model, mappings, toks, token_budget=8192, batch_size=64):
+    """Scores tokenized texts with a model the way Pipeline does.
+
+    Returns
+    -------
+    ndarray
+        The prediction for each text.
+    BatchReport
+        The padding overhead and throughput of the call.
+
+    """
+    def predict(batch):
+        ary, lengths = pad_batch(batch)
+        logits = model(torch.from_numpy(ary), torch.from_numpy(lengths))[0]
+        return softmax(logits.data.numpy())[:, 1]
+
+    encoded = [[mappings[tok] for tok in tok_list] for tok_list in toks]
+    return predict_bucketed(encoded, predict, token_budget, batch_size)
@@ -0,0 +1,101 @@
+"""Compares the float and dynamic int8 versions of each head on a held-out set of texts.
+
+For each head this reports the agreement of the int8 judgements with the float
+judgements, the AUC of the int8 scores against the float judgements and, when the
+texts are labeled, the AUC drift against the labels. Speed and resident memory
+are measured for both modes in separate processes.
+
+Run from the repository root with ``python -m benchmarks.quantization``.
+
+"""
+import time
+
+import click
+
+import numpy as np
+
+import pandas as pd
+
+from sklearn.metrics import roc_auc_score
+
+from benchmarks.corpus import documents, tweets
+from benchmarks.memory import in_subprocess, rss_mb
+from benchmarks.models import score, trained_or_random_head
+from youtoxic.app.utils.tokenizer import Tokenizer
+
+
+# The label column of each head in the Jigsaw training data.
+LABEL_COLUMNS = {
+    "toxicity": "toxic",
+    "insult": "insult",
+    "obscenity": "obscene",
+    "identity": "identity_hate",
+}
+
+
+def run_mode(head, quantize, toks):
+    """Loads a head in one mode and scores the texts. Runs in its own process."""
+    before = rss_mb()
+    model, mappings = trained_or_random_head(head, freeze=True, quantize=quantize)
+    loaded = rss_mb()
+    start = time.perf_counter()
+    preds, report = score(model, mappings, toks)
+    seconds = time.perf_counter() - start
+    return preds, seconds, report.tokens_per_second, loaded - before, rss_mb() - before
+
+
+def auc(labels, preds):
+    labels = np.asarray(labels)
+    if labels.min() == labels.max():
+        return float("nan")
+    return roc_auc_score(labels, preds)
+
+
+@click.command()
+@click.option(
+    "--texts",
+    default=None,
+    help="csv file with a 'text' column and optional Jigsaw label columns",
+)
+@click.option("--heads", default="toxicity,insult,obscenity,identity", help="heads to compare")
+@click.option("--threshold", default=0.5, help="threshold of the judgements")
+def main(texts, heads, threshold):
+    if texts is None:
+        df = pd.DataFrame({"text": tweets(500) + documents(20)})
+    else:
+        df = pd.read_csv(texts)
+    df = df[df["text"].astype(str).str.split().str.len() > 0]
+    toks = Tokenizer().process_all(df["text"].astype(str).tolist())
+
+    for head in heads.split(","):
+        float_preds, float_s, float_tps, float_load, float_rss = in_subprocess(run_mode, head, False, toks)
+        int8_preds, int8_s, int8_tps, int8_load, int8_rss = in_subprocess(run_mode, head, True, toks)
+        float_labels = float_preds > threshold
+        click.echo("{} ({} texts)".format(head, len(toks)))
+        click.echo(
+            "  time      float {:8.2f} s   int8 {:8.2f} s   ({:.2f}x)".format(
+                float_s, int8_s, float_s / int8_s
+            )
+        )
+        click.echo("  tokens/s  float {:8.0f}     int8 {:8.0f}".format(float_tps, int8_tps))
+        click.echo("  load RSS  float {:8.1f} MB  int8 {:8.1f} MB".format(float_load, int8_load))
+        click.echo("  peak RSS  float {:8.1f} MB  int8 {:8.1f} MB".format(float_rss, int8_rss))
+        click.echo(
+            "  agreement {:.4f}, max abs diff {:.4f}, AUC vs float judgements {:.4f}".format(
+                np.mean(float_labels == (int8_preds > threshold)),
+                np.abs(float_preds - int8_preds).max(),
+                auc(float_labels, int8_preds),
+            )
+        )
+        column = LABEL_COLUMNS[head]
+        if column in df:
+            float_auc, int8_auc = auc(df[column], float_preds), auc(df[column], int8_preds)
+            click.echo(
+                "  label AUC float {:.4f}, int8 {:.4f}, drift {:+.4f}".format(
+                    float_auc, int8_auc, int8_auc - float_auc
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
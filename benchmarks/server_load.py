@@ -0,0 +1,138 @@
+"""Load tests the Flask development server against the pre-forking production server.
+
+Both servers serve a small Flask app that scores the text of each request with
+a head's model, which is loaded before the servers start. Each concurrent user
+sends requests one after another for ``--seconds`` seconds.
+
+Run from the repository root with ``python -m benchmarks.server_load``.
+
+"""
+import json
+import multiprocessing
+import socket
+import threading
+import time
+import urllib.parse
+import urllib.request
+
+import click
+
+import numpy as np
+
+import torch
+
+from flask import Flask, request
+
+from benchmarks.corpus import tweets
+from benchmarks.models import score, trained_or_random_head
+from youtoxic.app.services.server import PreforkServer
+from youtoxic.app.utils.tokenizer import Tokenizer
+
+
+def scoring_app(head):
+    """Returns a Flask app that scores the text query argument with a loaded model."""
+    model, mappings = trained_or_random_head(head, freeze=True)
+    tokenizer = Tokenizer()
+    app = Flask(__name__)
+
+    @app.route("/score")
+    def score_text():
+        toks = tokenizer.process_all([request.args["text"]])
+        preds, _ = score(model, mappings, toks)
+        return json.dumps({head: float(preds[0])})
+
+    return app
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def run_dev_server(app, port):
+    torch.set_num_threads(1)
+    app.run(host="127.0.0.1", port=port)
+
+
+def load(url, users, seconds, texts):
+    """Returns the latency of every request sent by concurrent users."""
+    latencies, lock = list(), threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def user(index):
+        i = index
+        while time.perf_counter() < deadline:
+            query = urllib.parse.urlencode({"text": texts[i % len(texts)]})
+            start = time.perf_counter()
+            with urllib.request.urlopen(url + "?" + query, timeout=600) as response:
+                response.read()
+            with lock:
+                latencies.append(time.perf_counter() - start)
+            i += users
+
+    threads = [threading.Thread(target=user, args=(i,)) for i in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return np.array(latencies)
+
+
+def wait_until_up(url, texts):
+    for _ in range(600):
+        try:
+            return load(url, 1, 0.01, texts)
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("The server did not start: {}".format(url))
+
+
+@click.command()
+@click.option("--head", default="toxicity", help="model to serve")
+@click.option("--users", default="1,4,16", help="comma separated concurrent users")
+@click.option("--seconds", default=20.0, help="duration of each load test")
+@click.option("--workers", default=2, help="worker processes of the production server")
+@click.option("--threads", default=4, help="threads per worker of the production server")
+def main(head, users, seconds, workers, threads):
+    app = scoring_app(head)
+    texts = tweets(500)
+    context = multiprocessing.get_context("fork")
+    click.echo(
+        "{:>11} {:>6} {:>10} {:>10} {:>10}".format(
+            "server", "users", "req/s", "p50 ms", "p99 ms"
+        )
+    )
+    for name in ("dev", "production"):
+        if name == "dev":
+            port = free_port()
+            process = context.Process(target=run_dev_server, args=(app, port))
+        else:
+            torch.set_num_threads(1)
+            server = PreforkServer(app, "127.0.0.1", 0, workers, threads, 0, 600)
+            port = server.bind()[1]
+            process = context.Process(target=server.run)
+        process.start()
+        url = "http://127.0.0.1:{}/score".format(port)
+        try:
+            wait_until_up(url, texts)
+            for n_users in [int(n) for n in users.split(",")]:
+                latencies = load(url, n_users, seconds, texts)
+                click.echo(
+                    "{:>11} {:>6} {:>10.1f} {:>10.1f} {:>10.1f}".format(
+                        name,
+                        n_users,
+                        len(latencies) / seconds,
+                        1000 * np.percentile(latencies, 50),
+                        1000 * np.percentile(latencies, 99),
+                    )
+                )
+        finally:
+            process.terminate()
+            process.join()
+        if name == "production":
+            server.socket.close()
+
+
+if __name__ == "__main__":
+    main()
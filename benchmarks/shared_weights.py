@@ -0,0 +1,118 @@
+"""Compares startup time and memory of worker processes loading pickled or memory-mapped weights.
+
+Each worker loads the frozen model of a head, scores a batch and then waits until
+all workers are loaded, so the memory is measured while the workers run side by
+side. With memory-mapped weights the workers share one copy of the weights
+through the page cache, which shows in their proportional and private memory.
+Quantized workers are also measured, with ``--quantize``. They share only the
+mapped embeddings, since each builds its own int8 LSTM and linear weights.
+
+Run from the repository root with ``python -m benchmarks.shared_weights``.
+
+"""
+import multiprocessing
+import os
+import tempfile
+import time
+
+import click
+
+import numpy as np
+
+import torch
+
+from benchmarks.memory import shared_memory_mb
+from benchmarks.models import head_filenames
+from benchmarks.vocabulary import load_mappings
+from youtoxic.app.utils.batching import pad_batch
+from youtoxic.app.utils.load_files import build_model, convert_weights, load_model
+
+
+def trained_or_random_weights(head, directory, vocab_size=60000):
+    """Returns a head's trained weights file, or saves random weights if it is missing.
+
+    Returns
+    -------
+    str
+        The weights file.
+    int
+        The vocabulary size of the model.
+
+    """
+    model_filename, mappings_filename = head_filenames(head)
+    if os.path.exists(model_filename) and os.path.exists(mappings_filename):
+        return model_filename, len(load_mappings(mappings_filename))
+    torch.manual_seed(0)
+    filename = os.path.join(directory, "{}_model.h5".format(head))
+    torch.save(build_model(vocab_size).state_dict(), filename)
+    return filename, vocab_size
+
+
+def worker(filename, vocab_size, mmap, quantize, barrier, results):
+    """Loads a model, scores a batch and reports once all workers are loaded."""
+    torch.set_num_threads(1)
+    start = time.perf_counter()
+    model = load_model(vocab_size, filename, freeze=True, quantize=quantize, mmap=mmap)
+    rng = np.random.RandomState(0)
+    ary, lengths = pad_batch([list(rng.randint(2, vocab_size, size=n)) for n in (20, 60, 200)])
+    model(torch.from_numpy(ary), torch.from_numpy(lengths))
+    seconds = time.perf_counter() - start
+    barrier.wait()
+    results.put((seconds, shared_memory_mb()))
+    barrier.wait()
+
+
+def run_workers(n_workers, filename, vocab_size, mmap, quantize):
+    """Starts the workers and returns their load times and memory."""
+    ctx = multiprocessing.get_context("spawn")
+    barrier, results = ctx.Barrier(n_workers), ctx.Queue()
+    args = (filename, vocab_size, mmap, quantize, barrier, results)
+    processes = [ctx.Process(target=worker, args=args) for _ in range(n_workers)]
+    for process in processes:
+        process.start()
+    reports = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return reports
+
+
+@click.command()
+@click.option("--head", default="toxicity", help="head to load")
+@click.option("--workers", default="1,4,8", help="comma separated numbers of workers")
+@click.option("--quantize", is_flag=True, help="also measure int8 quantized models")
+def main(head, workers, quantize):
+    with tempfile.TemporaryDirectory() as directory:
+        filename, vocab_size = trained_or_random_weights(head, directory)
+        start = time.perf_counter()
+        convert_weights(vocab_size, filename)
+        click.echo("one-time conversion {:.2f} s".format(time.perf_counter() - start))
+        click.echo(
+            "{:>7} {:>11} {:>10} {:>10} {:>10} {:>10} {:>11}".format(
+                "workers", "weights", "load s", "RSS MB", "PSS MB", "private MB", "total PSS"
+            )
+        )
+        modes = [(False, False), (True, False)]
+        if quantize:
+            modes += [(False, True), (True, True)]
+        for n_workers in [int(n) for n in workers.split(",")]:
+            for mmap, quantized in modes:
+                reports = run_workers(n_workers, filename, vocab_size, mmap, quantized)
+                seconds = np.mean([s for s, _ in reports])
+                memory = {
+                    key: np.mean([m[key] for _, m in reports]) for key in ("rss", "pss", "private")
+                }
+                click.echo(
+                    "{:>7} {:>11} {:>10.2f} {:>10.1f} {:>10.1f} {:>10.1f} {:>11.1f}".format(
+                        n_workers,
+                        ("mmap" if mmap else "pickle") + (" int8" if quantized else ""),
+                        seconds,
+                        memory["rss"],
+                        memory["pss"],
+                        memory["private"],
+                        memory["pss"] * n_workers,
+                    )
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Compares the peak memory of whole-sequence and streamed scoring of long batches.
+
+Each measurement runs in a fresh process. The trained SequentialRNN keeps the
+outputs of every layer for every bptt chunk, the frozen model runs each layer
+over the whole sequence and the streamed frozen model runs all the layers over
+``--chunk-size`` tokens at a time, keeping only the running pools. The peak is
+the growth of the peak resident set size over the resident set size of the
+loaded model.
+
+Run from the repository root with ``python -m benchmarks.streaming_pool``.
+
+"""
+import resource
+import sys
+import time
+
+import click
+
+import numpy as np
+
+import torch
+
+from benchmarks.memory import in_subprocess, rss_mb
+from benchmarks.models import trained_or_random_head
+
+
+def reset_peak():
+    """Resets the peak resident set size of this process where Linux allows it."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def peak_mb():
+    """Returns the peak resident set size of this process in MB."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kB elsewhere.
+    return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024
+
+
+def measure(head, mode, seq_len, batch_size, chunk_size):
+    """Returns the peak memory growth in MB and the seconds of scoring one batch."""
+    torch.set_num_threads(1)
+    model, _ = trained_or_random_head(head, freeze=mode != "sequential")
+    if mode == "streamed":
+        model.chunk_size = chunk_size
+    vocab_size = (model[0] if mode == "sequential" else model).encoder.weight.size(0)
+    rng = np.random.RandomState(0)
+    ary = rng.randint(2, vocab_size, size=(seq_len, batch_size))
+    lengths = np.full(batch_size, seq_len)
+    with torch.no_grad():
+        # Warms up on a short batch so that one-off allocations are not counted.
+        model(torch.from_numpy(ary[:10]), torch.from_numpy(np.full(batch_size, 10)))
+        if mode == "sequential":
+            model.reset()
+        reset_peak()
+        baseline = max(rss_mb(), peak_mb())
+        start = time.perf_counter()
+        logits = model(torch.from_numpy(ary), torch.from_numpy(lengths))[0]
+        seconds = time.perf_counter() - start
+    return peak_mb() - baseline, seconds, logits.numpy()
+
+
+@click.command()
+@click.option("--head", default="toxicity", help="model to benchmark")
+@click.option("--lengths", default="500,2000,8000", help="comma separated lengths")
+@click.option("--batch-size", default=8, help="texts in the batch")
+@click.option("--chunk-size", default=280, help="tokens streamed at a time")
+def main(head, lengths, batch_size, chunk_size):
+    click.echo(
+        "{:>7} {:>10} {:>10} {:>10} {:>14}".format(
+            "tokens", "mode", "peak MB", "seconds", "max abs diff"
+        )
+    )
+    for seq_len in [int(n) for n in lengths.split(",")]:
+        results = dict()
+        for mode in ("sequential", "frozen", "streamed"):
+            results[mode] = in_subprocess(
+                measure, head, mode, seq_len, batch_size, chunk_size
+            )
+        for mode, (peak, seconds, logits) in results.items():
+            diff = np.abs(logits - results["sequential"][2]).max()
+            click.echo(
+                "{:>7} {:>10} {:>10.1f} {:>10.2f} {:>14.2e}".format(
+                    seq_len, mode, peak, seconds, diff
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
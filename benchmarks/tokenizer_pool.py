@@ -0,0 +1,50 @@
+"""Compares per-call fastai tokenization with the persistent TokenizerPool used by Pipeline.
+
+Run from the repository root with ``python -m benchmarks.tokenizer_pool``.
+
+"""
+import time
+
+import click
+
+from fastai.text.transform import Tokenizer as FastaiTokenizer
+
+from benchmarks.corpus import documents, tweets
+from youtoxic.app.services.tokenizer_pool import TokenizerPool
+from youtoxic.app.utils.tokenizer import Tokenizer
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+@click.command()
+@click.option("--workers", default=4, help="tokenizer worker processes")
+@click.option("--chunk-size", default=256, help="texts sent to a worker at once")
+def main(workers, chunk_size):
+    per_call = FastaiTokenizer(n_cpus=workers)
+    pool = TokenizerPool(Tokenizer(), workers, chunk_size)
+    pool.process_all(tweets(chunk_size + 1))  # start the workers
+
+    for name, texts in [("tweets", tweets()), ("documents", documents())]:
+        one_by_one = timed(lambda: [per_call.process_all([t]) for t in texts[:200]])
+        pooled_one_by_one = timed(lambda: [pool.process_all([t]) for t in texts[:200]])
+        whole = timed(per_call.process_all, texts)
+        pooled_whole = timed(pool.process_all, texts)
+        click.echo(
+            "{:<10} single text: {:8.2f} ms -> {:8.2f} ms | batch of {}: {:8.2f} s -> {:8.2f} s".format(
+                name,
+                1000 * one_by_one / 200,
+                1000 * pooled_one_by_one / 200,
+                len(texts),
+                whole,
+                pooled_whole,
+            )
+        )
+    pool.close()
+
+
+if __name__ == "__main__":
+    main()
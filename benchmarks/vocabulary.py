@@ -0,0 +1,139 @@
+"""Compares the defaultdict mappings with the compact vocabularies used by Pipeline.
+
+Reports the resident memory and load time of the vocabularies of all heads, the
+encode throughput of one head and of all heads together, and how many entries the
+mappings gain from unknown tokens. Each kind of vocabulary is measured in its own
+process. Heads without a mappings file get a synthetic vocabulary.
+
+Run from the repository root with ``python -m benchmarks.vocabulary``.
+
+"""
+import collections
+import os
+import pickle
+import tempfile
+import time
+from pathlib import Path
+
+import click
+
+import numpy as np
+
+from benchmarks.memory import in_subprocess, rss_mb
+from youtoxic.app.utils.load_files import convert_mappings
+from youtoxic.app.utils.vocabulary import load_vocabularies
+
+HEADS = ("toxicity", "insult", "obscenity", "identity")
+MAPPINGS_FILENAME = "youtoxic/app/models/{}_mappings.pkl"
+
+
+def load_mappings(mappings_filename):
+    """Loads the vocabulary mappings.
+
+    Parameters
+    ----------
+    mappings_filename: str
+        The file containing the vocabulary mappings.
+
+    Returns
+    -------
+    defaultdict
+        The vocabulary mappings contained within the specified file.
+
+    """
+    itos = pickle.load(Path(mappings_filename).open("rb"))
+    stoi = collections.defaultdict(
+        lambda: 0, {str(v): int(k) for k, v in enumerate(itos)}
+    )
+    return stoi
+
+
+def mappings_filenames(directory, size=90000):
+    """Returns the mappings file of each head, writing synthetic ones for missing heads."""
+    filenames = dict()
+    for i, head in enumerate(HEADS):
+        filename = MAPPINGS_FILENAME.format(head)
+        if not os.path.exists(filename):
+            shared = ["token{}".format(j) for j in range(size - 2000)]
+            own = ["{}{}".format(head, j) for j in range(2000)]
+            filename = os.path.join(directory, "{}_mappings.pkl".format(head))
+            with open(filename, "wb") as f:
+                pickle.dump(["_unk_", "_pad_"] + shared + own, f)
+        filenames[head] = filename
+    return filenames
+
+
+def make_toks(itos, n_texts=5000, n_words=40, unknown=0.05, seed=0):
+    """Returns texts of Zipf distributed tokens from a vocabulary with some unknown tokens."""
+    rng = np.random.RandomState(seed)
+    ranks = np.minimum(rng.zipf(1.2, size=(n_texts, n_words)), len(itos) - 3) + 1
+    toks = [[str(itos[r]) for r in row] for row in ranks]
+    for tok in toks:
+        for j in np.flatnonzero(rng.rand(n_words) < unknown):
+            tok[j] = "oov{}".format(rng.randint(10 ** 9))
+    return toks
+
+
+def run_dicts(filenames, toks):
+    """Loads and uses the defaultdict mappings. Runs in its own process."""
+    before, start = rss_mb(), time.perf_counter()
+    mappings = {head: load_mappings(filename) for head, filename in filenames.items()}
+    load_seconds, memory = time.perf_counter() - start, rss_mb() - before
+    sizes = {head: len(stoi) for head, stoi in mappings.items()}
+
+    start = time.perf_counter()
+    [[mappings["toxicity"][t] for t in tok] for tok in toks]
+    one_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    for stoi in mappings.values():
+        [[stoi[t] for t in tok] for tok in toks]
+    all_seconds = time.perf_counter() - start
+    growth = sum(len(stoi) - sizes[head] for head, stoi in mappings.items())
+    return load_seconds, memory, one_seconds, all_seconds, growth
+
+
+def run_vocabularies(filename, toks):
+    """Maps and uses the compact vocabularies. Runs in its own process."""
+    before, start = rss_mb(), time.perf_counter()
+    vocabularies = load_vocabularies(filename)
+    load_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    vocabularies["toxicity"].encode(toks)
+    one_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    positions = vocabularies["toxicity"].table.lookup(toks)
+    for vocabulary in vocabularies.values():
+        vocabulary.encode_positions(*positions)
+    all_seconds = time.perf_counter() - start
+    return load_seconds, rss_mb() - before, one_seconds, all_seconds, 0
+
+
+@click.command()
+@click.option("--texts", default=5000, help="number of texts to encode")
+def main(texts):
+    with tempfile.TemporaryDirectory() as directory:
+        filenames = mappings_filenames(directory)
+        start = time.perf_counter()
+        filename = convert_mappings(filenames, os.path.join(directory, "vocabularies.bin"))
+        click.echo("one-time conversion {:.2f} s".format(time.perf_counter() - start))
+        itos = pickle.load(open(filenames["toxicity"], "rb"))
+        toks = make_toks(itos, texts)
+        n_tokens = sum(len(tok) for tok in toks)
+        size = os.path.getsize(filename) / 2 ** 20
+        click.echo("{} texts, {} tokens, vocabularies file {:.1f} MB".format(texts, n_tokens, size))
+
+        for name, result in (
+            ("defaultdict", in_subprocess(run_dicts, filenames, toks)),
+            ("vocabulary", in_subprocess(run_vocabularies, filename, toks)),
+        ):
+            load_seconds, memory, one_seconds, all_seconds, growth = result
+            click.echo(name)
+            click.echo("  load        {:8.3f} s   RSS {:8.1f} MB".format(load_seconds, memory))
+            click.echo("  one head    {:8.0f} tokens/s".format(n_tokens / one_seconds))
+            click.echo("  all heads   {:8.0f} tokens/s".format(n_tokens / all_seconds))
+            click.echo("  entries added by unknown tokens {}".format(growth))
+
+
+if __name__ == "__main__":
+    main()
@@ -12,7 +12,8 @@ setup(
     package_data={"youtoxic": [
         "app/models/*",
         "app/assets/*",
-        "app/templates/*"
+        "app/templates/*",
+        "app/utils/*.json"
     ]},
     include_package_data=True,
     packages=find_packages(exclude=["tests"]),
@@ -0,0 +1,129 @@
+import json
+import os
+
+from flask import Flask
+
+from youtoxic.app import routes
+from youtoxic.app.services.heads import HeadCache
+from youtoxic.app.services.micro_batcher import MicroBatcher
+from youtoxic.app.services.prediction_cache import PredictionCache
+
+
+class LengthPipeline:
+    """Scores a text by its length, recording the batches it is given."""
+
+    def __init__(self):
+        self.batches = list()
+
+    def predict_heads_ulm(self, texts, heads):
+        self.batches.append(list(texts))
+        preds = [min(1, len(text) / 10) for text in texts]
+        return {head: (preds, [None] * len(texts)) for head in heads}
+
+
+def make_client(pipeline, cascade_floor=0, text_pipeline=None):
+    app = Flask(__name__)
+    app.register_blueprint(routes.api_bp)
+    app.extensions["youtoxic"] = dict(
+        pipeline=pipeline,
+        text_pipeline=text_pipeline or pipeline,
+        heads=("toxicity", "insult"),
+        cascade_floor=cascade_floor,
+    )
+    return app.test_client()
+
+
+def test_single_text_is_scored_with_thresholds():
+    """Unittest for the single text endpoint of the API."""
+    client = make_client(LengthPipeline())
+    response = client.post(
+        "/api/score", json={"text": "abcd", "threshold": {"insult": 0.3}}
+    )
+    assert response.status_code == 200
+    assert response.get_json() == {
+        "scores": {"toxicity": 0.4, "insult": 0.4},
+        "labels": {"toxicity": False, "insult": True},
+    }
+
+    response = client.post("/api/score?heads=insult&threshold=0.5", json={"text": ""})
+    assert response.get_json() == {
+        "scores": {"insult": 0.0},
+        "labels": {"insult": False},
+    }
+
+    assert client.post("/api/score", json={"texts": []}).status_code == 400
+    response = client.post("/api/score?heads=identity", json={"text": "a"})
+    assert response.status_code == 400 and "identity" in response.get_json()["error"]
+    response = client.post("/api/score", json={"text": "a", "threshold": "high"})
+    assert response.status_code == 400
+
+
+def test_batches_are_streamed_as_ndjson(monkeypatch):
+    """Unittest for the batch endpoint of the API with JSON and NDJSON bodies."""
+    pipeline = LengthPipeline()
+    client = make_client(pipeline)
+    url = "/api/score/batch?heads=toxicity&threshold=toxicity:0.25"
+    response = client.post(url, json=["a", {"id": 7, "text": "abc"}, 3])
+    assert response.mimetype == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.data.decode().splitlines()]
+    assert lines[0] == {
+        "index": 0,
+        "scores": {"toxicity": 0.1},
+        "labels": {"toxicity": False},
+    }
+    assert lines[1]["id"] == 7 and lines[1]["labels"] == {"toxicity": True}
+    assert lines[2]["index"] == 2 and "error" in lines[2]
+    assert pipeline.batches == [["a", "abc"]]
+
+    body = "\n".join(['"abcdefghijklm"', "not json", "", '{"text": "ab"}'])
+    monkeypatch.setattr(routes, "STREAM_BATCH_SIZE", 2)
+    response = client.post(url, data=body, content_type="application/x-ndjson")
+    lines = [json.loads(line) for line in response.data.decode().splitlines()]
+    assert pipeline.batches[1:] == [["abcdefghijklm"], ["ab"]]
+    assert [line["index"] for line in lines] == [0, 1, 2]
+    assert lines[0]["scores"] == {"toxicity": 1} and "error" in lines[1]
+    assert lines[2]["scores"] == {"toxicity": 0.2}
+
+    response = client.post(url, json={"texts": ["a"]})
+    assert "error" in json.loads(response.data)
+
+
+def test_bounded_scores_are_only_labelled_when_certain():
+    """Unittest for the labels of the scores bounded by the cascade in the API."""
+    client = make_client(LengthPipeline(), cascade_floor=0.5)
+    response = client.post("/api/score?threshold=insult:0.2", json={"text": "abc"})
+    assert response.get_json() == {
+        "scores": {"toxicity": 0.3, "insult": 0.3},
+        "labels": {"toxicity": False, "insult": None},
+        "bounded": ["insult"],
+    }
+    response = client.post("/api/score?threshold=insult:0.4", json={"text": "abc"})
+    assert response.get_json()["labels"]["insult"] is False
+
+    response = client.post("/api/score", json={"text": "abcdefgh"})
+    assert "bounded" not in response.get_json()
+    response = client.post("/api/score?heads=insult", json={"text": "abc"})
+    assert "bounded" not in response.get_json()
+
+
+def test_head_stats_are_exposed():
+    """Unittest for the statistics endpoint of the API."""
+    pipeline = LengthPipeline()
+    assert make_client(pipeline).get("/api/stats").get_json() == {
+        "pid": os.getpid(),
+        "heads": None,
+        "cache": None,
+        "batcher": None,
+    }
+    pipeline.heads = HeadCache(lambda head: (head, head), ["toxicity"])
+    pipeline.heads.get("toxicity")
+    pipeline.cache = PredictionCache(8)
+    pipeline.cache.get_many("toxicity", "v1", [b"digest"])
+    batcher = MicroBatcher(pipeline, max_batch=8, max_wait=0.01)
+    batcher.predict_heads_ulm(["a"], ["toxicity"])
+    stats = make_client(pipeline, text_pipeline=batcher).get("/api/stats").get_json()
+    batcher.close()
+    assert stats["heads"]["toxicity"]["loaded"]
+    assert stats["heads"]["toxicity"]["loads"] == 1
+    assert stats["cache"]["misses"] == 1
+    assert stats["batcher"]["requests"] == 1
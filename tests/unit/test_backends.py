@@ -0,0 +1,29 @@
+import numpy as np
+
+import pytest
+
+from tests.unit.test_batched_predictions import lengths, small_model, vocab_size
+from youtoxic.app.utils.backends import export_filename, make_engine
+from youtoxic.app.utils.batching import pad_batch
+from youtoxic.app.utils.functions import softmax
+
+
+def scores(engine, encoded):
+    ary, lens = pad_batch(encoded)
+    return softmax(engine.run(ary, lens))[:, 1]
+
+
+@pytest.mark.parametrize("backend", ["torchscript", "onnx"])
+def test_engines_agree_with_eager_engine(backend, tmp_path):
+    """Unittest for the conformance of the compiled inference engines."""
+    if backend == "onnx":
+        pytest.importorskip("onnxruntime")
+    model = small_model()
+    eager = make_engine("eager", model)
+    filename = export_filename(str(tmp_path / "toxicity_model.h5"), backend)
+    engine = make_engine(backend, model, filename)
+    rng = np.random.RandomState(4)
+    encoded = [list(rng.randint(2, vocab_size, size=n)) for n in lengths]
+
+    for batch in [encoded, encoded[:1], encoded[3:6], [[5]]]:
+        assert np.allclose(scores(eager, batch), scores(engine, batch), atol=1e-5)
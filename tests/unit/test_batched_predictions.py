@@ -0,0 +1,191 @@
+import numpy as np
+
+import pytest
+
+import torch
+
+from youtoxic.app.config import Config
+from youtoxic.app.services.pipeline import Pipeline
+from youtoxic.app.utils.batching import (
+    aggregate_windows,
+    bucket_by_length,
+    group_duplicates,
+    pad_batch,
+    predict_bucketed,
+    split_windows,
+)
+from youtoxic.app.utils.functions import softmax
+from youtoxic.app.utils.inference_rnn import freeze_for_inference, quantize_for_inference
+from youtoxic.app.utils.lm_rnn import get_rnn_classifier
+
+
+lengths = [1, 3, 7, 19, 20, 21, 26, 40, 5]
+vocab_size = 50
+
+
+def small_model():
+    """Builds a small, randomly initialized classifier with short bptt and max_seq."""
+    torch.manual_seed(0)
+    model = get_rnn_classifier(
+        5,
+        20,
+        2,
+        vocab_size,
+        emb_sz=8,
+        n_hid=12,
+        n_layers=3,
+        pad_token=1,
+        layers=[24, 6, 2],
+        drops=[0.1, 0.1],
+    )
+    for module in model.modules():
+        if isinstance(module, torch.nn.BatchNorm1d):
+            module.running_mean.uniform_(-1, 1)
+            module.running_var.uniform_(0.5, 2)
+    model.reset()
+    model.eval()
+    return model
+
+
+def test_batched_predictions_match_unbatched():
+    """Unittest for padding-aware batched inference."""
+    model = small_model()
+    rng = np.random.RandomState(0)
+    encoded = [list(rng.randint(2, vocab_size, size=n)) for n in lengths]
+
+    unbatched = []
+    for ids in encoded:
+        out = model(torch.from_numpy(np.reshape(np.array(ids), (-1, 1))))
+        unbatched.append(softmax(out[0].data.numpy()[0])[0][1])
+
+    ary, lens = pad_batch(encoded)
+    out = model[1](model[0](torch.from_numpy(ary), torch.from_numpy(lens)))
+    batched = softmax(out[0].data.numpy())[:, 1]
+
+    assert np.allclose(unbatched, batched, atol=1e-5)
+
+
+def test_bucketed_predictions_keep_input_order():
+    """Unittest for the length-bucketed batch scheduler."""
+    model = small_model()
+    rng = np.random.RandomState(1)
+    encoded = [list(rng.randint(2, vocab_size, size=n)) for n in lengths]
+
+    def predict(batch):
+        ary, lens = pad_batch(batch)
+        out = model[1](model[0](torch.from_numpy(ary), torch.from_numpy(lens)))
+        return softmax(out[0].data.numpy())[:, 1]
+
+    buckets = bucket_by_length(lengths, 48, 4)
+    assert sorted(i for bucket in buckets for i in bucket) == list(range(len(lengths)))
+    for bucket in buckets:
+        assert len(bucket) == 1 or max(lengths[i] for i in bucket) * len(bucket) <= 48
+
+    results, report = predict_bucketed(encoded, predict, 48, 4)
+    assert np.allclose(results, predict(encoded), atol=1e-5)
+    assert report.real_tokens == sum(lengths)
+    assert 0 <= report.padding_overhead < 1
+
+
+def test_frozen_model_matches_trained_model():
+    """Unittest for the eval-only model built by freeze_for_inference."""
+    model = small_model()
+    frozen = freeze_for_inference(model)
+    rng = np.random.RandomState(2)
+    encoded = [list(rng.randint(2, vocab_size, size=n)) for n in lengths]
+
+    for ids in encoded:
+        variable = torch.from_numpy(np.reshape(np.array(ids), (-1, 1)))
+        assert np.allclose(model(variable)[0].data.numpy(), frozen(variable)[0].data.numpy(), atol=1e-5)
+
+    ary, lens = pad_batch(encoded)
+    variable, lens = torch.from_numpy(ary), torch.from_numpy(lens)
+    assert np.allclose(
+        model(variable, lens)[0].data.numpy(), frozen(variable, lens)[0].data.numpy(), atol=1e-5
+    )
+
+
+def test_quantized_model_agrees_with_float_model():
+    """Unittest for the dynamic int8 version of the frozen model."""
+    model = small_model()
+    frozen = freeze_for_inference(model)
+    quantized = quantize_for_inference(frozen)
+    rng = np.random.RandomState(3)
+    encoded = [list(rng.randint(2, vocab_size, size=n)) for n in lengths]
+
+    ary, lens = pad_batch(encoded)
+    variable, lens = torch.from_numpy(ary), torch.from_numpy(lens)
+    float_preds = softmax(frozen(variable, lens)[0].data.numpy())[:, 1]
+    int8_preds = softmax(quantized(variable, lens)[0].data.numpy())[:, 1]
+    assert np.allclose(float_preds, int8_preds, atol=0.05)
+
+
+def test_duplicate_texts_are_grouped():
+    """Unittest for scoring each distinct tokenized text once."""
+    toks = [["first", "!"], ["spam"] * 4, ["first", "!"], ["first"], ["spam"] * 4]
+    groups, unique_toks, report = group_duplicates(toks)
+    assert groups == [[0, 2], [1, 4], [3]]
+    assert unique_toks == [["first", "!"], ["spam"] * 4, ["first"]]
+    assert report.duplicate_ratio == 2 / 5
+    assert report.compute_saved == 6 / 13
+    assert group_duplicates([])[2].duplicate_ratio == 0
+
+
+def test_long_texts_are_split_into_windows():
+    """Unittest for the windows of long texts and the aggregation of their results."""
+    encoded = [list(range(10)), [7, 8], list(range(5))]
+    windows, owners = split_windows(encoded, 4, 3)
+    assert windows == [
+        [0, 1, 2, 3],
+        [3, 4, 5, 6],
+        [6, 7, 8, 9],
+        [7, 8],
+        [0, 1, 2, 3],
+        [1, 2, 3, 4],
+    ]
+    assert list(owners) == [0, 0, 0, 1, 2, 2]
+
+    results = np.array([0.1, 0.9, 0.2, 0.4, 0.3, 0.5])
+    assert np.allclose(aggregate_windows(results, owners, 3), [0.9, 0.4, 0.5])
+    assert np.allclose(aggregate_windows(results, owners, 3, "mean"), [0.4, 0.4, 0.4])
+    with pytest.raises(ValueError):
+        split_windows(encoded, 4, 5)
+
+
+def test_pipeline_caps_long_texts():
+    """Unittest for the truncate and window modes of Pipeline."""
+    config = Config()
+    config.max_tokens = 4
+    config.window_stride = 3
+    pipeline = Pipeline(config=config)
+    pipeline.predict_encoded_ulm = lambda model, batch: np.array(
+        [np.mean(ids) / 10 for ids in batch]
+    )
+    encoded = [list(range(10)), [7, 8]]
+    assert np.allclose(pipeline.predict_ids_ulm(None, encoded), [0.75, 0.75])
+
+    pipeline.long_text_mode = "window"
+    assert np.allclose(pipeline.predict_ids_ulm(None, encoded), [0.75, 0.75])
+    pipeline.window_aggregation = "mean"
+    assert np.allclose(pipeline.predict_ids_ulm(None, encoded), [0.45, 0.75])
+    pipeline.close()
+
+    config.window_stride = 5
+    with pytest.raises(ValueError):
+        Pipeline(config=config)
+
+
+def test_streamed_pools_match_whole_sequence_pools():
+    """Unittest for the chunked streaming of the frozen model."""
+    frozen = freeze_for_inference(small_model())
+    rng = np.random.RandomState(4)
+    encoded = [list(rng.randint(2, vocab_size, size=n)) for n in lengths]
+    ary, lens = pad_batch(encoded)
+    variable, lens = torch.from_numpy(ary), torch.from_numpy(lens)
+    whole = frozen(variable, lens)[0].data.numpy()
+    single = frozen(variable[:, :1])[0].data.numpy()
+
+    for chunk_size in [3, 5, 64]:
+        frozen.chunk_size = chunk_size
+        assert np.allclose(frozen(variable, lens)[0].data.numpy(), whole, atol=1e-5)
+        assert np.allclose(frozen(variable[:, :1])[0].data.numpy(), single, atol=1e-5)
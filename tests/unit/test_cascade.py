@@ -0,0 +1,75 @@
+import types
+
+import numpy as np
+
+import pytest
+
+from youtoxic.app.config import Config
+from youtoxic.app.services.pipeline import Pipeline
+
+
+def test_other_heads_only_run_on_texts_above_the_toxicity_floor():
+    """Unittest for the gated cascade of Pipeline."""
+    config = Config()
+    config.cascade_floor = 0.3
+    pipeline = Pipeline(config=config)
+    calls = dict()
+    toxicity = {0: 0.9, 1: 0.1, 2: 0.9, 3: 0.5}
+
+    def predict_head_ulm(head, n_texts, indices, positions, digests=None):
+        calls[head] = indices, positions
+        preds = [0] * n_texts
+        for group in indices:
+            for i in group:
+                preds[i] = toxicity[i] if head == "toxicity" else 0.7
+        return preds, [pipeline.classify(head, pred) for pred in preds]
+
+    pipeline.predict_head_ulm = predict_head_ulm
+    # Texts 0 and 2 share their tokens, text 4 has no words.
+    looked_up = [[0, 2], [1], [3]], (np.arange(6), np.array([2, 1, 3])), None
+    results = pipeline.predict_looked_up_ulm(5, looked_up, ["insult", "toxicity"])
+
+    assert results["toxicity"][0] == [0.9, 0.1, 0.9, 0.5, 0]
+    assert results["insult"][0] == [0.7, 0.1, 0.7, 0.7, 0]
+    assert results["insult"][1][1] == "Not an insult"
+    indices, (flat, lengths) = calls["insult"]
+    assert indices == [[0, 2], [3]]
+    assert list(flat) == [0, 1, 3, 4, 5] and list(lengths) == [2, 3]
+
+    calls.clear()
+    pipeline.predict_looked_up_ulm(5, looked_up, ["insult", "obscenity"])
+    assert calls["insult"][0] == [[0, 2], [1], [3]] and "toxicity" not in calls
+
+    pipeline.cascade_floor = 0
+    pipeline.predict_looked_up_ulm(5, looked_up, ["insult", "toxicity"])
+    assert calls["insult"][0] == [[0, 2], [1], [3]]
+
+
+def test_cascade_floor_may_not_be_above_the_threshold():
+    """Unittest for the validation of the cascade floor of Pipeline."""
+    config = Config()
+    config.cascade_floor = 0.6
+    with pytest.raises(ValueError):
+        Pipeline(config=config)
+    Pipeline(threshold=0.6, config=config).close()
+
+
+def test_heads_are_not_loaded_when_no_text_passes_the_cascade():
+    """Unittest for the heads the cascade of Pipeline passes no text to."""
+    config = Config()
+    config.cascade_floor = 0.3
+    pipeline = Pipeline(config=config)
+    loaded = list()
+
+    def get_head(head):
+        loaded.append(head)
+        return "model", types.SimpleNamespace(encode_positions=lambda *_: [[0], [1]])
+
+    pipeline.get_head = get_head
+    pipeline.predict_ids_ulm = lambda model, encoded: np.array([0.1, 0.2])
+    looked_up = [[0], [1]], (np.arange(2), np.array([1, 1])), None
+    results = pipeline.predict_looked_up_ulm(3, looked_up, ["toxicity", "insult"])
+
+    assert loaded == ["toxicity"]
+    assert results["insult"] == ([0.1, 0.2, 0], ["Not an insult"] * 3)
+    pipeline.close()
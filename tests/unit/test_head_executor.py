@@ -0,0 +1,80 @@
+import threading
+
+import torch
+
+from youtoxic.app.utils import predictions
+from youtoxic.app.utils.predictions import HeadExecutor, render_predictions
+
+
+class FakePipeline:
+    """Predicts the length of each text times the index of the head."""
+
+    heads = ["toxicity", "insult", "obscenity", "identity"]
+
+    def __init__(self, barrier=None):
+        self.barrier = barrier
+        self.lookups = 0
+
+    def lookup(self, texts):
+        self.lookups += 1
+        indices = [i for i, text in enumerate(texts) if text]
+        return indices, [len(texts[i]) for i in indices], None
+
+    def predict_head_ulm(self, head, n_texts, indices, positions, digests=None):
+        if self.barrier is not None:
+            self.barrier.wait(timeout=5)
+        preds = [0] * n_texts
+        for i, length in zip(indices, positions):
+            preds[i] = length * self.heads.index(head)
+        return preds, [str(pred) for pred in preds]
+
+    def predict_looked_up_ulm(self, n_texts, looked_up, heads, map_heads=map):
+        def predict(head):
+            return self.predict_head_ulm(head, n_texts, *looked_up)
+
+        return dict(zip(heads, map_heads(predict, heads)))
+
+    def predict_heads_ulm(self, texts, heads):
+        return self.predict_looked_up_ulm(len(texts), self.lookup(texts), heads)
+
+
+def test_heads_run_concurrently_and_match_sequential_results():
+    """Unittest for running the heads of a request on the threads of HeadExecutor."""
+    num_threads = torch.get_num_threads()
+    texts = ["a", "", "abc"]
+    heads = ["insult", "identity", "toxicity"]
+    expected = FakePipeline().predict_heads_ulm(texts, heads)
+
+    # Every head waits for the others, so this only completes if they run at once.
+    pipeline = FakePipeline(threading.Barrier(len(heads)))
+    executor = HeadExecutor(len(heads), 6)
+    try:
+        assert torch.get_num_threads() == 2
+        assert executor.predict(pipeline, texts, heads) == expected
+        assert pipeline.lookups == 1
+    finally:
+        executor.close()
+        torch.set_num_threads(num_threads)
+
+    sequential = HeadExecutor(1, 6)
+    assert sequential.predict(FakePipeline(), texts, heads) == expected
+
+
+def test_partial_results_are_rendered_as_their_number_doubles(monkeypatch):
+    """Unittest for the progress and partial results reported by render_predictions."""
+    monkeypatch.setattr(predictions, "JOB_BATCH_SIZE", 2)
+    monkeypatch.setattr(predictions, "_executor", HeadExecutor(1, 1))
+    reports = list()
+
+    def report(done, total, result=None):
+        reports.append((done, total, result))
+
+    def render(done, preds, judgements):
+        return preds["insult"]
+
+    texts = ["a" * i for i in range(1, 12)]
+    layout = render_predictions(texts, ["Insult"], FakePipeline(), render, report)
+    assert layout == list(range(1, 12))
+    assert [done for done, _, _ in reports] == [2, 4, 6, 8, 10, 11]
+    assert [done for done, _, result in reports if result] == [2, 4, 8, 11]
+    assert render_predictions(texts, ["Insult"], FakePipeline(), render) == layout
@@ -0,0 +1,100 @@
+import threading
+import time
+
+import pytest
+
+from youtoxic.app.services.heads import HeadCache
+
+
+def test_heads_are_loaded_on_first_use_and_evicted_lru():
+    """Unittest for lazy loading and the least recently used policy of HeadCache."""
+    loaded = []
+
+    def load(head):
+        loaded.append(head)
+        return "model-" + head, "mappings-" + head
+
+    cache = HeadCache(load, ["toxicity", "insult", "obscenity"], max_loaded=2)
+    assert loaded == []
+
+    assert cache.get("toxicity") == ("model-toxicity", "mappings-toxicity")
+    cache.get("insult")
+    cache.get("toxicity")
+    assert loaded == ["toxicity", "insult"]
+
+    cache.get("obscenity")
+    assert list(cache.loaded) == ["toxicity", "obscenity"]
+    stats = cache.stats()
+    assert not stats["insult"]["loaded"] and stats["insult"]["loads"] == 1
+    assert stats["toxicity"]["loaded"] and stats["toxicity"]["load_seconds"] >= 0
+
+    cache.get("insult")
+    assert loaded == ["toxicity", "insult", "obscenity", "insult"]
+
+    with pytest.raises(ValueError):
+        cache.get("identity")
+
+
+def test_idle_heads_are_unloaded():
+    """Unittest for the idle-unload policy of HeadCache."""
+    cache = HeadCache(lambda head: (head, head), ["toxicity", "insult"], idle_seconds=0.05)
+    cache.get("toxicity")
+    cache.get("insult")
+    time.sleep(0.1)
+    cache.get("insult")
+    assert list(cache.loaded) == ["insult"]
+
+    time.sleep(0.1)
+    cache.unload_idle()
+    assert list(cache.loaded) == []
+
+
+def test_heads_load_outside_the_lock():
+    """Unittest for the concurrent loads of HeadCache."""
+    started, release = threading.Event(), threading.Event()
+    loaded = []
+
+    def load(head):
+        loaded.append(head)
+        if head == "insult":
+            started.set()
+            assert release.wait(5)
+        return head, head
+
+    cache = HeadCache(load, ["toxicity", "insult"])
+    cache.get("toxicity")
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.get("insult")))
+        for _ in range(3)
+    ]
+    for thread in threads:
+        thread.start()
+    assert started.wait(5)
+    assert cache.get("toxicity") == ("toxicity", "toxicity")
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert results == [("insult", "insult")] * 3
+    assert loaded == ["toxicity", "insult"]
+    assert cache.stats()["insult"]["loads"] == 1
+
+    def fail(head):
+        raise OSError("missing weights")
+
+    cache = HeadCache(fail, ["toxicity"])
+    with pytest.raises(OSError):
+        cache.get("toxicity")
+    assert cache.loading == {} and not cache.stats()["toxicity"]["loaded"]
+
+
+def test_idle_heads_are_unloaded_without_being_accessed():
+    """Unittest for the thread that unloads the idle heads of HeadCache."""
+    cache = HeadCache(lambda head: (head, head), ["toxicity"], idle_seconds=0.05)
+    cache.get("toxicity")
+    for _ in range(100):
+        if not cache.loaded:
+            break
+        time.sleep(0.01)
+    assert list(cache.loaded) == [] and not cache.stats()["toxicity"]["loaded"]
+    cache.close()
@@ -0,0 +1,99 @@
+import multiprocessing
+import os
+import threading
+import time
+
+import pytest
+
+from youtoxic.app.services.jobs import FINISHED, JobQueue
+
+
+def wait(jobs, job_id, states=FINISHED):
+    for _ in range(500):
+        job = jobs.get(job_id)
+        if job["state"] in states:
+            return job
+        time.sleep(0.01)
+    raise AssertionError("Job {} is still {}".format(job_id, job["state"]))
+
+
+def count(n, report):
+    """Reports the numbers counted so far, one at a time."""
+    for i in range(1, n + 1):
+        report(i, n, list(range(i)))
+    return "counted {}".format(n)
+
+
+def fail(report):
+    raise ValueError("no texts")
+
+
+@pytest.mark.parametrize("store", ["memory", "sqlite"])
+def test_jobs_report_progress_and_can_be_cancelled(store, tmp_path):
+    """Unittest for the progress, cancellation and failures of JobQueue jobs."""
+    filename = str(tmp_path / "jobs.sqlite") if store == "sqlite" else None
+    jobs = JobQueue(max_running=1, filename=filename)
+    try:
+        job = wait(jobs, jobs.submit(count, 3))
+        assert job == dict(
+            state="done", done=3, total=3, result="counted 3", error=None
+        )
+        job = wait(jobs, jobs.submit(fail))
+        assert job["state"] == "failed" and job["error"] == "no texts"
+        assert jobs.get("missing") is None
+
+        started, release = threading.Event(), threading.Event()
+
+        def blocked(report):
+            report(1, 2, "partial")
+            started.set()
+            release.wait(5)
+            report(2, 2, "all")
+
+        running = jobs.submit(blocked)
+        queued = jobs.submit(count, 3)
+        assert started.wait(5)
+        job = jobs.get(running)
+        assert job["state"] == "running" and job["result"] == "partial"
+        assert jobs.get(queued)["state"] == "queued"
+
+        assert jobs.cancel(queued) and jobs.cancel(running)
+        release.set()
+        job = wait(jobs, running)
+        assert job["state"] == "cancelled" and job["done"] == 2
+        assert wait(jobs, queued)["state"] == "cancelled"
+        assert not jobs.cancel(running)
+    finally:
+        jobs.close()
+
+
+def block(report):
+    report(0, 1)
+    time.sleep(60)
+
+
+def submit_and_exit(filename, connection):
+    jobs = JobQueue(max_running=1, filename=filename)
+    connection.send([jobs.submit(block) for _ in range(3)])
+    connection.recv()
+    os._exit(0)
+
+
+def test_jobs_of_an_exited_process_are_finished(tmp_path):
+    """Unittest for the jobs of a process that exited, as seen from another process."""
+    filename = str(tmp_path / "jobs.sqlite")
+    context = multiprocessing.get_context("fork")
+    connection, child = context.Pipe()
+    process = context.Process(target=submit_and_exit, args=(filename, child))
+    process.start()
+    running, cancelled, queued = connection.recv()
+    jobs = JobQueue(filename=filename)
+    wait(jobs, running, ["running"])
+    assert jobs.get(queued)["state"] == "queued"
+    assert jobs.cancel(cancelled) and jobs.get(cancelled)["state"] == "cancelled"
+
+    connection.send(None)
+    process.join(10)
+    assert jobs.get(running)["state"] == "failed"
+    assert jobs.get(queued)["state"] == "failed"
+    assert jobs.get(cancelled)["state"] == "cancelled"
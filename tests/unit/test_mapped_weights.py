@@ -0,0 +1,28 @@
+import numpy as np
+
+import torch
+
+from tests.unit.test_batched_predictions import lengths, small_model, vocab_size
+from youtoxic.app.utils.batching import pad_batch
+from youtoxic.app.utils.inference_rnn import freeze_for_inference
+from youtoxic.app.utils.mapped_weights import ALIGNMENT, load_mapped_model, save_mapped_weights
+
+
+def test_mapped_model_matches_frozen_model(tmp_path):
+    """Unittest for the memory-mapped weight format."""
+    frozen = freeze_for_inference(small_model())
+    filename = str(tmp_path / "toxicity_model.weights")
+    save_mapped_weights(frozen, filename)
+    mapped = load_mapped_model(filename)
+
+    for name, param in mapped.state_dict().items():
+        assert param.data_ptr() % ALIGNMENT == 0
+        assert np.array_equal(param.numpy(), frozen.state_dict()[name].numpy())
+
+    rng = np.random.RandomState(5)
+    encoded = [list(rng.randint(2, vocab_size, size=n)) for n in lengths]
+    ary, lens = pad_batch(encoded)
+    variable, lens = torch.from_numpy(ary), torch.from_numpy(lens)
+    assert np.allclose(
+        frozen(variable, lens)[0].numpy(), mapped(variable, lens)[0].numpy(), atol=1e-6
+    )
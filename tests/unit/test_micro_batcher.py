@@ -0,0 +1,105 @@
+import threading
+
+import pytest
+
+import torch
+
+from youtoxic.app.services.micro_batcher import MicroBatcher
+from youtoxic.app.utils.predictions import HeadExecutor
+
+
+class FakePipeline:
+    """Predicts the length of each text and records the size of each call."""
+
+    def __init__(self):
+        self.calls = []
+
+    def predict_heads_ulm(self, texts, heads):
+        if "fail" in texts:
+            raise ValueError("cannot predict")
+        self.calls.append((len(texts), tuple(heads)))
+        preds = [len(text) for text in texts]
+        return {head: (preds, [head + str(pred) for pred in preds]) for head in heads}
+
+
+class HeadsPipeline(FakePipeline):
+    """Predicts a head at a time, waiting for the other heads of the call."""
+
+    def __init__(self, barrier):
+        super().__init__()
+        self.barrier = barrier
+
+    def lookup(self, texts):
+        return texts
+
+    def predict_looked_up_ulm(self, n_texts, looked_up, heads, map_heads=map):
+        def predict(head):
+            self.barrier.wait(timeout=5)
+            return self.predict_heads_ulm(looked_up, [head])[head]
+
+        return dict(zip(heads, map_heads(predict, heads)))
+
+
+def test_concurrent_texts_are_predicted_in_batches():
+    """Unittest for batching the texts of concurrent callers with MicroBatcher."""
+    pipeline = FakePipeline()
+    batcher = MicroBatcher(pipeline, max_batch=8, max_wait=0.2)
+    # Arrivals closer than max_wait open the batching window.
+    batcher.gap = 0.001
+    start = threading.Barrier(6)
+    results = dict()
+
+    def caller(i):
+        start.wait()
+        results[i] = batcher.submit("a" * i, ["toxicity", "insult"]).result(timeout=5)
+
+    threads = [threading.Thread(target=caller, args=(i,)) for i in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for i, result in results.items():
+        assert result["toxicity"] == (i, "toxicity" + str(i))
+        assert result["insult"] == (i, "insult" + str(i))
+    assert len(results) == 6
+    assert sum(size for size, _ in pipeline.calls) == 6
+    assert len(pipeline.calls) < 6
+    stats = batcher.stats()
+    assert stats["requests"] == 6 and stats["batches"] == len(pipeline.calls)
+    assert 0 < stats["batch_fill"] <= 1
+    assert stats["latency_ms_p99"] >= stats["latency_ms_p50"] >= 0
+
+    results = batcher.predict_heads_ulm(["ab", "c"], ["identity"])
+    assert results == {"identity": ([2, 1], ["identity2", "identity1"])}
+    with pytest.raises(ValueError):
+        batcher.submit("fail", ["toxicity"]).result(timeout=5)
+    batcher.close()
+
+
+def test_idle_batcher_does_not_wait():
+    """Unittest for the adaptive window of MicroBatcher."""
+    batcher = MicroBatcher(FakePipeline(), max_batch=8, max_wait=0.01)
+    assert batcher.window() == 0
+    batcher.gap = 0.001
+    assert batcher.window() == pytest.approx(0.007)
+    batcher.gap = 0.0001
+    assert batcher.window() == pytest.approx(0.0007)
+
+
+def test_heads_of_a_batch_run_concurrently():
+    """Unittest for running the heads of a MicroBatcher batch on a HeadExecutor."""
+    num_threads = torch.get_num_threads()
+    heads = ["toxicity", "insult", "obscenity"]
+    # Every head waits for the others, so this only completes if they run at once.
+    pipeline = HeadsPipeline(threading.Barrier(len(heads)))
+    executor = HeadExecutor(len(heads), len(heads))
+    batcher = MicroBatcher(pipeline, max_batch=8, max_wait=0.01, executor=executor)
+    try:
+        results = batcher.predict_heads_ulm(["ab", "c"], heads)
+        assert results == {head: ([2, 1], [head + "2", head + "1"]) for head in heads}
+        assert sorted(pipeline.calls) == sorted((2, (head,)) for head in heads)
+    finally:
+        batcher.close()
+        executor.close()
+        torch.set_num_threads(num_threads)
@@ -0,0 +1,55 @@
+import os
+
+from youtoxic.app.services.prediction_cache import (
+    PredictionCache,
+    model_version,
+    text_digest,
+)
+
+
+def test_memory_tier_is_lru_and_counts_lookups():
+    """Unittest for the memory tier and the counters of PredictionCache."""
+    cache = PredictionCache(max_entries=2)
+    a, b, c = [text_digest([tok]) for tok in "abc"]
+    assert text_digest(["a", "b"]) != text_digest(["ab"])
+
+    cache.put_many("toxicity", "v1", {a: 0.1, b: 0.2})
+    assert cache.get_many("toxicity", "v1", [a, a, c]) == {a: 0.1}
+    assert cache.get_many("insult", "v1", [a]) == dict()
+    assert cache.get_many("toxicity", "v2", [a]) == dict()
+
+    cache.put_many("toxicity", "v1", {c: 0.3})
+    assert cache.get_many("toxicity", "v1", [a, b, c]) == {a: 0.1, c: 0.3}
+    stats = cache.stats()
+    assert stats["size"] == 2 and stats["evictions"] == 1
+    assert stats["hits"] == 3 and stats["misses"] == 4 and stats["disk_hits"] == 0
+    assert stats["hit_rate"] == 3 / 7
+
+
+def test_disk_tier_survives_restarts_and_is_invalidated(tmp_path):
+    """Unittest for the SQLite tier of PredictionCache."""
+    filename = str(tmp_path / "predictions.sqlite")
+    a, b = text_digest(["a"]), text_digest(["b"])
+    PredictionCache(10, filename).put_many("toxicity", "v1", {a: 0.25, b: 0.5})
+
+    cache = PredictionCache(1, filename)
+    assert cache.get_many("toxicity", "v1", [a, b]) == {a: 0.25, b: 0.5}
+    assert cache.stats()["disk_hits"] == 2 and len(cache) == 1
+
+    cache.invalidate("toxicity", "v2")
+    assert len(cache) == 0
+    assert PredictionCache(10, filename).get_many("toxicity", "v1", [a]) == dict()
+
+
+def test_model_version_changes_with_the_model_file(tmp_path):
+    """Unittest for keying cached predictions by the model file."""
+    filename = str(tmp_path / "toxicity_model.h5")
+    with open(filename, "wb") as f:
+        f.write(b"weights")
+    version = model_version(filename, "eager", False)
+    assert version == model_version(filename, "eager", False)
+    assert version != model_version(filename, "onnx", False)
+
+    stat = os.stat(filename)
+    os.utime(filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert version != model_version(filename, "eager", False)
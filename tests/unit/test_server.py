@@ -0,0 +1,72 @@
+import multiprocessing
+import os
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+from youtoxic.app.services.server import PreforkServer
+
+
+def app(environ, start_response):
+    """Answers with the process id of the worker, after sleeping on /slow."""
+    if environ["PATH_INFO"] == "/slow":
+        time.sleep(5)
+    start_response("200 OK", [("Content-Type", "text/plain")])
+    return [str(os.getpid()).encode("utf-8")]
+
+
+def get(url, timeout=10):
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return int(response.read())
+
+
+def test_workers_are_recycled_and_killed_on_timeout():
+    """Unittest for the worker recycling and request timeouts of PreforkServer."""
+    pytest.importorskip("waitress")
+    server = PreforkServer(app, "127.0.0.1", 0, 1, 2, max_requests=3, request_timeout=1)
+    url = "http://127.0.0.1:{}/".format(server.bind()[1])
+    process = multiprocessing.get_context("fork").Process(target=server.run)
+    process.start()
+    try:
+        pids = [get(url) for _ in range(9)]
+        assert os.getpid() not in pids and process.pid not in pids
+        assert len(set(pids)) >= 3
+
+        with pytest.raises((urllib.error.URLError, ConnectionError, OSError)):
+            get(url + "slow")
+        assert get(url) not in pids
+    finally:
+        process.terminate()
+        process.join(10)
+    assert process.exitcode == 0
+
+
+def test_draining_waits_for_background_tasks():
+    """Unittest for the uncounted paths and background tasks of PreforkServer workers."""
+    pytest.importorskip("waitress")
+    until = time.monotonic() + 2
+    server = PreforkServer(
+        app,
+        "127.0.0.1",
+        0,
+        1,
+        2,
+        max_requests=1,
+        request_timeout=10,
+        uncounted_paths=("/poll",),
+        busy=lambda: time.monotonic() < until,
+    )
+    url = "http://127.0.0.1:{}/".format(server.bind()[1])
+    process = multiprocessing.get_context("fork").Process(target=server.run)
+    process.start()
+    try:
+        pids = {get(url + "poll") for _ in range(3)}
+        pids.add(get(url))
+        assert len(pids) == 1
+        assert get(url) not in pids and time.monotonic() >= until
+    finally:
+        process.terminate()
+        process.join(10)
+    assert process.exitcode == 0
@@ -0,0 +1,53 @@
+import numpy as np
+
+from youtoxic.app.utils.student import (
+    calibrate_band,
+    hashed_features,
+    load_student,
+    train_student,
+)
+from youtoxic.app.utils.vocabulary import select_positions
+
+
+def synthetic_texts(n_texts=4000, seed=0):
+    """Returns texts whose teacher prediction grows with their share of tokens below 50."""
+    rng = np.random.RandomState(seed)
+    lengths = rng.randint(3, 30, size=n_texts)
+    positions = rng.randint(-1, 2000, size=lengths.sum())
+    rows = np.repeat(np.arange(n_texts), lengths)
+    share = np.bincount(rows, positions < 50, minlength=n_texts) / lengths
+    return positions, lengths, 1 / (1 + np.exp(3 - 40 * share))
+
+
+def test_student_learns_its_teacher_and_escalates_the_uncertain_band(tmp_path):
+    """Unittest for training, calibrating, saving and loading a StudentModel."""
+    positions, lengths, teacher = synthetic_texts()
+    student = train_student(positions, lengths, teacher, "table", n_features=2 ** 16)
+    preds = student.predict(positions, lengths)
+    assert np.mean((preds > 0.5) == (teacher > 0.5)) > 0.97
+
+    calibrate_band(student, preds, teacher, agreement=0.995)
+    assert student.low < 0.5 < student.high
+    confident = student.confident(preds)
+    assert 0.5 < confident.mean() < 1
+    agree = (preds > 0.5) == (teacher > 0.5)
+    assert agree[confident].mean() >= 0.995
+
+    filename = str(tmp_path / "toxicity_student.bin")
+    student.save(filename)
+    loaded = load_student(filename)
+    assert (loaded.low, loaded.high) == (student.low, student.high)
+    assert loaded.fingerprint == "table"
+    assert np.allclose(loaded.predict(positions, lengths), preds)
+
+
+def test_features_and_selection_stay_within_texts():
+    """Unittest for the hashed bigrams and the selection of texts by position."""
+    positions, lengths = np.array([3, 4, 5, -1, 7, 8]), np.array([2, 1, 3])
+    rows, features = hashed_features(positions, lengths, 2 ** 10)
+    assert list(rows) == [0, 0, 1, 2, 2, 2, 0, 2, 2]
+    assert features.min() >= 0 and features.max() < 2 ** 10
+
+    selected, selected_lengths = select_positions(positions, lengths, [2, 0])
+    assert list(selected) == [-1, 7, 8, 3, 4] and list(selected_lengths) == [3, 2]
+    assert len(select_positions(positions, lengths, [])[0]) == 0
@@ -0,0 +1,47 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import torch
+
+from tests.unit.test_batched_predictions import small_model, vocab_size
+from youtoxic.app.utils.backends import make_engine
+from youtoxic.app.utils.batching import pad_batch
+from youtoxic.app.utils.inference_rnn import freeze_for_inference
+
+
+def make_batches(n_batches=48, seed=6):
+    """Returns padded batches of varying batch size and sequence length."""
+    rng = np.random.RandomState(seed)
+    batches = []
+    for _ in range(n_batches):
+        lengths = rng.randint(1, 45, size=rng.randint(1, 9))
+        batches.append(pad_batch([list(rng.randint(2, vocab_size, size=n)) for n in lengths]))
+    return batches
+
+
+def test_concurrent_forwards_match_sequential_forwards():
+    """Stress test for running one model from several threads at once."""
+    batches = make_batches()
+    model = small_model()
+    for engine in [make_engine("eager", model), make_engine("eager", freeze_for_inference(model))]:
+        expected = [engine.run(ary, lengths) for ary, lengths in batches]
+        for _ in range(3):
+            with ThreadPoolExecutor(8) as executor:
+                results = list(executor.map(lambda batch: engine.run(*batch), batches * 4))
+            for result, want in zip(results, expected * 4):
+                assert np.allclose(result, want, atol=1e-6)
+
+
+def test_forward_does_not_modify_the_module():
+    """Unittest for the stateless forward of the trained model in eval mode."""
+    model = small_model()
+    encoder = model[0]
+    hidden = encoder.hidden
+    weights = [rnn.module.weight_hh_l0 for rnn in encoder.rnns]
+    ary, lengths = make_batches(1)[0]
+    with torch.no_grad():
+        model(torch.from_numpy(ary), torch.from_numpy(lengths))
+        model(torch.from_numpy(ary[:, :1]))
+    assert encoder.hidden is hidden
+    assert all(rnn.module.weight_hh_l0 is w for rnn, w in zip(encoder.rnns, weights))
@@ -0,0 +1,45 @@
+import pytest
+
+from youtoxic.app.utils.tokenizer import Tokenizer
+
+
+corpus = [
+    "blah blah",
+    "YOU ARE AN IDIOT!!!!",
+    "Hello &amp; welcome<br />to the show",
+    "nooooo way way way way",
+    "I'm sure it's fine, isn't it?",
+    "GO AWAY you #loser / moron",
+    "Check http://t.co/xyz now",
+    'He said "no"... :( lol',
+    "3.5% of 10,000 people",
+    "It costs $5.99!",
+    "emoji 😀😀 fun 👍",
+    "U.K. & U.S. relations.",
+    "don’t can't won't shouldn't've y'all gonna",
+    "mr. smith vs. Mr. Jones",
+    "e-mail me at someone@example.com",
+    "Wikipedia:NPOV is [[policy]]",
+    "==Header==\nSome text\\nmore text",
+    "(((yes))) it's 5pm, 1st and 2nd",
+    "  leading and   inner spaces ",
+]
+
+
+def test_tokenizer_rules():
+    """Unittest for the fastai rules of the lightweight tokenizer."""
+    tokenizer = Tokenizer()
+    assert tokenizer.process_text("YOU ARE AN IDIOT!!!!") == [
+        "xxup", "you", "xxup", "are", "xxup", "an", "xxup", "idiot", "xxrep", "4", "!"
+    ]
+    assert tokenizer.process_text("Hello<br />way way way way way.") == [
+        "xxmaj", "hello", "\n ", "xxwrep", "4", "way", "way", "."
+    ]
+    assert tokenizer.process_text("I don't like a/b") == ["i", "do", "n't", "like", "a", "/", "b"]
+
+
+def test_tokenizer_matches_fastai():
+    """Unittest for parity of the lightweight tokenizer with fastai's Tokenizer."""
+    transform = pytest.importorskip("fastai.text.transform")
+    expected = transform.Tokenizer(n_cpus=1).process_all(corpus)
+    assert Tokenizer().process_all(corpus) == expected
@@ -0,0 +1,19 @@
+from youtoxic.app.services.tokenizer_pool import TokenizerPool
+
+
+texts = ["text number {} is here".format(i) for i in range(23)]
+
+
+class WhitespaceTokenizer:
+    def process_all(self, texts):
+        return [text.split() for text in texts]
+
+
+def test_tokenizer_pool_matches_in_process():
+    """Unittest for chunked tokenization across the worker pool."""
+    pool = TokenizerPool(WhitespaceTokenizer(), 2, 4)
+    try:
+        assert pool.process_all(texts) == WhitespaceTokenizer().process_all(texts)
+        assert pool.process_all(texts[:3]) == WhitespaceTokenizer().process_all(texts[:3])
+    finally:
+        pool.close()
@@ -0,0 +1,40 @@
+import collections
+
+import numpy as np
+
+from youtoxic.app.utils.vocabulary import load_vocabularies, save_vocabularies
+
+
+itos = {
+    "toxicity": ["_unk_", "_pad_", ".", "the", "idiot", "xxmaj", "a" * 20],
+    "insult": ["_unk_", "_pad_", "the", "idiot", "moron", "a" * 20 + "b", "é"],
+}
+
+
+def test_vocabularies_encode_like_the_mappings(tmp_path):
+    """Unittest for the compact vocabularies that replace the defaultdict mappings."""
+    filename = str(tmp_path / "vocabularies.bin")
+    save_vocabularies(itos, filename)
+    vocabularies = load_vocabularies(filename)
+    toks = [
+        ["the", "idiot", "."],
+        ["moron", "unknown", "a" * 20, "a" * 20 + "b", "a" * 21, "é", "e"],
+        ["xxmaj"],
+    ]
+
+    for head, head_itos in itos.items():
+        vocabulary = vocabularies[head]
+        stoi = collections.defaultdict(lambda: 0, {v: k for k, v in enumerate(head_itos)})
+        encoded = vocabulary.encode(toks)
+        assert len(vocabulary) == len(head_itos)
+        assert [ids.dtype for ids in encoded] == [np.int64] * len(toks)
+        assert [list(ids) for ids in encoded] == [[stoi[t] for t in tok] for tok in toks]
+        assert vocabulary["unknown"] == 0
+
+    toxicity, insult = vocabularies["toxicity"], vocabularies["insult"]
+    assert toxicity.table is insult.table
+    assert len(toxicity.table) == len(set(itos["toxicity"]) | set(itos["insult"]))
+    positions = toxicity.table.lookup(toks)
+    assert [list(ids) for ids in insult.encode_positions(*positions)] == [
+        list(ids) for ids in insult.encode(toks)
+    ]
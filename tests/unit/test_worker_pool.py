@@ -0,0 +1,89 @@
+import os
+import types
+
+import pytest
+
+from youtoxic.app.services.worker_pool import ModelWorkerPool, worker_cpus
+
+
+class FakePipeline:
+    """Predicts the process id that handled each text."""
+
+    def __init__(self):
+        self.heads = types.SimpleNamespace(preload=self.preload)
+        self.tokenizer = types.SimpleNamespace(n_workers=4)
+        self.loaded_in = None
+        self.closed = False
+
+    def preload(self):
+        self.loaded_in = os.getpid()
+
+    def predict_heads_ulm(self, texts, heads):
+        if "fail" in texts:
+            raise ValueError("cannot predict")
+        if "unpicklable" in texts:
+            raise ValueError(lambda: None)
+        if "crash" in texts:
+            os._exit(3)
+        preds = [len(text) for text in texts]
+        return {
+            head: (preds, [self.loaded_in, os.getpid(), self.tokenizer.n_workers])
+            for head in heads
+        }
+
+    def close(self):
+        self.closed = True
+
+
+def test_worker_cpus_are_consecutive_and_wrap_around():
+    """Unittest for the core pinning of the model workers."""
+    assert worker_cpus(0, 2, [0, 1, 2, 3]) == {0, 1}
+    assert worker_cpus(1, 2, [0, 1, 2, 3]) == {2, 3}
+    assert worker_cpus(2, 2, [0, 1, 2, 3]) == {0, 1}
+    assert worker_cpus(1, 1, [5]) == {5}
+
+
+def test_requests_are_predicted_on_forked_workers():
+    """Unittest for loading once in the parent and predicting on the workers of ModelWorkerPool."""
+    pipeline = FakePipeline()
+    pool = ModelWorkerPool(pipeline, 2, pin=True).start()
+    try:
+        heads = ["toxicity", "insult"]
+        futures = [pool.submit(["a" * i, "bc"], heads) for i in range(8)]
+        for i, future in enumerate(futures):
+            result = future.result(timeout=30)
+            preds, (loaded_in, worker, tokenizer_workers) = result["insult"]
+            assert preds == [i, 2]
+            assert loaded_in == os.getpid() and worker != os.getpid()
+            assert tokenizer_workers == 1
+
+        with pytest.raises(ValueError):
+            pool.predict_heads_ulm(["fail"], ["toxicity"])
+        assert pool.predict_heads_ulm(["abc"], ["identity"])["identity"][0] == [3]
+    finally:
+        pool.close()
+    assert pipeline.closed
+    assert all(not process.is_alive() for process in pool.processes)
+    with pytest.raises(RuntimeError):
+        pool.submit(["a"], ["toxicity"])
+
+
+def test_exited_workers_fail_their_request_and_are_replaced():
+    """Unittest for the requests of model workers that exit or fail to send their result."""
+    pool = ModelWorkerPool(FakePipeline(), 2).start()
+    try:
+        with pytest.raises(RuntimeError, match="lambda"):
+            pool.predict_heads_ulm(["unpicklable"], ["toxicity"])
+        pids = {process.pid for process in pool.processes}
+        futures = [pool.submit(["a" * i], ["toxicity"]) for i in range(4)]
+        with pytest.raises(RuntimeError, match="code 3"):
+            pool.predict_heads_ulm(["crash"], ["toxicity"])
+        assert [future.result(timeout=30)["toxicity"][0] for future in futures] == [
+            [i] for i in range(4)
+        ]
+        for _ in range(4):
+            assert pool.predict_heads_ulm(["abc"], ["toxicity"])["toxicity"][0] == [3]
+        assert len(pids & {process.pid for process in pool.processes}) == 1
+    finally:
+        pool.close()
+    assert all(not process.is_alive() for process in pool.processes)
@@ -1,11 +1,27 @@
+import os
+import tempfile
+
 import click
 
 from flask import Flask
 
 from flask_bootstrap import Bootstrap
 
+import pandas as pd
+
 from youtoxic.app import dash_view
 from youtoxic.app import routes
+from youtoxic.app.config import Config
+from youtoxic.app.services.distillation import distill_students
+from youtoxic.app.services.pipeline import (
+    HEADS,
+    STUDENT_FILENAME,
+    VOCABULARIES_FILENAME,
+    Pipeline,
+)
+from youtoxic.app.services.server import PreforkServer
+from youtoxic.app.utils.load_files import convert_mappings, convert_weights
+from youtoxic.app.utils.vocabulary import load_vocabularies
 
 
 @click.group()
@@ -17,7 +33,28 @@ def main():
 @click.option("--debug", envvar="DEBUG", default=False, help="debug mode")
 @click.option("--host", envvar="HOST", default="127.0.0.1", help="host IP address")
 @click.option("--port", envvar="PORT", default=8050, help="port")
-def runserver(debug, host, port):
+@click.option(
+    "--production",
+    envvar="PRODUCTION",
+    is_flag=True,
+    default=False,
+    help="serve from waitress worker processes",
+)
+@click.option("--workers", envvar="WORKERS", default=2, help="worker processes")
+@click.option("--threads", envvar="THREADS", default=8, help="threads per worker")
+@click.option(
+    "--max-requests",
+    envvar="MAX_REQUESTS",
+    default=1000,
+    help="requests before a worker is replaced, 0 for never",
+)
+@click.option(
+    "--timeout",
+    envvar="REQUEST_TIMEOUT",
+    default=600,
+    help="seconds after which a request kills its worker",
+)
+def runserver(debug, host, port, production, workers, threads, max_requests, timeout):
     """Constructs the core application.
 
     Parameters
@@ -28,18 +65,140 @@ def runserver(debug, host, port):
         Flask will use this host value.
     port : int
         The port of the webserver.
+    production : bool
+        Serves the app from worker processes forked after the models are loaded,
+        instead of from the Flask development server.
+    workers : int
+        The number of worker processes in production mode.
+    threads : int
+        The number of request threads of each worker in production mode.
+    max_requests : int
+        The number of requests after which a worker is replaced in production mode.
+    timeout : int
+        The seconds after which a running request kills its worker in production
+        mode. Also the seconds a worker being replaced waits for its tweet,
+        YouTube and file analyses, which can take minutes.
 
     Returns
     -------
     None
 
     """
+    config = Config()
+    if production:
+        # The server workers run the models themselves. The queues of model
+        # workers cannot be shared by forked processes, and tokenizer
+        # processes and intra-op threads per worker would oversubscribe the cores.
+        if config.model_workers > 0:
+            click.echo(
+                "Ignoring MODEL_WORKERS={} in production mode, the server "
+                "workers run the models".format(config.model_workers),
+                err=True,
+            )
+        config.model_workers = 0
+        config.tokenizer_workers = 1
+        config.intra_op_threads = max(
+            1, min(config.intra_op_threads, (os.cpu_count() or 1) // workers)
+        )
+        # Any worker may answer the polls of a job run by another worker.
+        if not config.job_store_file:
+            config.job_store_file = os.path.join(
+                tempfile.gettempdir(), "youtoxic_jobs.sqlite"
+            )
     app = Flask(__name__, instance_relative_config=False)
     bootstrap = Bootstrap(app)  # noqa
-    dash_app = dash_view.add_dash(app)  # noqa
+    dash_app = dash_view.add_dash(app, config, preload=production)  # noqa
 
     app.register_blueprint(routes.main_bp)
-    app.run(debug=debug, host=host, port=port)
+    app.register_blueprint(routes.api_bp)
+    if not production:
+        app.run(debug=debug, host=host, port=port)
+        return
+    # A worker waits for its analyses before it is replaced, and the polls of
+    # the analyses do not count towards its requests.
+    server = PreforkServer(
+        app,
+        host,
+        port,
+        workers,
+        threads,
+        max_requests,
+        timeout,
+        uncounted_paths=(dash_view.UPDATE_PATH,),
+        busy=app.extensions["youtoxic"]["jobs"].active,
+    )
+    server.bind()
+    click.echo(
+        "Serving on http://{}:{} with {} workers of {} threads".format(
+            host, port, workers, threads
+        )
+    )
+    server.run()
+
+
+@main.command("convert-weights")
+def convert_weights_command():
+    """Converts the trained weights and vocabularies of each head into the memory-mapped formats.
+
+    Files that are already converted and up to date are skipped.
+
+    Returns
+    -------
+    None
+
+    """
+    mappings_filenames = {
+        head: "youtoxic/app/models/{}_mappings.pkl".format(head) for head in HEADS
+    }
+    filename = convert_mappings(mappings_filenames, VOCABULARIES_FILENAME)
+    click.echo("vocabularies: {}".format(filename))
+    vocabularies = load_vocabularies(filename)
+    for head in HEADS:
+        filename = convert_weights(
+            len(vocabularies[head]), "youtoxic/app/models/{}_model.h5".format(head)
+        )
+        click.echo("{}: {}".format(head, filename))
+
+
+@main.command("train-students")
+@click.argument("corpus")
+@click.option("--text-column", default="comment_text", help="column of the texts")
+@click.option("--heads", default=",".join(HEADS), help="comma separated heads")
+@click.option("--agreement", default=0.99, help="minimum agreement with the teacher")
+def train_students_command(corpus, text_column, heads, agreement):
+    """Distills a student for each head from its predictions on the texts of a CSV file.
+
+    The students are saved next to the models and used when STUDENT_MODELS is set.
+
+    Parameters
+    ----------
+    corpus : str
+        The CSV file of training texts.
+    text_column : str
+        The column of the texts.
+    heads : str
+        The comma separated heads to distill.
+    agreement : float
+        The minimum agreement with the teacher on each side of the uncertain band.
+
+    Returns
+    -------
+    None
+
+    """
+    config = Config()
+    config.student_models = False
+    config.cascade_floor = 0
+    config.prediction_cache_entries = 0
+    pipeline = Pipeline(config=config)
+    texts = pd.read_csv(corpus)[text_column].astype(str).tolist()
+    students, reports = distill_students(
+        pipeline, texts, heads.split(","), agreement=agreement
+    )
+    for head, student in students.items():
+        student.save(STUDENT_FILENAME.format(head))
+        click.echo(str(reports[head]))
+    pipeline.close()
 
 
 if __name__ == "__main__":
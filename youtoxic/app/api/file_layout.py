@@ -5,6 +5,8 @@ import dash_core_components as dcc
 
 import dash_html_components as html
 
+from youtoxic.app.api.job_layout import job_layout
+
 
 file_layout = html.Div(
     [
@@ -25,11 +27,8 @@ file_layout = html.Div(
             ),
             className="row",
         ),
-        dcc.Loading(id="loading-1",
-                    type="cube",
-                    color="#00CC00",
-                    children=html.Div(id="file-container",
-                                      style={"marginTop": 20, "marginBottom": 20})),
+        html.Div(id="file-container", style={"marginTop": 20, "marginBottom": 20}),
+        job_layout("file"),
         html.Div(
             [
                 dcc.Checklist(
@@ -9,10 +9,10 @@ import dash_html_components as html
 import pandas as pd
 
 from youtoxic.app.utils.create_tables import create_file_table
-from youtoxic.app.utils.predictions import make_predictions_multiple
+from youtoxic.app.utils.predictions import render_predictions
 
 
-def get_file_predictions(contents, filename, types, pipeline):
+def get_file_predictions(contents, filename, types, pipeline, report=None):
     """Returns the toxicity predictions for the texts contained in a csv or xls file.
 
     Parameters
@@ -25,6 +25,9 @@ def get_file_predictions(contents, filename, types, pipeline):
         The types of toxicity to predict for.
     pipeline : Pipeline
         The pipeline object used to make predictions.
+    report : callable
+        The report function of the background job running the analysis, which
+        is given partial results as batches of texts are predicted. See JobQueue.
 
     Returns
     -------
@@ -57,30 +60,32 @@ def get_file_predictions(contents, filename, types, pipeline):
 
     texts = df["text"].values
 
-    preds, judgements = make_predictions_multiple(texts, types, pipeline)
-
-    if "Toxicity" in types:
-        df["Toxicity_judgement"] = judgements["toxic"]
-        df["Toxicity_pred"] = preds["toxic"]
-        df["Toxicity_pred"] = df["Toxicity_pred"].map("{:.3f}".format)
-    if "Insult" in types:
-        df["Insult_judgement"] = judgements["insult"]
-        df["Insult_pred"] = preds["insult"]
-        df["Insult_pred"] = df["Insult_pred"].map("{:.3f}".format)
-    if "Obscenity" in types:
-        df["Obscenity_judgement"] = judgements["obscene"]
-        df["Obscenity_pred"] = preds["obscene"]
-        df["Obscenity_pred"] = df["Obscenity_pred"].map("{:.3f}".format)
-    if "Prejudice" in types:
-        df["Prejudice_judgement"] = judgements["prejudice"]
-        df["Prejudice_pred"] = preds["prejudice"]
-        df["Prejudice_pred"] = df["Prejudice_pred"].map("{:.3f}".format)
-
-    graph = create_file_table(df, types)
-
-    return html.Div(
-        [
-            html.H5(filename),
-            html.Div(graph)
-        ]
-    )
+    def render(done, preds, judgements):
+        done_df = df.iloc[:done].copy()
+        if "Toxicity" in types:
+            done_df["Toxicity_judgement"] = judgements["toxic"]
+            done_df["Toxicity_pred"] = preds["toxic"]
+            done_df["Toxicity_pred"] = done_df["Toxicity_pred"].map("{:.3f}".format)
+        if "Insult" in types:
+            done_df["Insult_judgement"] = judgements["insult"]
+            done_df["Insult_pred"] = preds["insult"]
+            done_df["Insult_pred"] = done_df["Insult_pred"].map("{:.3f}".format)
+        if "Obscenity" in types:
+            done_df["Obscenity_judgement"] = judgements["obscene"]
+            done_df["Obscenity_pred"] = preds["obscene"]
+            done_df["Obscenity_pred"] = done_df["Obscenity_pred"].map("{:.3f}".format)
+        if "Prejudice" in types:
+            done_df["Prejudice_judgement"] = judgements["prejudice"]
+            done_df["Prejudice_pred"] = preds["prejudice"]
+            done_df["Prejudice_pred"] = done_df["Prejudice_pred"].map("{:.3f}".format)
+
+        graph = create_file_table(done_df, types)
+
+        return html.Div(
+            [
+                html.H5(filename),
+                html.Div(graph)
+            ]
+        )
+
+    return render_predictions(texts, types, pipeline, render, report)
@@ -0,0 +1,38 @@
+"""Defines the components that follow the background job of an analysis.
+
+"""
+import dash_core_components as dcc
+
+import dash_html_components as html
+
+
+# How often a page polls the job of its analysis, in milliseconds.
+JOB_POLL_MS = 1000
+
+
+def job_layout(kind):
+    """Returns the components that hold, poll and cancel the job of an analysis.
+
+    Parameters
+    ----------
+    kind : str
+        The analysis, for example 'tweet'. It prefixes the ids of the components.
+
+    Returns
+    -------
+    html.Div
+        The layout holding the job id, the polling interval and the cancel button.
+
+    """
+    return html.Div(
+        [
+            dcc.Store(id="{}-job".format(kind)),
+            dcc.Interval(
+                id="{}-interval".format(kind), interval=JOB_POLL_MS, disabled=True
+            ),
+            html.Button("Cancel", id="{}-cancel".format(kind)),
+            html.Div(id="{}-cancelled".format(kind), style={"display": "none"}),
+        ],
+        className="row",
+        style={"marginBottom": 20},
+    )
@@ -0,0 +1,49 @@
+"""For displaying the progress and results of the background job of an analysis.
+
+"""
+import dash_html_components as html
+
+
+def get_job_status(job):
+    """Returns the progress of a job above its latest results.
+
+    Parameters
+    ----------
+    job : dict
+        The job as returned by JobQueue.get. None if the job expired.
+
+    Returns
+    -------
+    html.Div
+        The html layout for the subsection of the page that contains results.
+
+    """
+    if job is None:
+        return html.Div(
+            "Error: The analysis expired. Please submit it again.",
+            style={"color": "rgb(255, 0, 0"},
+        )
+    if job["state"] == "failed":
+        return html.Div(
+            "Error: The analysis failed. {}".format(job["error"] or ""),
+            style={"color": "rgb(255, 0, 0"},
+        )
+    if job["state"] == "done":
+        return job["result"]
+
+    if job["state"] == "queued":
+        message = html.P("Waiting for other analyses to finish...")
+    elif job["state"] == "cancelled":
+        message = html.P("Cancelled after analyzing {} texts.".format(job["done"]))
+    elif not job["total"]:
+        message = html.P("Collecting texts...")
+    else:
+        message = html.Div(
+            [
+                html.P("Analyzed {} of {} texts.".format(job["done"], job["total"])),
+                html.Progress(value=str(job["done"]), max=str(job["total"])),
+            ]
+        )
+    return html.Div(
+        [html.Div(message, className="row", style={"marginBottom": 20}), job["result"]]
+    )
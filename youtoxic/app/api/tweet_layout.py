@@ -7,6 +7,8 @@ import dash_core_components as dcc
 
 import dash_html_components as html
 
+from youtoxic.app.api.job_layout import job_layout
+
 
 tweet_layout = html.Div(
     [
@@ -33,11 +35,8 @@ tweet_layout = html.Div(
                 style={"color": "rgb(125, 125, 125", "marginTop": 20},
             ), className="row",
         ),
-        dcc.Loading(id="loading-1",
-                    type="cube",
-                    color="#00CC00",
-                    children=html.Div(id="tweet-container",
-                                      style={"marginTop": 20, "marginBottom": 20})),
+        html.Div(id="tweet-container", style={"marginTop": 20, "marginBottom": 20}),
+        job_layout("tweet"),
         html.Div(
             [
                 html.Div(
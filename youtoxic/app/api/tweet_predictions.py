@@ -13,12 +13,12 @@ from youtoxic.app.services.tweet_dumper import (
 from youtoxic.app.utils.create_dataframes import create_tweets_df
 from youtoxic.app.utils.create_graphs import create_average_toxicity_graph, create_violin_plot
 from youtoxic.app.utils.create_tables import create_tweets_table
-from youtoxic.app.utils.predictions import make_predictions_multiple
+from youtoxic.app.utils.predictions import render_predictions
 from youtoxic.app.utils.preprocessing import preprocess_texts
 
 
 def get_tweet_predictions(
-    username, num_tweets, types, limit_date, start_date, end_date, pipeline
+    username, num_tweets, types, limit_date, start_date, end_date, pipeline, report=None
 ):
     """Collects tweets, analyzes them, and creates a table and a line graph.
 
@@ -38,6 +38,9 @@ def get_tweet_predictions(
         Maximum date for date-limited collection. Only matters if limit_date == 'date'.
     pipeline : Pipeline
         The pipeline object used to make predictions.
+    report : callable
+        The report function of the background job running the analysis, which
+        is given partial results as batches of tweets are predicted. See JobQueue.
 
     Returns
     -------
@@ -79,11 +82,6 @@ def get_tweet_predictions(
     times = [row[1].astimezone() for row in tweets]
     texts = [row[2] for row in tweets]
     texts = preprocess_texts(texts)
-    preds, judgements = make_predictions_multiple(texts, types, pipeline)
-    df = create_tweets_df(tweets, types, preds, judgements)
-    table = create_tweets_table(df, types)
-    graph = create_average_toxicity_graph(times, types, preds)
-    violin_plot = create_violin_plot(types, preds)
 
     over_max_tweets_message = None
     if num_tweets > 3240:
@@ -99,16 +97,24 @@ def get_tweet_predictions(
             className="row",
         )
 
-    return html.Div(
-        [
-            html.Div(over_max_tweets_message),
-            html.Div(children=[
-                html.Div(table, className="six columns", style={"overflow": "scroll", "height": 922}),
-                html.Div(graph, className="six columns", style={"marginBottom": 20}),
-                html.Div(violin_plot, className="six columns"),
+    def render(done, preds, judgements):
+        df = create_tweets_df(tweets[:done], types, preds, judgements)
+        table = create_tweets_table(df, types)
+        graph = create_average_toxicity_graph(times[:done], types, preds)
+        violin_plot = create_violin_plot(types, preds)
+
+        return html.Div(
+            [
+                html.Div(over_max_tweets_message),
+                html.Div(children=[
+                    html.Div(table, className="six columns", style={"overflow": "scroll", "height": 922}),
+                    html.Div(graph, className="six columns", style={"marginBottom": 20}),
+                    html.Div(violin_plot, className="six columns"),
+                ],
+                    className="row",
+                    style={"marginBottom": 20},
+                )
             ],
-                className="row",
-                style={"marginBottom": 20},
-            )
-        ],
-    )
+        )
+
+    return render_predictions(texts, types, pipeline, render, report)
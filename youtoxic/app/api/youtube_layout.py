@@ -5,6 +5,8 @@ import dash_core_components as dcc
 
 import dash_html_components as html
 
+from youtoxic.app.api.job_layout import job_layout
+
 
 youtube_layout = html.Div(
     [
@@ -23,11 +25,8 @@ youtube_layout = html.Div(
             ),
             className="row",
         ),
-        dcc.Loading(id="loading-1",
-                    type="cube",
-                    color="#00CC00",
-                    children=html.Div(id="youtube-container",
-                                      style={"marginTop": 20, "marginBottom": 20})),
+        html.Div(id="youtube-container", style={"marginTop": 20, "marginBottom": 20}),
+        job_layout("youtube"),
         html.Div(
             [
                 html.Div(
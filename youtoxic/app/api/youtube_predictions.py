@@ -6,10 +6,10 @@ from youtoxic.app.services.youtube_comment_dumper import get_top_level_comments
 from youtoxic.app.utils.create_dataframes import create_youtube_df
 from youtoxic.app.utils.create_graphs import create_average_toxicity_graph, create_violin_plot
 from youtoxic.app.utils.create_tables import create_youtube_table
-from youtoxic.app.utils.predictions import make_predictions_multiple
+from youtoxic.app.utils.predictions import render_predictions
 
 
-def get_youtube_predictions(video_id, types, pipeline):
+def get_youtube_predictions(video_id, types, pipeline, report=None):
     """Collects youtube comments, analyzes them, and creates a table and a line graph.
 
     Parameters
@@ -20,6 +20,9 @@ def get_youtube_predictions(video_id, types, pipeline):
         Predictions will be made for these types of toxicity
     pipeline : Pipeline
         The pipeline object used to make predictions.
+    report : callable
+        The report function of the background job running the analysis, which
+        is given partial results as batches of comments are predicted. See JobQueue.
 
     Returns
     -------
@@ -54,19 +57,22 @@ def get_youtube_predictions(video_id, types, pipeline):
     authors = [author for time, author in sorted(zip(times, authors))]
     times = sorted(times)
 
-    preds, judgements = make_predictions_multiple(comments, types, pipeline)
+    def render(done, preds, judgements):
+        df = create_youtube_df(
+            comments[:done], authors[:done], times[:done], types, preds, judgements
+        )
+        table = create_youtube_table(df, types)
+        graph = create_average_toxicity_graph(times[:done], types, preds)
+        plot = create_violin_plot(types, preds)
 
-    df = create_youtube_df(comments, authors, times, types, preds, judgements)
-    table = create_youtube_table(df, types)
-    graph = create_average_toxicity_graph(times, types, preds)
-    plot = create_violin_plot(types, preds)
+        return html.Div(
+            [
+                html.Div(table, className="six columns", style={"overflow": "scroll", "height": 922}),
+                html.Div(graph, className="six columns", style={"marginBottom": 20}),
+                html.Div(plot, className="six columns"),
+            ],
+            className="row",
+            style={"marginBottom": 20},
+        )
 
-    return html.Div(
-        [
-            html.Div(table, className="six columns", style={"overflow": "scroll", "height": 922}),
-            html.Div(graph, className="six columns", style={"marginBottom": 20}),
-            html.Div(plot, className="six columns"),
-        ],
-        className="row",
-        style={"marginBottom": 20},
-    )
+    return render_predictions(comments, types, pipeline, render, report)
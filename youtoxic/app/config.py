@@ -4,6 +4,9 @@
 import os
 
 
+DEFAULT_HEADS = "toxicity,insult,obscenity,identity"
+
+
 class Config:
     def __init__(self):
         self.consumer_key = os.environ.get("CONSUMER_KEY") or ""
@@ -11,6 +14,46 @@ class Config:
         self.access_key = os.environ.get("ACCESS_KEY") or ""
         self.access_secret = os.environ.get("ACCESS_SECRET") or ""
         self.youtube_key = os.environ.get("YOUTUBE_KEY") or ""
+        self.batch_size = int(os.environ.get("BATCH_SIZE") or 64)
+        self.token_budget = int(os.environ.get("TOKEN_BUDGET") or 8192)
+        self.tokenizer_workers = int(
+            os.environ.get("TOKENIZER_WORKERS") or min(4, os.cpu_count() or 1)
+        )
+        self.tokenizer_chunk_size = int(os.environ.get("TOKENIZER_CHUNK_SIZE") or 256)
+        self.freeze_models = os.environ.get("FREEZE_MODELS", "1") != "0"
+        self.quantize_models = os.environ.get("QUANTIZE_MODELS", "0") != "0"
+        # Quantized models keep only their embeddings mapped. Their int8 LSTM and
+        # linear weights are built in each process that loads them.
+        self.mmap_weights = os.environ.get("MMAP_WEIGHTS", "1") != "0"
+        self.inference_backend = os.environ.get("INFERENCE_BACKEND") or "eager"
+        self.enabled_heads = [
+            head.strip()
+            for head in (os.environ.get("ENABLED_HEADS") or DEFAULT_HEADS).split(",")
+            if head.strip()
+        ]
+        self.max_loaded_heads = int(os.environ.get("MAX_LOADED_HEADS") or 0)
+        self.head_idle_seconds = float(os.environ.get("HEAD_IDLE_SECONDS") or 0)
+        self.head_workers = int(os.environ.get("HEAD_WORKERS") or 4)
+        self.intra_op_threads = int(
+            os.environ.get("INTRA_OP_THREADS") or os.cpu_count() or 1
+        )
+        self.model_workers = int(os.environ.get("MODEL_WORKERS") or 0)
+        self.worker_threads = int(os.environ.get("WORKER_THREADS") or 1)
+        self.pin_workers = os.environ.get("PIN_WORKERS", "0") != "0"
+        self.batch_window_ms = float(os.environ.get("BATCH_WINDOW_MS") or 5)
+        self.prediction_cache_entries = int(
+            os.environ.get("PREDICTION_CACHE_ENTRIES") or 100000
+        )
+        self.prediction_cache_file = os.environ.get("PREDICTION_CACHE_FILE") or ""
+        self.cascade_floor = float(os.environ.get("CASCADE_FLOOR") or 0)
+        self.student_models = os.environ.get("STUDENT_MODELS", "0") != "0"
+        self.max_tokens = int(os.environ.get("MAX_TOKENS") or 0)
+        self.long_text_mode = os.environ.get("LONG_TEXT_MODE") or "truncate"
+        self.window_stride = int(os.environ.get("WINDOW_STRIDE") or 0)
+        self.window_aggregation = os.environ.get("WINDOW_AGGREGATION") or "max"
+        self.stream_chunk_size = int(os.environ.get("STREAM_CHUNK_SIZE") or 0)
+        self.job_workers = int(os.environ.get("JOB_WORKERS") or 2)
+        self.job_store_file = os.environ.get("JOB_STORE_FILE") or ""
 
     @property
     def consumer_key(self):
@@ -51,3 +94,227 @@ class Config:
     @youtube_key.setter
     def youtube_key(self, value):
         self.__youtube_key = value
+
+    @property
+    def batch_size(self):
+        return self.__batch_size
+
+    @batch_size.setter
+    def batch_size(self, value):
+        self.__batch_size = value
+
+    @property
+    def token_budget(self):
+        return self.__token_budget
+
+    @token_budget.setter
+    def token_budget(self, value):
+        self.__token_budget = value
+
+    @property
+    def tokenizer_workers(self):
+        return self.__tokenizer_workers
+
+    @tokenizer_workers.setter
+    def tokenizer_workers(self, value):
+        self.__tokenizer_workers = value
+
+    @property
+    def tokenizer_chunk_size(self):
+        return self.__tokenizer_chunk_size
+
+    @tokenizer_chunk_size.setter
+    def tokenizer_chunk_size(self, value):
+        self.__tokenizer_chunk_size = value
+
+    @property
+    def freeze_models(self):
+        return self.__freeze_models
+
+    @freeze_models.setter
+    def freeze_models(self, value):
+        self.__freeze_models = value
+
+    @property
+    def quantize_models(self):
+        return self.__quantize_models
+
+    @quantize_models.setter
+    def quantize_models(self, value):
+        self.__quantize_models = value
+
+    @property
+    def mmap_weights(self):
+        return self.__mmap_weights
+
+    @mmap_weights.setter
+    def mmap_weights(self, value):
+        self.__mmap_weights = value
+
+    @property
+    def inference_backend(self):
+        return self.__inference_backend
+
+    @inference_backend.setter
+    def inference_backend(self, value):
+        self.__inference_backend = value
+
+    @property
+    def enabled_heads(self):
+        return self.__enabled_heads
+
+    @enabled_heads.setter
+    def enabled_heads(self, value):
+        self.__enabled_heads = value
+
+    @property
+    def max_loaded_heads(self):
+        return self.__max_loaded_heads
+
+    @max_loaded_heads.setter
+    def max_loaded_heads(self, value):
+        self.__max_loaded_heads = value
+
+    @property
+    def head_idle_seconds(self):
+        return self.__head_idle_seconds
+
+    @head_idle_seconds.setter
+    def head_idle_seconds(self, value):
+        self.__head_idle_seconds = value
+
+    @property
+    def head_workers(self):
+        return self.__head_workers
+
+    @head_workers.setter
+    def head_workers(self, value):
+        self.__head_workers = value
+
+    @property
+    def intra_op_threads(self):
+        return self.__intra_op_threads
+
+    @intra_op_threads.setter
+    def intra_op_threads(self, value):
+        self.__intra_op_threads = value
+
+    @property
+    def model_workers(self):
+        return self.__model_workers
+
+    @model_workers.setter
+    def model_workers(self, value):
+        self.__model_workers = value
+
+    @property
+    def worker_threads(self):
+        return self.__worker_threads
+
+    @worker_threads.setter
+    def worker_threads(self, value):
+        self.__worker_threads = value
+
+    @property
+    def pin_workers(self):
+        return self.__pin_workers
+
+    @pin_workers.setter
+    def pin_workers(self, value):
+        self.__pin_workers = value
+
+    @property
+    def batch_window_ms(self):
+        return self.__batch_window_ms
+
+    @batch_window_ms.setter
+    def batch_window_ms(self, value):
+        self.__batch_window_ms = value
+
+    @property
+    def prediction_cache_entries(self):
+        return self.__prediction_cache_entries
+
+    @prediction_cache_entries.setter
+    def prediction_cache_entries(self, value):
+        self.__prediction_cache_entries = value
+
+    @property
+    def prediction_cache_file(self):
+        return self.__prediction_cache_file
+
+    @prediction_cache_file.setter
+    def prediction_cache_file(self, value):
+        self.__prediction_cache_file = value
+
+    @property
+    def cascade_floor(self):
+        return self.__cascade_floor
+
+    @cascade_floor.setter
+    def cascade_floor(self, value):
+        self.__cascade_floor = value
+
+    @property
+    def student_models(self):
+        return self.__student_models
+
+    @student_models.setter
+    def student_models(self, value):
+        self.__student_models = value
+
+    @property
+    def max_tokens(self):
+        return self.__max_tokens
+
+    @max_tokens.setter
+    def max_tokens(self, value):
+        self.__max_tokens = value
+
+    @property
+    def long_text_mode(self):
+        return self.__long_text_mode
+
+    @long_text_mode.setter
+    def long_text_mode(self, value):
+        self.__long_text_mode = value
+
+    @property
+    def window_stride(self):
+        return self.__window_stride
+
+    @window_stride.setter
+    def window_stride(self, value):
+        self.__window_stride = value
+
+    @property
+    def window_aggregation(self):
+        return self.__window_aggregation
+
+    @window_aggregation.setter
+    def window_aggregation(self, value):
+        self.__window_aggregation = value
+
+    @property
+    def stream_chunk_size(self):
+        return self.__stream_chunk_size
+
+    @stream_chunk_size.setter
+    def stream_chunk_size(self, value):
+        self.__stream_chunk_size = value
+
+    @property
+    def job_workers(self):
+        return self.__job_workers
+
+    @job_workers.setter
+    def job_workers(self, value):
+        self.__job_workers = value
+
+    @property
+    def job_store_file(self):
+        return self.__job_store_file
+
+    @job_store_file.setter
+    def job_store_file(self, value):
+        self.__job_store_file = value
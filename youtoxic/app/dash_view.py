@@ -11,27 +11,239 @@ import dash_html_components as html
 from youtoxic.app.api.dash_layout import dash_layout
 from youtoxic.app.api.file_layout import file_layout
 from youtoxic.app.api.file_predictions import get_file_predictions
+from youtoxic.app.api.job_status import get_job_status
 from youtoxic.app.api.text_layout import text_layout
 from youtoxic.app.api.text_predictions import get_text_predictions
 from youtoxic.app.api.tweet_layout import tweet_layout
 from youtoxic.app.api.tweet_predictions import get_tweet_predictions
 from youtoxic.app.api.youtube_layout import youtube_layout
 from youtoxic.app.api.youtube_predictions import get_youtube_predictions
+from youtoxic.app.config import Config
+from youtoxic.app.services.jobs import FINISHED, JobQueue
+from youtoxic.app.services.micro_batcher import MicroBatcher
 from youtoxic.app.services.pipeline import Pipeline
+from youtoxic.app.services.worker_pool import ModelWorkerPool
+from youtoxic.app.utils.predictions import get_executor
 
 
+DASH_PREFIX = "/dash/"
+# The path of the callbacks of the Dash app, including the polls of the analyses.
+UPDATE_PATH = DASH_PREFIX + "_dash-update-component"
+
 url_bar_and_content_div = html.Div(
     [dcc.Location(id="url", refresh=False), html.Div(id="page-content")]
 )
 
 
-def add_dash(server):
+def add_submit_callbacks(dash_app, jobs, pipeline):
+    """Adds the callbacks that start the tweet, YouTube and file analyses as jobs.
+
+    Parameters
+    ----------
+    dash_app : Dash
+        The Dash app.
+    jobs : JobQueue
+        The queue running the analyses.
+    pipeline : Pipeline or ModelWorkerPool
+        The pipeline object the analyses use to make predictions.
+
+    """
+
+    @dash_app.callback(
+        Output("tweet-job", "data"),
+        [Input("button", "n_clicks")],
+        [
+            State("input-text", "value"),
+            State("input-num", "value"),
+            State("types", "values"),
+            State("limit-by-date", "value"),
+            State("date-picker", "start_date"),
+            State("date-picker", "end_date"),
+        ],
+    )
+    def submit_tweet_job(
+        n_clicks, username, num_tweets, types, limit_date, start_date, end_date
+    ):
+        """Callback function to start the analysis of the tweets of a Twitter username.
+
+        Parameters
+        ----------
+        n_clicks : int
+            Number of times 'Submit' has been clicked. Set to None until user has clicked 'Submit' at least once.
+        username : str
+            Tweets will be collected from this user.
+        num_tweets : int
+            The maximum number of tweets to analyze.
+        types : list of str
+            The types of toxicity to predict for.
+        limit_date : str
+            Whether to get tweets between a certain date range ('date') or the most recent tweets ('all').
+        start_date : Datetime
+            The beginning value of the date range. Only matters if limit_date == 'date'.
+        end_date : Datetime
+            The ending value of the date range. Only matters if limit_date == 'date'.
+
+        Returns
+        -------
+        str
+           The id of the background job of the analysis.
+
+        """
+        if n_clicks is not None:
+            return jobs.submit(
+                get_tweet_predictions,
+                username,
+                num_tweets,
+                types,
+                limit_date,
+                start_date,
+                end_date,
+                pipeline,
+            )
+
+    @dash_app.callback(
+        Output("youtube-job", "data"),
+        [Input("button", "n_clicks")],
+        [
+            State("input-text", "value"),
+            State("types", "values"),
+        ],
+    )
+    def submit_youtube_job(n_clicks, video_id, types):
+        """Callback function to start the analysis of the comments of a YouTube video.
+
+        Parameters
+        ----------
+        n_clicks : int
+            Number of times 'Submit' has been clicked. Set to None until user has clicked 'Submit' at least once.
+        video_id : str
+            Comments will be collected from the video with this id or url.
+        types : list of str
+            The types of toxicity to predict for.
+
+        Returns
+        -------
+        str
+           The id of the background job of the analysis.
+
+        """
+        if n_clicks is not None:
+            return jobs.submit(get_youtube_predictions, video_id, types, pipeline)
+
+    @dash_app.callback(
+        Output("file-job", "data"),
+        [Input("upload-data", "contents")],
+        [State("upload-data", "filename"), State("types", "values")],
+    )
+    def submit_file_job(contents, filename, types):
+        """Callback function to start the analysis of the texts of a file.
+
+        Parameters
+        ----------
+        contents : str
+            Contents of the uploaded file.
+        filename : str
+            The name of the file.
+        types : list of str
+            The types of toxicity to predict for.
+
+        Returns
+        -------
+        str
+           The id of the background job of the analysis.
+
+        """
+        if contents is not None:
+            return jobs.submit(
+                get_file_predictions, contents, filename, types, pipeline
+            )
+
+
+def add_job_callbacks(dash_app, jobs, kind):
+    """Adds the callbacks that poll and cancel the background job of an analysis.
+
+    Parameters
+    ----------
+    dash_app : Dash
+        The Dash app.
+    jobs : JobQueue
+        The queue running the analyses.
+    kind : str
+        The analysis, for example 'tweet'. See job_layout.
+
+    """
+
+    @dash_app.callback(
+        [
+            Output("{}-container".format(kind), "children"),
+            Output("{}-interval".format(kind), "disabled"),
+        ],
+        [
+            Input("{}-job".format(kind), "data"),
+            Input("{}-interval".format(kind), "n_intervals"),
+        ],
+    )
+    def poll_job(job_id, n_intervals):
+        """Callback function to display the progress and latest results of an analysis.
+
+        Parameters
+        ----------
+        job_id : str
+            The id of the background job of the analysis. None until an analysis is submitted.
+        n_intervals : int
+            Number of times the job has been polled.
+
+        Returns
+        -------
+        html.Div
+            The html layout for the subsection of the page that contains results.
+        bool
+            Whether polling stops, once the job is finished.
+
+        """
+        if job_id is None:
+            return None, True
+        job = jobs.get(job_id)
+        return get_job_status(job), job is None or job["state"] in FINISHED
+
+    @dash_app.callback(
+        Output("{}-cancelled".format(kind), "children"),
+        [Input("{}-cancel".format(kind), "n_clicks")],
+        [State("{}-job".format(kind), "data")],
+    )
+    def cancel_job(n_clicks, job_id):
+        """Callback function to cancel an analysis.
+
+        Parameters
+        ----------
+        n_clicks : int
+            Number of times 'Cancel' has been clicked.
+        job_id : str
+            The id of the background job of the analysis.
+
+        Returns
+        -------
+        str
+            The id of the cancelled job.
+
+        """
+        if n_clicks is not None and job_id is not None:
+            jobs.cancel(job_id)
+        return job_id
+
+
+def add_dash(server, config=None, preload=False):
     """Initializes the Dash app.
 
     Parameters
     ----------
     server : Flask
         The Flask app that serves the Dash app.
+    config : Config
+        The application configuration. Read from the environment if None.
+    preload : bool
+        Whether the models of the enabled heads are loaded now rather than on
+        first use, so that processes forked later share them.
 
     Returns
     -------
@@ -45,13 +257,43 @@ def add_dash(server):
         server=server,
         assets_folder="assets/",
         external_stylesheets=external_stylesheets,
-        routes_pathname_prefix="/dash/",
+        routes_pathname_prefix=DASH_PREFIX,
     )
 
     dash_app.title = "YouToxic"
     dash_app.layout = dash_layout
     dash_app.config["suppress_callback_exceptions"] = True
-    pipeline = Pipeline()
+    config = config or Config()
+    pipeline = Pipeline(config=config)
+    if preload:
+        pipeline.heads.preload()
+    if config.model_workers > 0:
+        pipeline = ModelWorkerPool(
+            pipeline, config.model_workers, config.worker_threads, config.pin_workers
+        ).start()
+    # The heads of a request run on the threads of the executor, within the
+    # intra-op thread budget of the configuration.
+    executor = get_executor(config)
+    # Single texts from concurrent users are predicted together.
+    text_pipeline = pipeline
+    if config.batch_window_ms > 0:
+        text_pipeline = MicroBatcher(
+            pipeline,
+            config.batch_size,
+            config.batch_window_ms / 1000,
+            executor=executor,
+        )
+    # Tweet, YouTube and file analyses run as background jobs that the pages poll.
+    jobs = JobQueue(config.job_workers, config.job_store_file or None)
+    # The REST API of routes.api_bp scores texts with the same pipelines, and
+    # the production server drains the jobs of a worker before replacing it.
+    server.extensions["youtoxic"] = dict(
+        pipeline=pipeline,
+        text_pipeline=text_pipeline,
+        heads=config.enabled_heads,
+        cascade_floor=config.cascade_floor,
+        jobs=jobs,
+    )
 
     @dash_app.callback(Output("content", "children"), [Input("tabs", "value")])
     def display_page(tab):
@@ -103,52 +345,7 @@ def add_dash(server):
 
         """
         if n_clicks is not None:
-            return get_text_predictions(text, types, pipeline)
-
-    @dash_app.callback(
-        Output("tweet-container", "children"),
-        [Input("button", "n_clicks")],
-        [
-            State("input-text", "value"),
-            State("input-num", "value"),
-            State("types", "values"),
-            State("limit-by-date", "value"),
-            State("date-picker", "start_date"),
-            State("date-picker", "end_date"),
-        ],
-    )
-    def update_tweet_output(
-        n_clicks, username, num_tweets, types, limit_date, start_date, end_date
-    ):
-        """Callback function to display prediction results of a Twitter username search.
-
-        Parameters
-        ----------
-        n_clicks : int
-            Number of times 'Submit' has been clicked. Set to None until user has clicked 'Submit' at least once.
-        username : str
-            Tweets will be collected from this user.
-        num_tweets : int
-            The maximum number of tweets to analyze.
-        types : list of str
-            The types of toxicity to predict for.
-        limit_date : str
-            Whether to get tweets between a certain date range ('date') or the most recent tweets ('all').
-        start_date : Datetime
-            The beginning value of the date range. Only matters if limit_date == 'date'.
-        end_date : Datetime
-            The ending value of the date range. Only matters if limit_date == 'date'.
-
-        Returns
-        -------
-        html.Div
-           The html layout for the subsection of the page that contains results.
-
-        """
-        if n_clicks is not None:
-            return get_tweet_predictions(
-                username, num_tweets, types, limit_date, start_date, end_date, pipeline
-            )
+            return get_text_predictions(text, types, text_pipeline)
 
     @dash_app.callback(
         Output("date-picker", "style"), [Input("limit-by-date", "value")]
@@ -172,63 +369,8 @@ def add_dash(server):
         else:
             return {"display": "none"}
 
-    @dash_app.callback(
-        Output("youtube-container", "children"),
-        [Input("button", "n_clicks")],
-        [
-            State("input-text", "value"),
-            State("types", "values"),
-        ],
-    )
-    def update_tweet_output(
-        n_clicks, video_id, types
-    ):
-        """Callback function to display prediction results of a Twitter username search.
-
-        Parameters
-        ----------
-        n_clicks : int
-            Number of times 'Submit' has been clicked. Set to None until user has clicked 'Submit' at least once.
-        video_id : str
-            Tweets will be collected from this user.
-        types : list of str
-            The types of toxicity to predict for.
-
-        Returns
-        -------
-        html.Div
-           The html layout for the subsection of the page that contains results.
-
-        """
-        if n_clicks is not None:
-            return get_youtube_predictions(
-                video_id, types, pipeline
-            )
-
-    @dash_app.callback(
-        Output("file-container", "children"),
-        [Input("upload-data", "contents")],
-        [State("upload-data", "filename"), State("types", "values")],
-    )
-    def update_file_output(contents, filename, types):
-        """Callback function to display prediction results of file analysis.
-
-        Parameters
-        ----------
-        contents : str
-            Contents of the uploaded file.
-        filename : str
-            The name of the file.
-        types : list of str
-            The types of toxicity to predict for.
-
-        Returns
-        -------
-        html.Div
-            The html layout for the subsection of the page that contains results.
-
-        """
-        if contents is not None:
-            return get_file_predictions(contents, filename, types, pipeline)
+    add_submit_callbacks(dash_app, jobs, pipeline)
+    for kind in ("tweet", "youtube", "file"):
+        add_job_callbacks(dash_app, jobs, kind)
 
     return dash_app.server
@@ -1,15 +1,350 @@
 """Contains routes for the flask app.
 
 """
-from flask import Blueprint, render_template
+import json
+import os
+
+from flask import (
+    Blueprint,
+    Response,
+    current_app,
+    jsonify,
+    render_template,
+    request,
+    stream_with_context,
+)
+
+from youtoxic.app.services.pipeline import is_cascaded
+from youtoxic.app.utils.predictions import get_executor
 
 
 main_bp = Blueprint(
     "main_bp", __name__, template_folder="templates", static_folder="static"
 )
+api_bp = Blueprint("api_bp", __name__, url_prefix="/api")
+
+# The number of texts of a batch request scored between the results it streams.
+STREAM_BATCH_SIZE = 256
+NDJSON = "application/x-ndjson"
 
 
 @main_bp.route("/", methods=["GET"])
 @main_bp.route("/index")
 def index():
     return render_template("index.html", title="YouToxic", template="home_template")
+
+
+def get_pipelines():
+    """Returns the pipelines and enabled heads the Dash app shares with the API.
+
+    Returns
+    -------
+    dict
+        The 'pipeline' of batches, the 'text_pipeline' of single texts, the
+        enabled 'heads' and the 'cascade_floor'. See dash_view.add_dash.
+
+    """
+    return current_app.extensions["youtoxic"]
+
+
+def parse_options(options, enabled):
+    """Reads the heads and thresholds of a scoring request.
+
+    Parameters
+    ----------
+    options : dict
+        The 'heads', a list or comma separated string, and the 'threshold', a
+        number for every head or a mapping of heads to numbers, or a comma
+        separated string of either.
+    enabled : tuple of str
+        The enabled heads, which are the default heads.
+
+    Returns
+    -------
+    heads : list of str
+        The heads to run.
+    thresholds : dict
+        Maps each head to the score above which a text is labelled.
+
+    Raises
+    ------
+    ValueError
+        If a head is not enabled or a threshold is not a number between 0 and 1.
+
+    """
+    heads = options.get("heads") or list(enabled)
+    if isinstance(heads, str):
+        heads = [head.strip() for head in heads.split(",") if head.strip()]
+    for head in heads:
+        if head not in enabled:
+            raise ValueError("Head is not enabled: {}".format(head))
+
+    threshold = options.get("threshold", 0.5)
+    if isinstance(threshold, str) and ":" in threshold:
+        pairs = [pair.partition(":") for pair in threshold.split(",")]
+        threshold = {head.strip(): value for head, _, value in pairs}
+    if not isinstance(threshold, dict):
+        threshold = {head: threshold for head in heads}
+    thresholds = dict()
+    for head in heads:
+        try:
+            thresholds[head] = float(threshold.get(head, 0.5))
+        except (TypeError, ValueError):
+            raise ValueError("Threshold is not a number: {}".format(threshold[head]))
+        if not 0 <= thresholds[head] <= 1:
+            raise ValueError("Threshold is not between 0 and 1: {}".format(head))
+    return heads, thresholds
+
+
+def parse_item(item):
+    """Reads the text and optional id of an item of a batch request.
+
+    Parameters
+    ----------
+    item : str or dict
+        A text, or an object with a 'text' and an optional 'id'.
+
+    Returns
+    -------
+    text : str
+        The text to score.
+    item_id
+        The id of the item, None if it has none.
+
+    Raises
+    ------
+    ValueError
+        If the item holds no text.
+
+    """
+    if isinstance(item, str):
+        return item, None
+    if isinstance(item, dict) and isinstance(item.get("text"), str):
+        return item["text"], item.get("id")
+    raise ValueError("Item is not a text nor an object with a text")
+
+
+def score_texts(texts, heads, thresholds, pipeline, cascade_floor=0):
+    """Scores texts with the heads and labels the scores above their thresholds.
+
+    Under a cascade, the scores of the other heads for the texts whose toxicity
+    is under the floor are only upper bounds, see is_cascaded. Such a score is
+    labelled False if it does not exceed the threshold, and None otherwise since
+    the text was not scored by the head.
+
+    Parameters
+    ----------
+    texts : list of str
+        The texts to score.
+    heads : list of str
+        The heads to run.
+    thresholds : dict
+        Maps each head to the score above which a text is labelled.
+    pipeline : Pipeline, MicroBatcher or ModelWorkerPool
+        The pipeline object to use to make predictions.
+    cascade_floor : float
+        The cascade floor of the pipeline.
+
+    Returns
+    -------
+    list of dict
+        The 'scores' and 'labels' of each text, mapping heads to numbers and
+        booleans, and the 'bounded' heads whose score is an upper bound, if any.
+
+    """
+    scored = [dict(scores=dict(), labels=dict()) for _ in texts]
+    if not texts or not heads:
+        return scored
+    results = get_executor().predict(pipeline, texts, heads)
+    for head in heads:
+        for result, pred in zip(scored, results[head][0]):
+            result["scores"][head] = float(pred)
+            result["labels"][head] = bool(pred > thresholds[head])
+    if is_cascaded(heads, cascade_floor):
+        for result in scored:
+            if result["scores"]["toxicity"] >= cascade_floor:
+                continue
+            result["bounded"] = [head for head in heads if head != "toxicity"]
+            for head in result["bounded"]:
+                if result["labels"][head]:
+                    result["labels"][head] = None
+    return scored
+
+
+def read_items():
+    """Yields the items of the body of a batch request, parsed or as errors.
+
+    A body of type application/x-ndjson holds an item per line and is read a
+    line at a time. Any other body is a JSON array of items.
+
+    Yields
+    ------
+    item
+        The item, or the ValueError raised when its line was parsed.
+
+    """
+    if request.mimetype != NDJSON:
+        items = request.get_json(force=True, silent=True)
+        if not isinstance(items, list):
+            yield ValueError("Body is not a JSON array")
+            return
+        yield from items
+        return
+    for line in request.stream:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            yield ValueError("Line is not JSON: {}".format(e))
+
+
+def score_stream(items, heads, thresholds, pipeline, cascade_floor=0, batch_size=None):
+    """Scores the items of a batch request a batch at a time.
+
+    Parameters
+    ----------
+    items : iterable
+        The items, as yielded by read_items.
+    heads : list of str
+        The heads to run.
+    thresholds : dict
+        Maps each head to the score above which a text is labelled.
+    pipeline : Pipeline or ModelWorkerPool
+        The pipeline object to use to make predictions.
+    cascade_floor : float
+        The cascade floor of the pipeline.
+    batch_size : int
+        The number of items scored at a time. STREAM_BATCH_SIZE if None.
+
+    Yields
+    ------
+    str
+        A JSON line with the 'index' of each item, its 'id' if it has one, and
+        its result from score_texts, or the 'error' that kept it from being
+        scored.
+
+    """
+
+    def score_batch(batch):
+        parsed = list()
+        for index, item in batch:
+            try:
+                if isinstance(item, ValueError):
+                    raise item
+                parsed.append((index,) + parse_item(item) + (None,))
+            except ValueError as e:
+                parsed.append((index, None, None, str(e)))
+        texts = [text for _, text, _, error in parsed if error is None]
+        scored = iter(score_texts(texts, heads, thresholds, pipeline, cascade_floor))
+        for index, _, item_id, error in parsed:
+            line = dict(index=index)
+            if item_id is not None:
+                line["id"] = item_id
+            line.update(dict(error=error) if error is not None else next(scored))
+            yield json.dumps(line) + "\n"
+
+    batch_size = batch_size or STREAM_BATCH_SIZE
+    batch = list()
+    for index, item in enumerate(items):
+        batch.append((index, item))
+        if len(batch) == batch_size:
+            yield from score_batch(batch)
+            batch = list()
+    if batch:
+        yield from score_batch(batch)
+
+
+@api_bp.route("/score", methods=["POST"])
+def score():
+    """Scores a single text.
+
+    The body is a JSON object with the 'text' and, optionally, the 'heads' and
+    'threshold' read by parse_options. They may also be given as query
+    arguments. Texts from concurrent requests are scored together.
+
+    Returns
+    -------
+    Response
+        A JSON object with the 'scores' and 'labels' of the text, see score_texts.
+
+    """
+    body = request.get_json(force=True, silent=True)
+    if not isinstance(body, dict) or not isinstance(body.get("text"), str):
+        return jsonify(error="Body is not a JSON object with a text"), 400
+    pipelines = get_pipelines()
+    try:
+        heads, thresholds = parse_options(
+            dict(request.args.items(), **body), pipelines["heads"]
+        )
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    (result,) = score_texts(
+        [body["text"]],
+        heads,
+        thresholds,
+        pipelines["text_pipeline"],
+        pipelines["cascade_floor"],
+    )
+    return jsonify(result)
+
+
+@api_bp.route("/score/batch", methods=["POST"])
+def score_batch():
+    """Scores a batch of texts and streams their results as they are scored.
+
+    The body is a JSON array or, with the application/x-ndjson type, a JSON
+    value per line. Each item is a text or an object with a 'text' and an
+    optional 'id'. The 'heads' and 'threshold' read by parse_options are query
+    arguments.
+
+    Returns
+    -------
+    Response
+        A JSON line per item, in order. See score_stream.
+
+    """
+    pipelines = get_pipelines()
+    try:
+        heads, thresholds = parse_options(request.args, pipelines["heads"])
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    lines = score_stream(
+        read_items(),
+        heads,
+        thresholds,
+        pipelines["pipeline"],
+        pipelines["cascade_floor"],
+    )
+    return Response(stream_with_context(lines), mimetype=NDJSON)
+
+
+@api_bp.route("/stats", methods=["GET"])
+def stats():
+    """Returns the statistics of the heads, cache and batcher of the answering process.
+
+    Each process loads its heads, caches its predictions and batches its texts
+    on its own, so the statistics are those of the worker with the returned
+    'pid'. The statistics of the heads and the cache are not available when
+    the models run on model workers, nor those of the batcher when texts are
+    not batched.
+
+    Returns
+    -------
+    Response
+        A JSON object with the 'pid', the 'heads' statistics, see HeadCache.stats,
+        the 'cache' statistics, see PredictionCache.stats, and the 'batcher'
+        statistics, see MicroBatcher.stats. Statistics that are not available
+        are null.
+
+    """
+    pipelines = get_pipelines()
+    heads = getattr(pipelines["pipeline"], "heads", None)
+    cache = getattr(pipelines["pipeline"], "cache", None)
+    batcher = pipelines["text_pipeline"]
+    return jsonify(
+        pid=os.getpid(),
+        heads=None if heads is None else heads.stats(),
+        cache=None if cache is None else cache.stats(),
+        batcher=batcher.stats() if hasattr(batcher, "stats") else None,
+    )
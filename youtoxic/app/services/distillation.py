@@ -0,0 +1,144 @@
+"""Contains implementation of the training of the student models on the predictions of the heads.
+
+"""
+import logging
+import time
+
+import numpy as np
+
+from youtoxic.app.utils.student import calibrate_band, table_fingerprint, train_student
+from youtoxic.app.utils.vocabulary import select_positions
+
+
+logger = logging.getLogger(__name__)
+
+
+class DistillationReport:
+    """Summarizes how a student compares with its teacher on held out texts.
+
+    Attributes
+    ----------
+    head : str
+        The head of the teacher.
+    texts : int
+        The number of held out texts.
+    answered : float
+        The fraction of the texts the student is confident about.
+    agreement : float
+        The fraction of the judgements of the student and escalated teacher that
+        agree with the teacher alone.
+    student_seconds : float
+        The time the student takes to predict the texts.
+    teacher_seconds : float
+        The time the teacher takes to predict the texts.
+
+    """
+
+    def __init__(
+        self, head, texts, answered, agreement, student_seconds, teacher_seconds
+    ):
+        self.head = head
+        self.texts = texts
+        self.answered = answered
+        self.agreement = agreement
+        self.student_seconds = student_seconds
+        self.teacher_seconds = teacher_seconds
+
+    @property
+    def speedup(self):
+        """float: The throughput of the student with escalation over the teacher's."""
+        seconds = self.student_seconds + (1 - self.answered) * self.teacher_seconds
+        return self.teacher_seconds / seconds if seconds else 0.0
+
+    def __str__(self):
+        return (
+            "{}: {} texts, {:.1%} answered by the student, {:.2%} agreement, "
+            "{:.1f}x throughput".format(
+                self.head, self.texts, self.answered, self.agreement, self.speedup
+            )
+        )
+
+
+def distill_students(pipeline, texts, heads, agreement=0.99, held_out=0.2, seed=0):
+    """Trains a student for each head on the predictions of the head's model.
+
+    The distinct texts are split into a training set and a held out set. Half of
+    the held out set calibrates the uncertain band of the student, the other half
+    is used for the report.
+
+    Parameters
+    ----------
+    pipeline : Pipeline
+        The pipeline whose heads teach the students. Its students and cascade
+        must be disabled.
+    texts : list of str
+        The training corpus.
+    heads : list of str
+        The heads to distill.
+    agreement : float
+        The minimum agreement with the teacher on each side of the uncertain band.
+    held_out : float
+        The fraction of the distinct texts held out.
+    seed : int
+        The random seed of the split.
+
+    Returns
+    -------
+    dict
+        Maps each head to its StudentModel.
+    dict
+        Maps each head to its DistillationReport.
+
+    """
+    indices, (positions, lengths), _ = pipeline.lookup(texts)
+    order = np.random.RandomState(seed).permutation(len(indices))
+    n_held_out = int(len(order) * held_out)
+    splits = dict(
+        train=order[n_held_out:],
+        calibrate=order[: n_held_out // 2],
+        report=order[n_held_out // 2 : n_held_out],
+    )
+    selected = {
+        name: select_positions(positions, lengths, split)
+        for name, split in splits.items()
+    }
+    firsts = np.array([group[0] for group in indices])
+    report_share = len(splits["report"]) / len(order)
+
+    students, reports = dict(), dict()
+    for head in heads:
+        fingerprint = table_fingerprint(pipeline.get_head(head)[1].table)
+        start = time.perf_counter()
+        teacher, _ = pipeline.predict_head_ulm(
+            head, len(texts), indices, (positions, lengths)
+        )
+        teacher = np.array(teacher)[firsts]
+        teacher_seconds = (time.perf_counter() - start) * report_share
+
+        train_targets = teacher[splits["train"]]
+        student = train_student(*selected["train"], train_targets, fingerprint)
+        calibrate_band(
+            student,
+            student.predict(*selected["calibrate"]),
+            teacher[splits["calibrate"]],
+            pipeline.threshold,
+            agreement,
+        )
+        start = time.perf_counter()
+        preds = student.predict(*selected["report"])
+        student_seconds = time.perf_counter() - start
+
+        confident = student.confident(preds)
+        target = teacher[splits["report"]] > pipeline.threshold
+        tiered = np.where(confident, preds > pipeline.threshold, target)
+        reports[head] = DistillationReport(
+            head,
+            len(target),
+            float(confident.mean()) if len(target) else 0.0,
+            float(np.mean(tiered == target)) if len(target) else 0.0,
+            student_seconds,
+            teacher_seconds,
+        )
+        logger.info("Distilled %s", reports[head])
+        students[head] = student
+    return students, reports
@@ -0,0 +1,222 @@
+"""Contains implementation of the cache that loads the models of the heads on first use.
+
+"""
+import collections
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+from youtoxic.app.utils.memory import rss_mb
+
+
+logger = logging.getLogger(__name__)
+
+
+class HeadStats:
+    """The load statistics of a head.
+
+    Attributes
+    ----------
+    loaded : bool
+        Whether the head is currently loaded.
+    loads : int
+        How many times the head has been loaded.
+    load_seconds : float
+        The time taken by the latest load.
+    rss_mb : float
+        The growth of the resident set size of the process during the latest load.
+    last_used : float
+        The time.monotonic() of the latest use, or None if never used.
+
+    """
+
+    def __init__(self):
+        self.loaded = False
+        self.loads = 0
+        self.load_seconds = 0.0
+        self.rss_mb = 0.0
+        self.last_used = None
+
+    def as_dict(self):
+        return dict(
+            loaded=self.loaded,
+            loads=self.loads,
+            load_seconds=self.load_seconds,
+            rss_mb=self.rss_mb,
+            last_used=self.last_used,
+        )
+
+
+class HeadCache:
+    """Loads the models of the enabled heads on first use and optionally unloads them.
+
+    Loaded heads are kept in least recently used order. When more than max_loaded
+    heads are loaded, the least recently used one is unloaded. Heads that have not
+    been used for idle_seconds are unloaded on the next access, or by a daemon
+    thread that calls unload_idle every idle_seconds / 2 in each process that
+    used the cache. Memory freed by unloading may not be returned to the
+    operating system right away.
+
+    Heads are loaded outside the lock of the cache, so loaded heads are served
+    while another head loads. Threads that need a head being loaded wait for it
+    instead of loading it again.
+
+    Attributes
+    ----------
+    load : callable
+        Takes a head and returns its model and vocabulary mappings.
+    enabled : tuple of str
+        The heads that may be loaded.
+    max_loaded : int
+        The maximum number of heads loaded at once. Unlimited if 0.
+    idle_seconds : float
+        Unload heads unused for this long. Never unloaded for being idle if 0.
+
+    """
+
+    def __init__(self, load, enabled, max_loaded=0, idle_seconds=0):
+        """Initializes the cache without loading any head.
+
+        Parameters
+        ----------
+        load : callable
+            Takes a head and returns its model and vocabulary mappings.
+        enabled : list of str
+            The heads that may be loaded.
+        max_loaded : int
+            The maximum number of heads loaded at once. Unlimited if 0.
+        idle_seconds : float
+            Unload heads unused for this long. Never unloaded for being idle if 0.
+
+        """
+        self.load = load
+        self.enabled = tuple(enabled)
+        self.max_loaded = max_loaded
+        self.idle_seconds = idle_seconds
+        self.loaded = collections.OrderedDict()
+        self.loading = dict()
+        self.head_stats = {head: HeadStats() for head in self.enabled}
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.watcher_pid = None
+
+    def get(self, head):
+        """Returns the model and vocabulary mappings of a head, loading it if needed.
+
+        Parameters
+        ----------
+        head : str
+            One of the enabled heads.
+
+        Returns
+        -------
+        tuple
+            The model and the vocabulary mappings of the head.
+
+        """
+        if head not in self.enabled:
+            raise ValueError("Head is not enabled: {}".format(head))
+        with self.lock:
+            now = time.monotonic()
+            self._watch()
+            self._unload_idle(now, keep=head)
+            if head in self.loaded:
+                self.loaded.move_to_end(head)
+                self.head_stats[head].last_used = now
+                return self.loaded[head]
+            loading = self.loading.get(head)
+            if loading is None:
+                self.loading[head] = Future()
+        if loading is not None:
+            return loading.result()
+
+        try:
+            loaded, seconds, rss = self._load(head)
+        except BaseException as e:
+            with self.lock:
+                loading = self.loading.pop(head)
+            loading.set_exception(e)
+            raise
+        with self.lock:
+            loading = self.loading.pop(head)
+            if self.max_loaded:
+                while len(self.loaded) >= self.max_loaded:
+                    self._unload(next(iter(self.loaded)), "least recently used")
+            self.loaded[head] = loaded
+            stats = self.head_stats[head]
+            stats.load_seconds, stats.rss_mb = seconds, rss
+            stats.loads += 1
+            stats.loaded = True
+            stats.last_used = time.monotonic()
+        loading.set_result(loaded)
+        return loaded
+
+    def preload(self, heads=None):
+        """Loads several heads ahead of their first use.
+
+        Parameters
+        ----------
+        heads : list of str
+            The heads to load. All enabled heads if None.
+
+        """
+        for head in heads or self.enabled:
+            self.get(head)
+
+    def unload_idle(self):
+        """Unloads the heads that have not been used for idle_seconds."""
+        with self.lock:
+            self._unload_idle(time.monotonic())
+
+    def close(self):
+        """Stops the thread that unloads the idle heads."""
+        self.stopped.set()
+
+    def stats(self):
+        """Returns the load statistics of every enabled head.
+
+        Returns
+        -------
+        dict
+            Maps each head to a dict of its HeadStats attributes.
+
+        """
+        with self.lock:
+            return {head: stats.as_dict() for head, stats in self.head_stats.items()}
+
+    def _load(self, head):
+        # The growth of the resident set size includes that of the heads
+        # loading at the same time.
+        before, start = rss_mb(), time.perf_counter()
+        loaded = self.load(head)
+        seconds, rss = time.perf_counter() - start, rss_mb() - before
+        logger.info("Loaded %s head in %.2f s using %.1f MB", head, seconds, rss)
+        return loaded, seconds, rss
+
+    def _watch(self):
+        # Called with the lock held. Threads do not survive a fork, so each
+        # process that uses the cache starts its own.
+        if not self.idle_seconds or self.watcher_pid == os.getpid():
+            return
+        self.watcher_pid = os.getpid()
+
+        def watch():
+            while not self.stopped.wait(self.idle_seconds / 2):
+                self.unload_idle()
+
+        threading.Thread(target=watch, name="head-idle", daemon=True).start()
+
+    def _unload(self, head, reason):
+        del self.loaded[head]
+        self.head_stats[head].loaded = False
+        logger.info("Unloaded %s head (%s)", head, reason)
+
+    def _unload_idle(self, now, keep=None):
+        if not self.idle_seconds:
+            return
+        for head in list(self.loaded):
+            idle = now - self.head_stats[head].last_used
+            if head != keep and idle >= self.idle_seconds:
+                self._unload(head, "idle")
@@ -0,0 +1,304 @@
+"""Contains implementation of a queue of background jobs for the long analyses.
+
+An analysis of the tweets of a user, the comments of a video or a file can take
+minutes. It is submitted as a job, which returns an id right away, and runs on
+a bounded pool of threads. The page polls the job for its progress and its
+latest partial result. Jobs are kept in memory, or in a SQLite file shared by
+the processes of a node, so that a worker of the production server can answer
+the polls of a job run by another worker.
+
+"""
+import functools
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+logger = logging.getLogger(__name__)
+
+STATES = ("queued", "running", "done", "failed", "cancelled")
+FINISHED = ("done", "failed", "cancelled")
+
+
+class JobCancelled(Exception):
+    """Raised in a job when it reports its progress after it was cancelled."""
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class JobQueue:
+    """Runs jobs on a bounded pool of threads and keeps their progress and results.
+
+    A job is a function called with its arguments and a report keyword argument.
+    It calls report(done, total, result) as it makes progress, which raises
+    JobCancelled once the job is cancelled, and returns its final result.
+    Results must be picklable when the jobs are kept in a SQLite file.
+
+    Attributes
+    ----------
+    max_running : int
+        The number of jobs each process runs at once. Other jobs are queued.
+    filename : str
+        The SQLite file of the jobs. Jobs are kept in memory if None.
+    ttl : float
+        The seconds finished jobs are kept for.
+
+    """
+
+    def __init__(self, max_running=2, filename=None, ttl=3600):
+        """Initializes the queue. Its threads are started on first use in each process.
+
+        Parameters
+        ----------
+        max_running : int
+            The number of jobs each process runs at once. Other jobs are queued.
+        filename : str
+            The SQLite file of the jobs. Jobs are kept in memory if None.
+        ttl : float
+            The seconds finished jobs are kept for.
+
+        """
+        self.max_running = max_running
+        self.filename = filename
+        self.ttl = ttl
+        self.jobs = dict()
+        self.futures = dict()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.executor, self.executor_pid = None, None
+
+    def submit(self, func, *args):
+        """Queues a job.
+
+        Parameters
+        ----------
+        func : callable
+            The job, called with args and a report keyword argument.
+        args
+            The arguments of the job.
+
+        Returns
+        -------
+        str
+            The id of the job.
+
+        """
+        self._prune(time.time() - self.ttl)
+        job_id = uuid.uuid4().hex
+        self._insert(job_id)
+        with self.lock:
+            if self.executor_pid != os.getpid():
+                # Threads do not survive a fork, so each process starts its own.
+                self.executor = ThreadPoolExecutor(self.max_running)
+                self.executor_pid, self.futures = os.getpid(), dict()
+            future = self.executor.submit(self._run, job_id, func, args)
+            self.futures[job_id] = future
+        future.add_done_callback(lambda _: self.futures.pop(job_id, None))
+        return job_id
+
+    def get(self, job_id):
+        """Returns the state, progress and latest result of a job.
+
+        Parameters
+        ----------
+        job_id : str
+            The id of the job.
+
+        Returns
+        -------
+        dict
+            The 'state' of the job, one of STATES, the number of items 'done' out
+            of 'total', its latest 'result' and its 'error' if it failed. None if
+            there is no such job.
+
+        """
+        job = self._fetch(job_id)
+        if job is None:
+            return None
+        if job["state"] not in FINISHED and not _alive(job["pid"]):
+            # The process that queued or ran the job exited, so it never finishes.
+            if job["cancel"]:
+                fields = dict(state="cancelled")
+            else:
+                fields = dict(state="failed", error="The worker of the job exited.")
+            self._update(job_id, **fields)
+            job.update(fields)
+        return {key: job[key] for key in ("state", "done", "total", "result", "error")}
+
+    def cancel(self, job_id):
+        """Cancels a job. A running job stops the next time it reports its progress.
+
+        A queued job is cancelled right away, even if another process queued it.
+
+        Parameters
+        ----------
+        job_id : str
+            The id of the job.
+
+        Returns
+        -------
+        bool
+            Whether the job was not finished yet.
+
+        """
+        job = self._fetch(job_id)
+        if job is None or job["state"] in FINISHED:
+            return False
+        if job["state"] == "queued":
+            # The process of the job checks for cancellation before running it.
+            self._update(job_id, cancel=True, state="cancelled")
+            future = self.futures.get(job_id)
+            if future is not None:
+                future.cancel()
+            return True
+        self._update(job_id, cancel=True)
+        return True
+
+    def active(self):
+        """Returns the number of jobs queued or running in this process."""
+        with self.lock:
+            if self.executor_pid != os.getpid():
+                return 0
+            return len(self.futures)
+
+    def close(self):
+        """Cancels the queued jobs and waits for the running ones."""
+        if self.executor is not None and self.executor_pid == os.getpid():
+            for job_id in list(self.futures):
+                self.cancel(job_id)
+            self.executor.shutdown()
+
+    def _run(self, job_id, func, args):
+        job = self._fetch(job_id)
+        if job is None or job["cancel"]:
+            self._update(job_id, state="cancelled")
+            return
+        self._update(job_id, state="running", pid=os.getpid())
+        try:
+            result = func(*args, report=functools.partial(self._report, job_id))
+        except JobCancelled:
+            self._update(job_id, state="cancelled")
+        except Exception as e:
+            logger.exception("Job %s failed", job_id)
+            self._update(job_id, state="failed", error=str(e))
+        else:
+            self._update(job_id, state="done", result=result)
+
+    def _report(self, job_id, done, total, result=None):
+        fields = dict(done=done, total=total)
+        if result is not None:
+            fields["result"] = result
+        self._update(job_id, **fields)
+        job = self._fetch(job_id)
+        if job is None or job["cancel"]:
+            raise JobCancelled(job_id)
+
+    def _insert(self, job_id):
+        job = dict(
+            state="queued",
+            done=0,
+            total=0,
+            result=None,
+            error=None,
+            cancel=False,
+            pid=os.getpid(),
+            updated=time.time(),
+        )
+        if not self.filename:
+            with self.lock:
+                self.jobs[job_id] = job
+            return
+        self._execute(
+            "INSERT INTO jobs (id, {}) VALUES (?, {})".format(
+                ", ".join(job), ", ".join("?" * len(job))
+            ),
+            [job_id] + list(job.values()),
+        )
+
+    def _update(self, job_id, **fields):
+        fields["updated"] = time.time()
+        if not self.filename:
+            with self.lock:
+                if job_id in self.jobs:
+                    self.jobs[job_id].update(fields)
+            return
+        if "result" in fields:
+            fields["result"] = pickle.dumps(fields["result"])
+        self._execute(
+            "UPDATE jobs SET {} WHERE id = ?".format(
+                ", ".join("{} = ?".format(name) for name in fields)
+            ),
+            list(fields.values()) + [job_id],
+        )
+
+    def _fetch(self, job_id):
+        if not self.filename:
+            with self.lock:
+                job = self.jobs.get(job_id)
+                return None if job is None else dict(job)
+        rows = self._execute(
+            "SELECT state, done, total, result, error, cancel, pid FROM jobs "
+            "WHERE id = ?",
+            (job_id,),
+        )
+        if not rows:
+            return None
+        state, done, total, result, error, cancel, pid = rows[0]
+        return dict(
+            state=state,
+            done=done,
+            total=total,
+            result=None if result is None else pickle.loads(result),
+            error=error,
+            cancel=bool(cancel),
+            pid=pid,
+        )
+
+    def _prune(self, before):
+        if not self.filename:
+            with self.lock:
+                for job_id in [
+                    job_id
+                    for job_id, job in self.jobs.items()
+                    if job["state"] in FINISHED and job["updated"] < before
+                ]:
+                    del self.jobs[job_id]
+            return
+        self._execute(
+            "DELETE FROM jobs WHERE state IN ({}) AND updated < ?".format(
+                ", ".join("?" * len(FINISHED))
+            ),
+            list(FINISHED) + [before],
+        )
+
+    def _connection(self):
+        # Connections cannot be shared by threads, nor by processes forked after
+        # they are opened.
+        if getattr(self.local, "pid", None) != os.getpid():
+            connection = sqlite3.connect(self.filename, timeout=5)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, state TEXT, "
+                "done INTEGER, total INTEGER, result BLOB, error TEXT, "
+                "cancel INTEGER, pid INTEGER, updated REAL)"
+            )
+            self.local.connection, self.local.pid = connection, os.getpid()
+        return self.local.connection
+
+    def _execute(self, sql, parameters=()):
+        connection = self._connection()
+        with connection:
+            return connection.execute(sql, parameters).fetchall()
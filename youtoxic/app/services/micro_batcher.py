@@ -0,0 +1,257 @@
+"""Contains implementation of a queue that batches single-text requests across callers.
+
+"""
+import collections
+import logging
+import math
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+# The number of recent requests and batches the latency metrics are computed over.
+STATS_WINDOW = 1024
+
+PendingText = collections.namedtuple(
+    "PendingText", ["text", "heads", "future", "arrived"]
+)
+
+
+class BatcherStats:
+    """The queueing and latency metrics of a MicroBatcher.
+
+    Attributes
+    ----------
+    requests : int
+        The number of texts predicted.
+    batches : int
+        The number of batched calls made.
+    queue_waits : deque of float
+        The seconds each recent text waited before its batch started.
+    latencies : deque of float
+        The seconds from the submission of each recent text to its result.
+    fills : deque of float
+        The size of each recent batch divided by the maximum batch size.
+
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.batches = 0
+        self.queue_waits = collections.deque(maxlen=STATS_WINDOW)
+        self.latencies = collections.deque(maxlen=STATS_WINDOW)
+        self.fills = collections.deque(maxlen=STATS_WINDOW)
+
+    def record(self, batch, max_batch, started, finished):
+        self.requests += len(batch)
+        self.batches += 1
+        self.fills.append(len(batch) / max_batch)
+        for pending in batch:
+            self.queue_waits.append(started - pending.arrived)
+            self.latencies.append(finished - pending.arrived)
+
+    def as_dict(self):
+        def milliseconds(values, q):
+            return float(np.percentile(values, q) * 1000) if values else 0.0
+
+        return dict(
+            requests=self.requests,
+            batches=self.batches,
+            batch_fill=float(np.mean(self.fills)) if self.fills else 0.0,
+            queue_wait_ms_p50=milliseconds(self.queue_waits, 50),
+            queue_wait_ms_p99=milliseconds(self.queue_waits, 99),
+            latency_ms_p50=milliseconds(self.latencies, 50),
+            latency_ms_p99=milliseconds(self.latencies, 99),
+        )
+
+
+class MicroBatcher:
+    """Collects the texts submitted by concurrent callers and predicts them in batches.
+
+    A batch starts with the oldest pending text and takes the texts that arrive
+    within a window, up to max_batch texts. The window adapts to the load. It is
+    based on the average gap between arrivals. It is zero when the next text is
+    not expected within max_wait, so an idle server adds no latency. It is the
+    expected time to fill the batch, capped at max_wait, when texts arrive
+    faster. Texts already queued are always taken. Texts asking for the same
+    heads are predicted with one call per batch, with the heads run concurrently
+    by the executor if one is given.
+
+    Attributes
+    ----------
+    pipeline : Pipeline or ModelWorkerPool
+        Makes the batched predictions with its predict_heads_ulm method.
+    executor : HeadExecutor
+        Runs the heads of each batch on its threads. The heads run one after
+        another on the thread of the batcher if None.
+    max_batch : int
+        The maximum number of texts in a batch.
+    max_wait : float
+        The maximum seconds a text waits for others to join its batch.
+    gap : float
+        The moving average of the seconds between arrivals.
+
+    """
+
+    def __init__(self, pipeline, max_batch, max_wait, executor=None):
+        """Initializes the batcher. Its thread is started on first use.
+
+        Parameters
+        ----------
+        pipeline : Pipeline or ModelWorkerPool
+            Makes the batched predictions with its predict_heads_ulm method.
+        max_batch : int
+            The maximum number of texts in a batch.
+        max_wait : float
+            The maximum seconds a text waits for others to join its batch.
+        executor : HeadExecutor
+            Runs the heads of each batch on its threads, see HeadExecutor.predict.
+
+        """
+        self.pipeline = pipeline
+        self.executor = executor
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.gap = math.inf
+        self.last_arrival = None
+        self.pending = queue.Queue()
+        self.batch_stats = BatcherStats()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def window(self):
+        """Returns the seconds the current batch waits for more texts."""
+        if self.gap >= self.max_wait:
+            return 0.0
+        return min(self.max_wait, self.gap * (self.max_batch - 1))
+
+    def submit(self, text, heads):
+        """Queues a text to be predicted in the next batch.
+
+        Parameters
+        ----------
+        text : str
+            The text to predict.
+        heads : list of str
+            The heads to run.
+
+        Returns
+        -------
+        Future
+            Resolves to a dict that maps each head to the numeric prediction and
+            judgement of the text.
+
+        """
+        future = Future()
+        with self.lock:
+            now = time.monotonic()
+            if self.last_arrival is not None:
+                gap = now - self.last_arrival
+                self.gap = gap if math.isinf(self.gap) else 0.8 * self.gap + 0.2 * gap
+            self.last_arrival = now
+            if self.thread is None:
+                self.thread = threading.Thread(
+                    target=self._run, name="micro-batcher", daemon=True
+                )
+                self.thread.start()
+            self.pending.put(PendingText(text, tuple(heads), future, now))
+        return future
+
+    def predict_heads_ulm(self, texts, heads):
+        """Predicts several types of toxicity for texts, batched with other callers.
+
+        Parameters
+        ----------
+        texts : list of str
+            The texts to predict.
+        heads : list of str
+            The heads to run.
+
+        Returns
+        -------
+        dict
+            Maps each head to a list of numeric predictions and a list of judgements.
+
+        """
+        futures = [self.submit(text, heads) for text in texts]
+        results = [future.result() for future in futures]
+        return {
+            head: (
+                [result[head][0] for result in results],
+                [result[head][1] for result in results],
+            )
+            for head in heads
+        }
+
+    def stats(self):
+        """Returns the queueing and latency metrics of the recent batches.
+
+        Returns
+        -------
+        dict
+            The counts of requests and batches, the mean batch fill and the p50 and
+            p99 queue wait and latency in milliseconds.
+
+        """
+        with self.lock:
+            stats = self.batch_stats.as_dict()
+            stats["window_ms"] = self.window() * 1000
+            return stats
+
+    def close(self):
+        """Stops the thread after the pending texts are predicted."""
+        with self.lock:
+            thread, self.thread = self.thread, None
+            if thread is not None:
+                self.pending.put(None)
+        if thread is not None:
+            thread.join()
+
+    def _run(self):
+        running = True
+        while running:
+            first = self.pending.get()
+            if first is None:
+                break
+            batch = [first]
+            deadline = first.arrived + self.window()
+            while len(batch) < self.max_batch:
+                timeout = max(0.0, deadline - time.monotonic())
+                try:
+                    pending = self.pending.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if pending is None:
+                    running = False
+                    break
+                batch.append(pending)
+            self._predict(batch)
+
+    def _predict(self, batch):
+        started = time.monotonic()
+        groups = collections.defaultdict(list)
+        for pending in batch:
+            groups[pending.heads].append(pending)
+        for heads, group in groups.items():
+            texts = [pending.text for pending in group]
+            try:
+                if self.executor is None:
+                    results = self.pipeline.predict_heads_ulm(texts, list(heads))
+                else:
+                    results = self.executor.predict(self.pipeline, texts, list(heads))
+            except Exception as e:
+                logger.exception("Batch of %d texts failed", len(group))
+                for pending in group:
+                    pending.future.set_exception(e)
+                continue
+            for i, pending in enumerate(group):
+                pending.future.set_result(
+                    {head: (results[head][0][i], results[head][1][i]) for head in heads}
+                )
+        with self.lock:
+            self.batch_stats.record(batch, self.max_batch, started, time.monotonic())
@@ -1,16 +1,62 @@
 """Contains implementation of the Pipeline object.
 
 """
-# TODO: Eliminate the need for the fastai import.
-from fastai.text.transform import Tokenizer
+import logging
+import os
 
 import numpy as np
 
-import torch
-from torch.autograd.variable import Variable
-
+from youtoxic.app.config import Config
+from youtoxic.app.services.heads import HeadCache
+from youtoxic.app.services.prediction_cache import (
+    PredictionCache,
+    model_version,
+    text_digest,
+)
+from youtoxic.app.services.tokenizer_pool import TokenizerPool
+from youtoxic.app.utils.backends import load_engine
+from youtoxic.app.utils.batching import (
+    aggregate_windows,
+    group_duplicates,
+    pad_batch,
+    predict_bucketed,
+    split_windows,
+)
 from youtoxic.app.utils.functions import softmax
-from youtoxic.app.utils.load_files import load_mappings, load_model
+from youtoxic.app.utils.load_files import convert_mappings
+from youtoxic.app.utils.student import load_student, table_fingerprint
+from youtoxic.app.utils.tokenizer import Tokenizer
+from youtoxic.app.utils.vocabulary import load_vocabularies, select_positions
+
+
+logger = logging.getLogger(__name__)
+
+HEADS = ("toxicity", "insult", "obscenity", "identity")
+LONG_TEXT_MODES = ("truncate", "window")
+WINDOW_AGGREGATIONS = ("max", "mean")
+VOCABULARIES_FILENAME = "youtoxic/app/models/vocabularies.bin"
+STUDENT_FILENAME = "youtoxic/app/models/{}_student.bin"
+
+
+def is_cascaded(heads, cascade_floor):
+    """Returns whether the heads other than toxicity are gated by the toxicity head.
+
+    Parameters
+    ----------
+    heads : list of str
+        The requested heads.
+    cascade_floor : float
+        The cascade floor of the Pipeline.
+
+    Returns
+    -------
+    bool
+        True if the other heads only run on the texts whose toxicity prediction
+        reaches the floor, in which case the toxicity prediction of the other
+        texts is their prediction for the other heads, as an upper bound.
+
+    """
+    return bool(cascade_floor) and "toxicity" in heads and len(heads) > 1
 
 
 class Pipeline:
@@ -20,50 +66,131 @@ class Pipeline:
     ----------
     threshold : float
         The value to use when making a judgement on toxicity.
-    toxicity_mappings : defaultdict
-        The vocabulary mappings used for the toxicity model.
-    ulm_toxicity_model : SequentialRNN
-        The trained model for toxicity analysis.
-    insult_mappings : defaultdict
-        The vocabulary mappings used for the insult model.
-    ulm_insult_model : SequentialRNN
-        The trained model for insult analysis.
-    obscenity_mappings : defaultdict
-        The vocabulary mappings used for the obscenity model.
-    ulm_obscenity_model : SequentialRNN
-        The trained model for obscenity analysis.
-    identity_mappings : defaultdict
-        The vocabulary mappings used for the identity hate model.
-    ulm_identity_model : SequentialRNN
-        The trained model for identity hate analysis.
+    batch_size : int
+        The maximum number of texts passed through a model at once.
+    token_budget : int
+        The maximum number of padded tokens passed through a model at once.
+    last_report : BatchReport
+        The padding overhead and throughput of the latest batched call on any thread.
+    last_dedup_report : DedupReport
+        The duplicate ratio and compute saved of the latest lookup on any thread.
+    tokenizer : TokenizerPool
+        The long-lived pool used to tokenize texts.
+    backend : str
+        The inference engine used for the models, see load_engine.
+    freeze_models : bool
+        Whether the models are converted into minimal eval-only modules.
+    quantize_models : bool
+        Whether the models use dynamic int8 layers.
+    mmap_weights : bool
+        Whether the frozen eager models memory-map their weights from a shared file.
+        Only the embeddings are mapped if the models are quantized.
+    stream_chunk_size : int
+        The number of tokens the frozen eager models stream through their layers
+        at a time, keeping only running pools. Whole texts are run at once if 0.
+    heads : HeadCache
+        Loads the model and vocabulary mappings of each enabled head on first use.
+    vocabularies : dict
+        Maps each enabled head to its Vocabulary. Loaded on first use.
+    cache : PredictionCache
+        The cached predictions of the heads, or None if caching is disabled.
+    model_versions : dict
+        Maps each loaded head to the version of its model, which keys its cached
+        predictions.
+    cascade_floor : float
+        Only texts whose toxicity prediction reaches this floor are passed to the
+        other heads when toxicity is predicted along with them. No cascade if 0.
+        It may not be above threshold.
+    use_students : bool
+        Whether the heads with a trained student only run their model on the
+        texts the student is not confident about.
+    students : dict
+        Maps each loaded head with a usable student to its StudentModel.
+    max_tokens : int
+        The number of tokens above which a text is long. Long texts are not
+        capped if 0.
+    long_text_mode : str
+        'truncate' scores the last max_tokens tokens of long texts, which hold
+        the region the classifiers pool over. 'window' scores every window of
+        max_tokens tokens and aggregates their predictions.
+    window_stride : int
+        The number of tokens between the starts of consecutive windows, at
+        most max_tokens.
+    window_aggregation : str
+        How the predictions of the windows of a text are aggregated, 'max' or
+        'mean'.
 
     """
 
-    def __init__(self, threshold=0.5):
-        """Initializes pipeline object by loading models and tokenizer.
+    def __init__(self, threshold=0.5, config=None):
+        """Initializes pipeline object. The models of the heads are loaded on first use.
 
         Parameters
         ----------
         threshold : float
             The value to use when making a judgement on toxicity.
+        config : Config
+            The application configuration. Read from the environment if None.
 
         """
+        config = config or Config()
         self.threshold = threshold
-        self.tokenizer = Tokenizer()
-
-        self.toxicity_mappings = load_mappings("youtoxic/app/models/toxicity_mappings.pkl")
-        self.ulm_toxicity_model = load_model(
-            len(self.toxicity_mappings), "youtoxic/app/models/toxicity_model.h5"
+        self.batch_size = config.batch_size
+        self.token_budget = config.token_budget
+        self.last_report = None
+        self.last_dedup_report = None
+        self.tokenizer = TokenizerPool(
+            Tokenizer(), config.tokenizer_workers, config.tokenizer_chunk_size
         )
 
-        self.insult_mappings = load_mappings("youtoxic/app/models/insult_mappings.pkl")
-        self.ulm_insult_model = load_model(len(self.insult_mappings), "youtoxic/app/models/insult_model.h5")
-
-        self.obscenity_mappings = load_mappings("youtoxic/app/models/obscenity_mappings.pkl")
-        self.ulm_obscenity_model = load_model(len(self.obscenity_mappings), "youtoxic/app/models/obscenity_model.h5")
-
-        self.identity_mappings = load_mappings("youtoxic/app/models/identity_mappings.pkl")
-        self.ulm_identity_model = load_model(len(self.identity_mappings), "youtoxic/app/models/identity_model.h5")
+        self.backend = config.inference_backend
+        self.freeze_models = config.freeze_models
+        self.quantize_models = config.quantize_models
+        self.mmap_weights = config.mmap_weights
+        self.stream_chunk_size = config.stream_chunk_size
+        for head in config.enabled_heads:
+            if head not in HEADS:
+                raise ValueError("Unknown head: {}".format(head))
+        self.vocabularies = None
+        self.heads = HeadCache(
+            self.load_head,
+            config.enabled_heads,
+            config.max_loaded_heads,
+            config.head_idle_seconds,
+        )
+        self.cache = None
+        if config.prediction_cache_entries > 0:
+            self.cache = PredictionCache(
+                config.prediction_cache_entries, config.prediction_cache_file or None
+            )
+        self.model_versions = dict()
+        self.cascade_floor = config.cascade_floor
+        if self.cascade_floor > self.threshold:
+            # The texts under the floor must be judged negative by every head.
+            raise ValueError(
+                "The cascade floor {} is above the threshold {}".format(
+                    self.cascade_floor, self.threshold
+                )
+            )
+        self.use_students = config.student_models
+        self.students = dict()
+        self.max_tokens = config.max_tokens
+        self.long_text_mode = config.long_text_mode
+        self.window_stride = config.window_stride or max(self.max_tokens // 2, 1)
+        self.window_aggregation = config.window_aggregation
+        if self.long_text_mode not in LONG_TEXT_MODES:
+            raise ValueError("Unknown long text mode: {}".format(self.long_text_mode))
+        if self.window_aggregation not in WINDOW_AGGREGATIONS:
+            raise ValueError(
+                "Unknown window aggregation: {}".format(self.window_aggregation)
+            )
+        # Windows further apart than their size would skip tokens.
+        if self.max_tokens and not 0 < self.window_stride <= self.max_tokens:
+            raise ValueError(
+                "The window stride {} is not in 1..{}".format(
+                    self.window_stride, self.max_tokens
+                )
+            )
 
         # The following code initializes the old RNN models.
         """
@@ -99,9 +226,9 @@ class Pipeline:
 
         Parameters
         ----------
-        model : SequentialRNN
-            The ULMFiT model to use for making predictions.
-        mappings : defaultdict
+        model : EagerEngine, TorchScriptEngine or OnnxEngine
+            The inference engine of the ULMFiT model to use for making predictions.
+        mappings : Vocabulary
             The corresponding vocabulary mappings for the model.
         text : str
             The text to analyze.
@@ -116,14 +243,526 @@ class Pipeline:
             return 0
         texts = [text]
         tok = self.tokenizer.process_all(texts)
-        encoded = [mappings[p] for p in tok[0]]
-        ary = np.reshape(np.array(encoded), (-1, 1))
-        tensor = torch.from_numpy(ary)
-        variable = Variable(tensor)
+        return self.predict_ids_ulm(model, mappings.encode(tok))[0]
+
+    def tokenize(self, texts):
+        """Tokenizes the texts that contain at least one word.
+
+        Parameters
+        ----------
+        texts : list of str
+            The texts to tokenize.
+
+        Returns
+        -------
+        list of int
+            The indices of the texts that were tokenized.
+        list of list of str
+            The tokens of each of those texts.
+
+        """
+        indices = [i for i, text in enumerate(texts) if len(text.split()) > 0]
+        if not indices:
+            return indices, list()
+        # Copies of the same text are tokenized once.
+        unique = dict.fromkeys(texts[i] for i in indices)
+        toks = dict(zip(unique, self.tokenizer.process_all(list(unique))))
+        return indices, [toks[texts[i]] for i in indices]
+
+    def predict_tokens_ulm(self, model, mappings, toks):
+        """Makes batched predictions for tokenized texts using the given ULMFiT model.
+
+        Texts are sorted into length buckets that fit the token budget so that
+        little of the computation is spent on padding.
+
+        Parameters
+        ----------
+        model : EagerEngine, TorchScriptEngine or OnnxEngine
+            The inference engine of the ULMFiT model to use for making predictions.
+        mappings : Vocabulary
+            The corresponding vocabulary mappings for the model.
+        toks : list of list of str
+            The tokens of each text. Each text must contain at least one token.
+
+        Returns
+        -------
+        ndarray
+            The prediction for each text.
+
+        """
+        return self.predict_ids_ulm(model, mappings.encode(toks))
+
+    def predict_ids_ulm(self, model, encoded):
+        """Makes batched predictions for encoded texts using the given ULMFiT model.
+
+        Texts longer than max_tokens are truncated or split into windows, see
+        long_text_mode. The windows of all the texts are scored in the same
+        length buckets.
+
+        Parameters
+        ----------
+        model : EagerEngine, TorchScriptEngine or OnnxEngine
+            The inference engine of the ULMFiT model to use for making predictions.
+        encoded : list of ndarray
+            The token ids of each text. Each text must contain at least one token.
+
+        Returns
+        -------
+        ndarray
+            The prediction for each text.
+
+        """
+        n_texts, owners = len(encoded), None
+        if self.max_tokens and any(len(ids) > self.max_tokens for ids in encoded):
+            if self.long_text_mode == "truncate":
+                encoded = [ids[-self.max_tokens :] for ids in encoded]
+            else:
+                encoded, owners = split_windows(
+                    encoded, self.max_tokens, self.window_stride
+                )
+        results, self.last_report = predict_bucketed(
+            encoded,
+            lambda batch: self.predict_encoded_ulm(model, batch),
+            self.token_budget,
+            self.batch_size,
+        )
+        logger.info("Scored %s", self.last_report)
+        if owners is not None:
+            logger.info("Split %d texts into %d windows", n_texts, len(encoded))
+            results = aggregate_windows(
+                results, owners, n_texts, self.window_aggregation
+            )
+        return results
+
+    def predict_texts_ulm(self, model, mappings, texts):
+        """Makes batched predictions for several texts using the given ULMFiT model.
+
+        Parameters
+        ----------
+        model : EagerEngine, TorchScriptEngine or OnnxEngine
+            The inference engine of the ULMFiT model to use for making predictions.
+        mappings : Vocabulary
+            The corresponding vocabulary mappings for the model.
+        texts : list of str
+            The texts to analyze.
+
+        Returns
+        -------
+        list of float
+            The prediction for each text.
 
-        predictions = model(variable)
-        numpy_preds = predictions[0].data.numpy()
-        return softmax(numpy_preds[0])[0][1]
+        """
+        preds = [0] * len(texts)
+        indices, toks = self.tokenize(texts)
+        if indices:
+            for i, pred in zip(indices, self.predict_tokens_ulm(model, mappings, toks)):
+                preds[i] = pred
+        return preds
+
+    def predict_heads_ulm(self, texts, heads=HEADS):
+        """Predicts several types of toxicity for each text in a list.
+
+        Each text is tokenized once and its tokens are looked up once in the
+        table shared by the vocabularies, then encoded for every requested head.
+        Texts with the same tokens are scored once.
+
+        Parameters
+        ----------
+        texts : list of str
+            A list of texts to make predictions for.
+        heads : list of str
+            The heads to use, any of 'toxicity', 'insult', 'obscenity' and 'identity'.
+
+        Returns
+        -------
+        dict
+            Maps each head to a list of numeric predictions and a list of judgements.
+
+        """
+        return self.predict_looked_up_ulm(len(texts), self.lookup(texts), heads)
+
+    def predict_looked_up_ulm(self, n_texts, looked_up, heads, map_heads=map):
+        """Predicts several types of toxicity for texts that have been looked up.
+
+        With a cascade_floor, the toxicity head runs first when it is requested
+        along with other heads. Insults, obscenity and identity hate are subsets
+        of toxicity, so the other heads only run on the texts whose toxicity
+        prediction reaches the floor. The other texts get their toxicity
+        prediction as an upper bound of the prediction of each other head, and
+        are judged negative. See is_cascaded.
+
+        Parameters
+        ----------
+        n_texts : int
+            The number of texts.
+        looked_up : tuple
+            The result of lookup for the texts.
+        heads : list of str
+            The heads to use, any of 'toxicity', 'insult', 'obscenity' and 'identity'.
+        map_heads : callable
+            Works like map. Used to run the heads, which may run concurrently.
+
+        Returns
+        -------
+        dict
+            Maps each head to a list of numeric predictions and a list of judgements.
+
+        """
+
+        def predict(head, looked_up=looked_up):
+            return self.predict_head_ulm(head, n_texts, *looked_up)
+
+        if not is_cascaded(heads, self.cascade_floor):
+            return dict(zip(heads, map_heads(predict, heads)))
+
+        results = {"toxicity": predict("toxicity")}
+        passed, bounds = self.gate(looked_up, results["toxicity"][0])
+        others = [head for head in heads if head != "toxicity"]
+        for head, (preds, judgements) in zip(
+            others, map_heads(lambda head: predict(head, passed), others)
+        ):
+            negative = self.classify(head, 0)
+            for i, bound in bounds.items():
+                preds[i], judgements[i] = bound, negative
+            results[head] = preds, judgements
+        return {head: results[head] for head in heads}
+
+    def gate(self, looked_up, toxicity_preds):
+        """Keeps the looked up texts whose toxicity prediction reaches the cascade floor.
+
+        Parameters
+        ----------
+        looked_up : tuple
+            The result of lookup for the texts.
+        toxicity_preds : list of float
+            The toxicity prediction for each text.
+
+        Returns
+        -------
+        tuple
+            The result of lookup for the texts that passed.
+        dict
+            Maps the index of each text that did not pass to its toxicity
+            prediction, which bounds its other predictions.
+
+        """
+        indices, positions, digests = looked_up
+        keep = [
+            k
+            for k, group in enumerate(indices)
+            if toxicity_preds[group[0]] >= self.cascade_floor
+        ]
+        kept = set(keep)
+        bounds = {
+            i: toxicity_preds[i]
+            for k, group in enumerate(indices)
+            if k not in kept
+            for i in group
+        }
+        logger.info(
+            "Cascade passed %d of %d distinct texts to the other heads",
+            len(keep),
+            len(indices),
+        )
+        if not keep:
+            return (list(), None, None), bounds
+        passed = (
+            [indices[k] for k in keep],
+            select_positions(*positions, keep),
+            None if digests is None else [digests[k] for k in keep],
+        )
+        return passed, bounds
+
+    def lookup(self, texts):
+        """Tokenizes texts and looks their tokens up in the table shared by the vocabularies.
+
+        Texts are grouped by their tokens, which are all the models see, so
+        copies of a text that only differ in spacing or markup the tokenizer
+        drops are looked up and scored once.
+
+        Parameters
+        ----------
+        texts : list of str
+            The texts to look up.
+
+        Returns
+        -------
+        list of list of int
+            The indices of the texts sharing each distinct list of tokens. Texts
+            without any word are left out.
+        tuple
+            The positions of the tokens of each distinct list of tokens and their
+            number of tokens, see StringTable.lookup. None if there are no words.
+        list of bytes
+            The digest of each distinct list of tokens, which keys its cached
+            predictions. None if caching is disabled.
+
+        """
+        indices, toks = self.tokenize(texts)
+        if not indices:
+            return list(), None, None
+        groups, unique_toks, self.last_dedup_report = group_duplicates(toks)
+        logger.info("Looked up %s", self.last_dedup_report)
+        vocabularies = self.get_vocabularies()
+        positions = vocabularies[self.heads.enabled[0]].table.lookup(unique_toks)
+        digests = None
+        if self.cache is not None:
+            digests = [text_digest(tok) for tok in unique_toks]
+        groups = [[indices[j] for j in group] for group in groups]
+        return groups, positions, digests
+
+    def predict_head_ulm(self, head, n_texts, indices, positions, digests=None):
+        """Predicts one type of toxicity for texts that have been looked up.
+
+        Parameters
+        ----------
+        head : str
+            One of 'toxicity', 'insult', 'obscenity' and 'identity'.
+        n_texts : int
+            The number of texts.
+        indices : list of list of int
+            The indices of the texts sharing each distinct list of tokens, see lookup.
+        positions : tuple
+            The positions of the tokens of each distinct list of tokens, see lookup.
+        digests : list of bytes
+            The digest of each distinct list of tokens, see lookup. Cached
+            predictions are reused and new ones are cached. The cache is not
+            used if None.
+
+        Returns
+        -------
+        list of float
+            The numeric prediction for each text.
+        list of str
+            The judgement for each text.
+
+        """
+        preds = [0] * n_texts
+        # The model is not loaded for texts without words, nor when the cascade
+        # passed none of the texts to the head.
+        if indices:
+            model, mappings = self.get_head(head)
+            scored, escalated = np.zeros(len(indices)), np.arange(len(indices))
+            student = self.students.get(head)
+            if student is not None:
+                scored = student.predict(*positions)
+                escalated = np.flatnonzero(~student.confident(scored))
+                logger.info(
+                    "%s student answered %d of %d texts",
+                    head,
+                    len(indices) - len(escalated),
+                    len(indices),
+                )
+            if len(escalated):
+                encoded = mappings.encode_positions(*positions)
+                encoded = [encoded[k] for k in escalated]
+                if digests is None:
+                    scored[escalated] = self.predict_ids_ulm(model, encoded)
+                else:
+                    escalated_digests = [digests[k] for k in escalated]
+                    scored[escalated] = self.predict_cached_ulm(
+                        head, model, encoded, escalated_digests
+                    )
+            for group, pred in zip(indices, scored):
+                for i in group:
+                    preds[i] = pred
+        return preds, [self.classify(head, pred) for pred in preds]
+
+    def predict_cached_ulm(self, head, model, encoded, digests):
+        """Makes batched predictions for encoded texts, reusing cached predictions.
+
+        Parameters
+        ----------
+        head : str
+            The head of the model.
+        model : EagerEngine, TorchScriptEngine or OnnxEngine
+            The inference engine of the head's model.
+        encoded : list of ndarray
+            The token ids of each text. Each text must contain at least one token.
+        digests : list of bytes
+            The digest of the tokens of each text.
+
+        Returns
+        -------
+        list of float
+            The prediction for each text.
+
+        """
+        version = self.model_versions[head]
+        cached = self.cache.get_many(head, version, digests)
+        missing = [j for j, digest in enumerate(digests) if digest not in cached]
+        if missing:
+            scored = self.predict_ids_ulm(model, [encoded[j] for j in missing])
+            new = {digests[j]: float(pred) for j, pred in zip(missing, scored)}
+            self.cache.put_many(head, version, new)
+            cached.update(new)
+        logger.debug(
+            "%s head: %d of %d texts cached",
+            head,
+            len(digests) - len(missing),
+            len(digests),
+        )
+        return [cached[digest] for digest in digests]
+
+    def close(self):
+        """Shuts down the tokenizer worker processes and the idle unloading of the heads."""
+        self.tokenizer.close()
+        self.heads.close()
+
+    def load_head(self, head):
+        """Loads the model and vocabulary mappings of a head.
+
+        Parameters
+        ----------
+        head : str
+            One of 'toxicity', 'insult', 'obscenity' and 'identity'.
+
+        Returns
+        -------
+        EagerEngine, TorchScriptEngine or OnnxEngine
+            The inference engine of the head's trained model.
+        Vocabulary
+            The vocabulary mappings of the head.
+
+        """
+        mappings = self.get_vocabularies()[head]
+        filename = "youtoxic/app/models/{}_model.h5".format(head)
+        model = load_engine(
+            self.backend,
+            len(mappings),
+            filename,
+            self.freeze_models,
+            self.quantize_models,
+            self.mmap_weights,
+            self.stream_chunk_size,
+        )
+        version = model_version(
+            filename,
+            self.backend,
+            self.quantize_models,
+            self.max_tokens,
+            self.long_text_mode,
+            self.window_stride,
+            self.window_aggregation,
+        )
+        if self.cache is not None:
+            self.cache.invalidate(head, version)
+        self.model_versions[head] = version
+        if self.use_students:
+            self.load_student(head, mappings)
+        return model, mappings
+
+    def load_student(self, head, mappings):
+        """Loads the student of a head if it was trained with the current vocabularies.
+
+        Parameters
+        ----------
+        head : str
+            One of 'toxicity', 'insult', 'obscenity' and 'identity'.
+        mappings : Vocabulary
+            The vocabulary mappings of the head.
+
+        """
+        filename = STUDENT_FILENAME.format(head)
+        if not os.path.exists(filename):
+            return
+        student = load_student(filename)
+        if student.fingerprint != table_fingerprint(mappings.table):
+            logger.warning("Ignoring %s, trained on other vocabularies", filename)
+            return
+        self.students[head] = student
+
+    def get_vocabularies(self):
+        """Returns the vocabularies of the enabled heads, converting and mapping them on first use.
+
+        Returns
+        -------
+        dict
+            Maps each enabled head to its Vocabulary.
+
+        """
+        if self.vocabularies is None:
+            mappings_filenames = {
+                head: "youtoxic/app/models/{}_mappings.pkl".format(head)
+                for head in self.heads.enabled
+            }
+            self.vocabularies = load_vocabularies(
+                convert_mappings(mappings_filenames, VOCABULARIES_FILENAME)
+            )
+        return self.vocabularies
+
+    def get_head(self, head):
+        """Returns the model and vocabulary mappings of a head, loading them on first use.
+
+        Parameters
+        ----------
+        head : str
+            One of 'toxicity', 'insult', 'obscenity' and 'identity'.
+
+        Returns
+        -------
+        EagerEngine, TorchScriptEngine or OnnxEngine
+            The inference engine of the head's trained model.
+        Vocabulary
+            The vocabulary mappings of the head.
+
+        """
+        if head not in HEADS:
+            raise ValueError("Unknown head: {}".format(head))
+        return self.heads.get(head)
+
+    def classify(self, head, pred):
+        """Makes a judgement from a prediction of the given head.
+
+        Parameters
+        ----------
+        head : str
+            One of 'toxicity', 'insult', 'obscenity' and 'identity'.
+        pred : float
+            The numeric prediction.
+
+        Returns
+        -------
+        str
+            The judgement of the head's classify method.
+
+        """
+        return getattr(self, "classify_{}".format(head))(pred)
+
+    def predict_encoded_ulm(self, model, encoded):
+        """Runs a single padded batch of encoded texts through the given ULMFiT model.
+
+        Parameters
+        ----------
+        model : EagerEngine, TorchScriptEngine or OnnxEngine
+            The inference engine of the ULMFiT model to use for making predictions.
+        encoded : list of list of int
+            The token ids of each text. Each text must contain at least one token.
+
+        Returns
+        -------
+        ndarray
+            The prediction for each text.
+
+        """
+        ary, lengths = pad_batch(encoded)
+        return softmax(model.run(ary, lengths))[:, 1]
+
+    def classify_toxicity(self, pred):
+        """Makes a judgement from a predicted toxicity score.
+
+        Parameters
+        ----------
+        pred : float
+            The numeric prediction.
+
+        Returns
+        -------
+        str
+            'Toxic' if prediction > threshold, 'Not toxic' otherwise.
+
+        """
+        return "Toxic" if pred > self.threshold else "Not toxic"
 
     def predict_toxicity_ulm(self, text):
         """Predicts if a text contains general toxicity using a ULMFiT model.
@@ -141,8 +780,8 @@ class Pipeline:
             'Toxic' if prediction > threshold, 'Not toxic' otherwise.
 
         """
-        pred = self.predict_text_ulm(self.ulm_toxicity_model, self.toxicity_mappings, text)
-        classification = "Toxic" if pred > self.threshold else "Not toxic"
+        pred = self.predict_text_ulm(*self.get_head("toxicity"), text)
+        classification = self.classify_toxicity(pred)
         return pred, classification
 
     def predict_toxicity_ulm_multiple(self, texts):
@@ -161,10 +800,23 @@ class Pipeline:
             For each text, contains 'Toxic' if prediction > threshold, 'Not toxic' otherwise.
 
         """
-        preds, classifications = [None] * len(texts), [None] * len(texts)
-        for i, text in enumerate(texts):
-            preds[i], classifications[i] = self.predict_toxicity_ulm(text)
-        return preds, classifications
+        return self.predict_heads_ulm(texts, ["toxicity"])["toxicity"]
+
+    def classify_insult(self, pred):
+        """Makes a judgement from a predicted insult score.
+
+        Parameters
+        ----------
+        pred : float
+            The numeric prediction.
+
+        Returns
+        -------
+        str
+            'Insult' if prediction > threshold, 'Not an insult' otherwise.
+
+        """
+        return "Insult" if pred > self.threshold else "Not an insult"
 
     def predict_insult_ulm(self, text):
         """Predicts if a text contains an insult using a ULMFiT model.
@@ -182,8 +834,8 @@ class Pipeline:
             'Insult' if prediction > threshold, 'Not an insult' otherwise.
 
         """
-        pred = self.predict_text_ulm(self.ulm_insult_model, self.insult_mappings, text)
-        classification = "Insult" if pred > self.threshold else "Not an insult"
+        pred = self.predict_text_ulm(*self.get_head("insult"), text)
+        classification = self.classify_insult(pred)
         return pred, classification
 
     def predict_insult_ulm_multiple(self, texts):
@@ -202,10 +854,23 @@ class Pipeline:
             For each text, contains 'Insult' if prediction > threshold, 'Not an insult' otherwise.
 
         """
-        preds, classifications = [None] * len(texts), [None] * len(texts)
-        for i, text in enumerate(texts):
-            preds[i], classifications[i] = self.predict_insult_ulm(text)
-        return preds, classifications
+        return self.predict_heads_ulm(texts, ["insult"])["insult"]
+
+    def classify_obscenity(self, pred):
+        """Makes a judgement from a predicted obscenity score.
+
+        Parameters
+        ----------
+        pred : float
+            The numeric prediction.
+
+        Returns
+        -------
+        str
+            'Obscene' if prediction > threshold, 'Not obscene' otherwise.
+
+        """
+        return "Obscene" if pred > self.threshold else "Not obscene"
 
     def predict_obscenity_ulm(self, text):
         """Predicts if a text contains obscenity using a ULMFiT model.
@@ -223,8 +888,8 @@ class Pipeline:
             'Obscene' if prediction > threshold, 'Not obscene' otherwise.
 
         """
-        pred = self.predict_text_ulm(self.ulm_obscenity_model, self.obscenity_mappings, text)
-        classification = "Obscene" if pred > self.threshold else "Not obscene"
+        pred = self.predict_text_ulm(*self.get_head("obscenity"), text)
+        classification = self.classify_obscenity(pred)
         return pred, classification
 
     def predict_obscenity_ulm_multiple(self, texts):
@@ -243,10 +908,23 @@ class Pipeline:
             For each text, contains 'Obscene' if prediction > threshold, 'Not obscene' otherwise.
 
         """
-        preds, classifications = [None] * len(texts), [None] * len(texts)
-        for i, text in enumerate(texts):
-            preds[i], classifications[i] = self.predict_obscenity_ulm(text)
-        return preds, classifications
+        return self.predict_heads_ulm(texts, ["obscenity"])["obscenity"]
+
+    def classify_identity(self, pred):
+        """Makes a judgement from a predicted identity score.
+
+        Parameters
+        ----------
+        pred : float
+            The numeric prediction.
+
+        Returns
+        -------
+        str
+            'Identity hate' if prediction > threshold, 'Not identity hate' otherwise.
+
+        """
+        return "Identity hate" if pred > self.threshold else "Not identity hate"
 
     def predict_identity_ulm(self, text):
         """Predicts if a text contains identity hate using a ULMFiT model.
@@ -264,8 +942,8 @@ class Pipeline:
             'Identity hate' if prediction > threshold, 'Not identity hate' otherwise.
 
         """
-        pred = self.predict_text_ulm(self.ulm_identity_model, self.identity_mappings, text)
-        classification = "Identity hate" if pred > self.threshold else "Not identity hate"
+        pred = self.predict_text_ulm(*self.get_head("identity"), text)
+        classification = self.classify_identity(pred)
         return pred, classification
 
     def predict_identity_ulm_multiple(self, texts):
@@ -284,7 +962,4 @@ class Pipeline:
             For each text, contains 'Identity hate' if prediction > threshold, 'Not identity hate' otherwise.
 
         """
-        preds, classifications = [None] * len(texts), [None] * len(texts)
-        for i, text in enumerate(texts):
-            preds[i], classifications[i] = self.predict_identity_ulm(text)
-        return preds, classifications
+        return self.predict_heads_ulm(texts, ["identity"])["identity"]
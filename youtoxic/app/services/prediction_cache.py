@@ -0,0 +1,261 @@
+"""Contains implementation of a cache of predictions with a memory and an optional disk tier.
+
+Predictions are keyed by the head, the version of its model and a digest of the
+tokens of the text, so texts that only differ before preprocessing share an
+entry. The version changes whenever the model file changes, which invalidates
+the predictions of the previous model.
+
+"""
+import collections
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+
+
+logger = logging.getLogger(__name__)
+
+
+def text_digest(toks):
+    """Returns a 16 byte digest of the tokens of a text."""
+    return hashlib.blake2b("\x00".join(toks).encode("utf-8"), digest_size=16).digest()
+
+
+def model_version(filename, *settings):
+    """Returns a version string that changes whenever a model file or its settings change.
+
+    Parameters
+    ----------
+    filename : str
+        The model file.
+    settings
+        Settings that change the predictions of the model, such as its backend.
+
+    Returns
+    -------
+    str
+        The version of the model.
+
+    """
+    stat = os.stat(filename)
+    key = [filename, stat.st_size, stat.st_mtime_ns] + list(settings)
+    return hashlib.blake2b(repr(key).encode("utf-8"), digest_size=8).hexdigest()
+
+
+class CacheStats:
+    """The counters of a PredictionCache.
+
+    Attributes
+    ----------
+    hits : int
+        The lookups answered by the memory tier.
+    disk_hits : int
+        The lookups answered by the disk tier.
+    misses : int
+        The lookups that had to be predicted.
+    evictions : int
+        The entries evicted from the memory tier.
+
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def as_dict(self):
+        lookups = self.hits + self.disk_hits + self.misses
+        return dict(
+            hits=self.hits,
+            disk_hits=self.disk_hits,
+            misses=self.misses,
+            evictions=self.evictions,
+            hit_rate=(self.hits + self.disk_hits) / lookups if lookups else 0.0,
+        )
+
+
+class PredictionCache:
+    """Caches the predictions of each head in a memory LRU and an optional SQLite file.
+
+    The memory tier holds at most max_entries predictions and evicts the least
+    recently used ones. The disk tier survives restarts and is shared by the
+    processes of a node through SQLite in write-ahead log mode. Each process and
+    thread opens its own connection. Failing to read or write the disk tier is
+    logged and treated as a miss, so the cache never fails a prediction.
+
+    Attributes
+    ----------
+    max_entries : int
+        The maximum number of predictions held in memory.
+    filename : str
+        The SQLite file of the disk tier. No disk tier if None.
+
+    """
+
+    def __init__(self, max_entries, filename=None):
+        """Initializes an empty memory tier. The disk tier is opened on first use.
+
+        Parameters
+        ----------
+        max_entries : int
+            The maximum number of predictions held in memory.
+        filename : str
+            The SQLite file of the disk tier. No disk tier if None.
+
+        """
+        self.max_entries = max_entries
+        self.filename = filename
+        self.entries = collections.OrderedDict()
+        self.cache_stats = CacheStats()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get_many(self, head, version, digests):
+        """Returns the cached predictions of texts.
+
+        Parameters
+        ----------
+        head : str
+            The head that made the predictions.
+        version : str
+            The version of the head's model.
+        digests : list of bytes
+            The text_digest of each text. Each distinct digest counts as one lookup.
+
+        Returns
+        -------
+        dict
+            Maps the digests found in the cache to their predictions.
+
+        """
+        found, missing = dict(), list()
+        with self.lock:
+            for digest in dict.fromkeys(digests):
+                key = (head, version, digest)
+                if key in self.entries:
+                    self.entries.move_to_end(key)
+                    found[digest] = self.entries[key]
+                else:
+                    missing.append(digest)
+            self.cache_stats.hits += len(found)
+        on_disk = dict()
+        if missing and self.filename:
+            on_disk = self._read(head, version, missing)
+            with self.lock:
+                for digest, pred in on_disk.items():
+                    self._put(head, version, digest, pred)
+                self.cache_stats.disk_hits += len(on_disk)
+            found.update(on_disk)
+        with self.lock:
+            self.cache_stats.misses += len(missing) - len(on_disk)
+        return found
+
+    def put_many(self, head, version, preds):
+        """Stores the predictions of texts in both tiers.
+
+        Parameters
+        ----------
+        head : str
+            The head that made the predictions.
+        version : str
+            The version of the head's model.
+        preds : dict
+            Maps the text_digest of each text to its prediction.
+
+        """
+        with self.lock:
+            for digest, pred in preds.items():
+                self._put(head, version, digest, pred)
+        if self.filename:
+            self._write(head, version, preds)
+
+    def invalidate(self, head, version):
+        """Drops the predictions of every other version of a head's model.
+
+        Parameters
+        ----------
+        head : str
+            The head whose model was loaded.
+        version : str
+            The version of the loaded model.
+
+        """
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == head]:
+                if key[1] != version:
+                    del self.entries[key]
+        if self.filename:
+            self._execute(
+                "DELETE FROM predictions WHERE head = ? AND version != ?",
+                (head, version),
+            )
+
+    def stats(self):
+        """Returns the counters and size of the cache.
+
+        Returns
+        -------
+        dict
+            The hits, disk hits, misses, evictions, hit rate and number of entries
+            in memory.
+
+        """
+        with self.lock:
+            return dict(self.cache_stats.as_dict(), size=len(self.entries))
+
+    def _put(self, head, version, digest, pred):
+        key = (head, version, digest)
+        self.entries[key] = pred
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.cache_stats.evictions += 1
+
+    def _connection(self):
+        # Connections cannot be shared by threads, nor by processes forked after
+        # they are opened.
+        if getattr(self.local, "pid", None) != os.getpid():
+            connection = sqlite3.connect(self.filename, timeout=5)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS predictions (head TEXT, version TEXT, "
+                "digest BLOB, pred REAL, PRIMARY KEY (head, version, digest)) "
+                "WITHOUT ROWID"
+            )
+            self.local.connection, self.local.pid = connection, os.getpid()
+        return self.local.connection
+
+    def _execute(self, sql, parameters=(), many=False):
+        try:
+            connection = self._connection()
+            with connection:
+                if many:
+                    return connection.executemany(sql, parameters).fetchall()
+                return connection.execute(sql, parameters).fetchall()
+        except sqlite3.Error as e:
+            logger.warning("Prediction cache %s is unavailable: %s", self.filename, e)
+            return list()
+
+    def _read(self, head, version, digests):
+        rows = list()
+        # SQLite limits the number of parameters of a statement.
+        for i in range(0, len(digests), 500):
+            chunk = digests[i : i + 500]
+            rows += self._execute(
+                "SELECT digest, pred FROM predictions WHERE head = ? AND version = ? "
+                "AND digest IN ({})".format(", ".join("?" * len(chunk))),
+                [head, version] + chunk,
+            )
+        return {bytes(digest): pred for digest, pred in rows}
+
+    def _write(self, head, version, preds):
+        self._execute(
+            "INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?)",
+            [(head, version, digest, float(pred)) for digest, pred in preds.items()],
+            many=True,
+        )
@@ -0,0 +1,281 @@
+"""Contains implementation of a pre-forking multi-process server for the WSGI app.
+
+The parent process builds the app, which loads the models of the enabled heads,
+binds the listening socket and forks the workers. The workers share the pages of
+the weights with the parent copy-on-write, like the workers of ModelWorkerPool,
+and each serves the app with a pool of waitress threads on the shared socket.
+A worker that served its number of requests stops accepting connections,
+finishes its requests and background tasks, such as the jobs of JobQueue, and
+exits. A worker with a request running for longer than the request timeout is
+killed. The parent forks a new worker in either case.
+
+"""
+import itertools
+import logging
+import multiprocessing
+import multiprocessing.connection
+import os
+import random
+import signal
+import socket
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+class TrackedBody:
+    """Wraps the body of a response to tell when the server is done sending it.
+
+    Attributes
+    ----------
+    body : iterable
+        The body returned by the app.
+    done : callable
+        Called once the server has closed the body, even if it was not sent.
+
+    """
+
+    def __init__(self, body, done):
+        self.body = body
+        self.done = done
+
+    def __iter__(self):
+        return iter(self.body)
+
+    def close(self):
+        try:
+            if hasattr(self.body, "close"):
+                self.body.close()
+        finally:
+            self.done()
+
+
+class RequestTracker:
+    """WSGI middleware that counts the requests of a worker and times the running ones.
+
+    Attributes
+    ----------
+    app : callable
+        The wrapped WSGI app.
+    max_requests : int
+        The number of requests after which the worker drains. No limit if 0.
+    uncounted_paths : tuple of str
+        The paths of the requests that do not count towards max_requests, such
+        as the frequent polls of a page.
+    draining : threading.Event
+        Set once the worker should stop taking requests.
+    served : int
+        The number of requests started, not counting those to uncounted_paths.
+    running : dict
+        Maps the id of each running request to the time it started. A request
+        runs until its whole response is sent, so streamed responses are timed
+        too.
+
+    """
+
+    def __init__(self, app, max_requests=0, uncounted_paths=()):
+        self.app = app
+        self.max_requests = max_requests
+        self.uncounted_paths = tuple(uncounted_paths)
+        self.draining = threading.Event()
+        self.served = 0
+        self.running = dict()
+        self.request_ids = itertools.count()
+        self.lock = threading.Lock()
+
+    def __call__(self, environ, start_response):
+        with self.lock:
+            if environ.get("PATH_INFO") not in self.uncounted_paths:
+                self.served += 1
+            request_id = next(self.request_ids)
+            self.running[request_id] = time.monotonic()
+            if self.max_requests and self.served >= self.max_requests:
+                self.draining.set()
+        try:
+            body = self.app(environ, start_response)
+        except BaseException:
+            self.finish(request_id)
+            raise
+        return TrackedBody(body, lambda: self.finish(request_id))
+
+    def finish(self, request_id):
+        with self.lock:
+            del self.running[request_id]
+
+    def oldest(self):
+        """Returns the seconds the oldest running request has run for, 0 if none is running."""
+        with self.lock:
+            if not self.running:
+                return 0
+            return time.monotonic() - min(self.running.values())
+
+
+def _worker_main(
+    app, sock, threads, max_requests, request_timeout, uncounted_paths, busy
+):
+    from waitress import create_server
+
+    tracker = RequestTracker(app, max_requests, uncounted_paths)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda signum, frame: tracker.draining.set())
+    server = create_server(
+        tracker,
+        sockets=[sock],
+        threads=threads,
+        channel_timeout=request_timeout,
+        ident="youtoxic",
+    )
+
+    def watch():
+        while not tracker.draining.wait(0.5):
+            if tracker.oldest() > request_timeout:
+                logger.error(
+                    "Worker %d killed: a request ran for over %d seconds",
+                    os.getpid(),
+                    request_timeout,
+                )
+                os._exit(1)
+        server.accepting = False
+        logger.info("Worker %d draining after %d requests", os.getpid(), tracker.served)
+        # Connections accepted just before are given time to send their request.
+        time.sleep(0.5)
+        deadline = time.monotonic() + request_timeout
+        while (tracker.running or busy()) and time.monotonic() < deadline:
+            time.sleep(0.1)
+        # Waits for the threads writing the last responses.
+        server.task_dispatcher.shutdown(timeout=5)
+        os._exit(0)
+
+    threading.Thread(target=watch, daemon=True).start()
+    server.run()
+
+
+class PreforkServer:
+    """Serves a WSGI app from worker processes forked after the app is loaded.
+
+    Attributes
+    ----------
+    app : callable
+        The WSGI app. It should load its models before the server is run.
+    host : str
+        The host IP address.
+    port : int
+        The port of the webserver.
+    processes : int
+        The number of worker processes.
+    threads : int
+        The number of request threads of each worker.
+    max_requests : int
+        The number of requests after which a worker is replaced, give or take
+        a tenth so that the workers are not all replaced at once. Workers are
+        never replaced if 0.
+    request_timeout : float
+        The seconds after which a running request kills its worker. Also the
+        seconds an inactive connection is left open, and the seconds a draining
+        worker waits for its requests and background tasks.
+    uncounted_paths : tuple of str
+        The paths of the requests that do not count towards max_requests.
+    busy : callable
+        Returns the number of background tasks a worker is still running. A
+        draining worker waits for them. No background tasks if None.
+
+    """
+
+    def __init__(
+        self,
+        app,
+        host,
+        port,
+        processes=2,
+        threads=8,
+        max_requests=1000,
+        request_timeout=600,
+        uncounted_paths=(),
+        busy=None,
+    ):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.processes = processes
+        self.threads = threads
+        self.max_requests = max_requests
+        self.request_timeout = request_timeout
+        self.uncounted_paths = uncounted_paths
+        self.busy = busy or (lambda: 0)
+        self.workers = list()
+        self.stopping = threading.Event()
+        self.socket = None
+
+    def bind(self):
+        """Binds the listening socket shared by the workers and returns its address."""
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind((self.host, self.port))
+        self.socket.listen(1024)
+        self.socket.setblocking(False)
+        return self.socket.getsockname()
+
+    def spawn(self):
+        """Forks a worker."""
+        max_requests = self.max_requests
+        if max_requests:
+            max_requests += random.randint(0, max_requests // 10)
+        process = multiprocessing.get_context("fork").Process(
+            target=_worker_main,
+            args=(
+                self.app,
+                self.socket,
+                self.threads,
+                max_requests,
+                self.request_timeout,
+                self.uncounted_paths,
+                self.busy,
+            ),
+            name="server-worker",
+            daemon=True,
+        )
+        process.start()
+        return process
+
+    def run(self):
+        """Forks the workers and replaces those that exit until SIGTERM or SIGINT."""
+        if self.socket is None:
+            self.bind()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda signum, frame: self.stopping.set())
+        self.workers = [self.spawn() for _ in range(self.processes)]
+        logger.info(
+            "Serving on http://%s:%d with %d workers of %d threads",
+            self.host,
+            self.socket.getsockname()[1],
+            self.processes,
+            self.threads,
+        )
+        while not self.stopping.is_set():
+            multiprocessing.connection.wait(
+                [worker.sentinel for worker in self.workers], timeout=1
+            )
+            for i, worker in enumerate(self.workers):
+                if not worker.is_alive() and not self.stopping.is_set():
+                    worker.join()
+                    if worker.exitcode:
+                        logger.warning(
+                            "Worker %d exited with code %d", worker.pid, worker.exitcode
+                        )
+                    self.workers[i] = self.spawn()
+        self.shutdown()
+
+    def shutdown(self):
+        """Lets the workers finish their requests, then kills those still running."""
+        for worker in self.workers:
+            if worker.is_alive():
+                worker.terminate()
+        deadline = time.monotonic() + self.request_timeout
+        for worker in self.workers:
+            worker.join(max(deadline - time.monotonic(), 0))
+            if worker.is_alive():
+                os.kill(worker.pid, signal.SIGKILL)
+                worker.join()
+        self.socket.close()
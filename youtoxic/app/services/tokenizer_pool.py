@@ -0,0 +1,97 @@
+"""Contains implementation of a long-lived pool of tokenizer processes.
+
+"""
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+
+_worker_tokenizer = None
+
+
+def _init_worker(tokenizer):
+    global _worker_tokenizer
+    _worker_tokenizer = tokenizer
+
+
+def _process_chunk(texts):
+    return _worker_tokenizer.process_all(texts)
+
+
+class TokenizerPool:
+    """Tokenizes texts in-process or, for large inputs, across worker processes.
+
+    The worker processes are started once and reused for every call, so a call
+    does not pay for creating a process pool or pickling the tokenizer.
+
+    Attributes
+    ----------
+    tokenizer : Tokenizer
+        The tokenizer used in-process and copied to each worker. Its own
+        process_all must not start processes.
+    n_workers : int
+        The number of worker processes. No workers are started if this is 1 or less.
+    chunk_size : int
+        The number of texts sent to a worker at once. Inputs no larger than this
+        are tokenized in-process.
+
+    """
+
+    def __init__(self, tokenizer, n_workers, chunk_size):
+        """Initializes the pool. Worker processes are started on first use.
+
+        Parameters
+        ----------
+        tokenizer : Tokenizer
+            The tokenizer used in-process and copied to each worker.
+        n_workers : int
+            The number of worker processes.
+        chunk_size : int
+            The number of texts sent to a worker at once.
+
+        """
+        self.tokenizer = tokenizer
+        self.n_workers = n_workers
+        self.chunk_size = chunk_size
+        self.executor = None
+        self.lock = threading.Lock()
+
+    def process_all(self, texts):
+        """Tokenizes a list of texts.
+
+        Parameters
+        ----------
+        texts : list of str
+            The texts to tokenize.
+
+        Returns
+        -------
+        list of list of str
+            The tokens of each text.
+
+        """
+        if self.n_workers <= 1 or len(texts) <= self.chunk_size:
+            return self.tokenizer.process_all(texts)
+        with self.lock:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(
+                    self.n_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.tokenizer,),
+                )
+            executor = self.executor
+        chunks = [
+            texts[i : i + self.chunk_size] for i in range(0, len(texts), self.chunk_size)
+        ]
+        toks = list()
+        for chunk_toks in executor.map(_process_chunk, chunks):
+            toks.extend(chunk_toks)
+        return toks
+
+    def close(self):
+        """Shuts down the worker processes."""
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown()
+                self.executor = None
@@ -0,0 +1,307 @@
+"""Contains implementation of a pool of inference processes forked from a loaded Pipeline.
+
+The parent process loads the models and vocabularies of the enabled heads once
+and then forks the workers. The workers share the pages of the weights with the
+parent copy-on-write, and the memory-mapped weights through the page cache, so
+each worker only adds the memory of its own activations. Tensors are never
+written after loading, so the shared pages are not copied.
+
+Each worker has its own pipe to the parent, which sends the next request to
+an idle worker. A worker that dies only takes its own request down: the
+request fails and the worker is replaced.
+
+"""
+import collections
+import itertools
+import logging
+import multiprocessing
+import multiprocessing.connection
+import os
+import threading
+from concurrent.futures import Future
+
+import torch
+
+
+logger = logging.getLogger(__name__)
+
+
+def worker_cpus(index, threads, cpus):
+    """Returns the cores a worker is pinned to.
+
+    Parameters
+    ----------
+    index : int
+        The index of the worker.
+    threads : int
+        The number of intra-op threads of each worker.
+    cpus : list of int
+        The cores available to the pool.
+
+    Returns
+    -------
+    set of int
+        The threads consecutive cores of the worker, wrapping around when there
+        are more threads than cores.
+
+    """
+    return {cpus[(index * threads + i) % len(cpus)] for i in range(threads)}
+
+
+def _worker_main(pipeline, connection, threads, cpus):
+    if cpus:
+        os.sched_setaffinity(0, cpus)
+    torch.set_num_threads(threads)
+    # The workers tokenize in-process. Starting tokenizer processes from each of them
+    # would oversubscribe the cores.
+    pipeline.tokenizer.n_workers = 1
+    for task_id, texts, heads in iter(connection.recv, None):
+        try:
+            result, error = pipeline.predict_heads_ulm(texts, heads), None
+        except Exception as e:
+            result, error = None, e
+        try:
+            connection.send((task_id, result, error))
+        except Exception as e:
+            # The result or the exception could not be pickled.
+            error = RuntimeError(repr(e if error is None else error))
+            connection.send((task_id, None, error))
+
+
+class ModelWorkerPool:
+    """Makes predictions on worker processes forked from a Pipeline with loaded models.
+
+    Requests are queued in the parent and sent to the next idle worker, so a
+    slow request does not hold up the others. A worker that exits, for example
+    when it runs out of memory, fails its request and is replaced. The pool has
+    the predict_heads_ulm method of Pipeline and can be used in its place to
+    make predictions.
+
+    Attributes
+    ----------
+    pipeline : Pipeline
+        The pipeline whose models are loaded before forking.
+    n_workers : int
+        The number of worker processes.
+    threads : int
+        The number of intra-op threads of each worker.
+    pin : bool
+        Whether each worker is pinned to its own cores.
+    processes : list of Process
+        The worker processes.
+
+    """
+
+    def __init__(self, pipeline, n_workers, threads=1, pin=False):
+        """Initializes the pool. Worker processes are forked by start.
+
+        Parameters
+        ----------
+        pipeline : Pipeline
+            The pipeline whose models are loaded before forking.
+        n_workers : int
+            The number of worker processes.
+        threads : int
+            The number of intra-op threads of each worker.
+        pin : bool
+            Whether each worker is pinned to its own cores.
+
+        """
+        self.pipeline = pipeline
+        self.n_workers = n_workers
+        self.threads = threads
+        self.pin = pin
+        self.cpus = None
+        self.processes = list()
+        # The parent end of the pipe of each worker, None once it has stopped.
+        self.connections = list()
+        # The id of the request each worker is running, None if it is idle.
+        self.running = list()
+        self.pending = collections.deque()
+        self.futures = dict()
+        self.task_ids = itertools.count()
+        self.lock = threading.Lock()
+        self.collector = None
+
+    def start(self):
+        """Loads the enabled heads and forks the worker processes."""
+        self.pipeline.heads.preload()
+        self.cpus = sorted(os.sched_getaffinity(0)) if self.pin else None
+        for index in range(self.n_workers):
+            process, connection = self._spawn(index)
+            self.processes.append(process)
+            self.connections.append(connection)
+            self.running.append(None)
+        self.collector = threading.Thread(target=self._collect, daemon=True)
+        self.collector.start()
+        logger.info(
+            "Started %d model workers with %d threads each",
+            self.n_workers,
+            self.threads,
+        )
+        return self
+
+    def submit(self, texts, heads):
+        """Sends texts to the workers to be predicted.
+
+        Parameters
+        ----------
+        texts : list of str
+            The texts to predict.
+        heads : list of str
+            The heads to run.
+
+        Returns
+        -------
+        Future
+            Resolves to the result of Pipeline.predict_heads_ulm.
+
+        """
+        future = Future()
+        with self.lock:
+            if self.collector is None:
+                raise RuntimeError("The model worker pool is not running")
+            task_id = next(self.task_ids)
+            self.futures[task_id] = future
+            self.pending.append((task_id, list(texts), list(heads)))
+            self._dispatch()
+        return future
+
+    def predict_heads_ulm(self, texts, heads):
+        """Predicts several types of toxicity for texts on the workers.
+
+        Parameters
+        ----------
+        texts : list of str
+            The texts to predict.
+        heads : list of str
+            The heads to run.
+
+        Returns
+        -------
+        dict
+            Maps each head to a list of numeric predictions and a list of judgements.
+
+        """
+        return self.submit(texts, heads).result()
+
+    def close(self):
+        """Stops the worker processes and fails the requests that are still pending."""
+        with self.lock:
+            collector, self.collector = self.collector, None
+            if collector is None:
+                return
+            for connection in self.connections:
+                if connection is not None:
+                    try:
+                        connection.send(None)
+                    except OSError:
+                        pass
+        collector.join()
+        for process in self.processes:
+            process.join()
+        with self.lock:
+            futures, self.futures = self.futures, dict()
+            self.pending.clear()
+        for future in futures.values():
+            future.set_exception(RuntimeError("The model worker pool was closed"))
+        self.pipeline.close()
+
+    def _spawn(self, index):
+        context = multiprocessing.get_context("fork")
+        connection, child = context.Pipe()
+        process = context.Process(
+            target=_worker_main,
+            args=(
+                self.pipeline,
+                child,
+                self.threads,
+                self.cpus and worker_cpus(index, self.threads, self.cpus),
+            ),
+            name="model-worker-{}".format(index),
+            daemon=True,
+        )
+        process.start()
+        # Only the worker keeps its end, so the parent sees the pipe close if it dies.
+        child.close()
+        return process, connection
+
+    def _dispatch(self):
+        # Called with the lock held.
+        for index, task_id in enumerate(self.running):
+            if not self.pending:
+                return
+            if task_id is None and self.connections[index] is not None:
+                task = self.pending.popleft()
+                self.running[index] = task[0]
+                try:
+                    self.connections[index].send(task)
+                except OSError:
+                    # The worker exited. Its request fails when it is replaced.
+                    pass
+
+    def _collect(self):
+        while True:
+            with self.lock:
+                workers = [
+                    (index, process, connection)
+                    for index, (process, connection) in enumerate(
+                        zip(self.processes, self.connections)
+                    )
+                    if connection is not None
+                ]
+            if not workers:
+                return
+            ready = set(
+                multiprocessing.connection.wait(
+                    [connection for _, _, connection in workers]
+                    + [process.sentinel for _, process, _ in workers]
+                )
+            )
+            # Results are read before exits, so a worker that sent its result
+            # and then exited does not fail its request.
+            for index, process, connection in workers:
+                if connection in ready:
+                    try:
+                        self._resolve(index, *connection.recv())
+                    except (EOFError, OSError):
+                        self._exited(index, process)
+            for index, process, _ in workers:
+                if process.sentinel in ready:
+                    self._exited(index, process)
+
+    def _resolve(self, index, task_id, result, error):
+        with self.lock:
+            self.running[index] = None
+            future = self.futures.pop(task_id, None)
+            self._dispatch()
+        if future is None:
+            return
+        if error is None:
+            future.set_result(result)
+        else:
+            future.set_exception(error)
+
+    def _exited(self, index, process):
+        with self.lock:
+            if self.processes[index] is not process or self.connections[index] is None:
+                return
+            process.join()
+            task_id, self.running[index] = self.running[index], None
+            future = self.futures.pop(task_id, None)
+            self.connections[index].close()
+            self.connections[index] = None
+            if self.collector is not None:
+                logger.error(
+                    "Model worker %d exited with code %s, replacing it",
+                    process.pid,
+                    process.exitcode,
+                )
+                self.processes[index], self.connections[index] = self._spawn(index)
+                self._dispatch()
+        if future is not None:
+            future.set_exception(
+                RuntimeError(
+                    "The model worker exited with code {}".format(process.exitcode)
+                )
+            )
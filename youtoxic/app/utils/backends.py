@@ -0,0 +1,295 @@
+"""Contains the inference engines that run a ULMFiT classifier on padded batches.
+
+Every engine takes a padded (seq_len, batch) array of token ids together with the
+length of each sequence and returns the logits of the batch, so any batch and
+sequence length can be scored by any engine.
+
+"""
+import warnings
+from pathlib import Path
+
+import torch
+import torch.nn as nn
+
+from youtoxic.app.utils.inference_rnn import FrozenRNNClassifier, freeze_for_inference
+from youtoxic.app.utils.load_files import is_fresh, load_model, save_atomically
+
+
+BACKENDS = ("eager", "torchscript", "onnx")
+
+
+class ScoringModule(nn.Module):
+    """Wraps a frozen classifier as a function of padded tokens and lengths that returns logits.
+
+    Attributes
+    ----------
+    model : FrozenRNNClassifier
+        The wrapped classifier.
+
+    """
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input, lengths):
+        return self.model(input, lengths)[0]
+
+
+class EagerEngine:
+    """Runs the PyTorch model directly.
+
+    Attributes
+    ----------
+    model : SequentialRNN or FrozenRNNClassifier
+        The classifier in eval mode.
+
+    """
+
+    name = "eager"
+
+    def __init__(self, model):
+        self.model = model
+
+    def run(self, ary, lengths):
+        """Computes the logits of a padded batch.
+
+        Parameters
+        ----------
+        ary : ndarray
+            The int64 token ids with shape (seq_len, batch).
+        lengths : ndarray
+            The int64 length of each sequence.
+
+        Returns
+        -------
+        ndarray
+            The logits with shape (batch, 2).
+
+        """
+        with torch.no_grad():
+            logits = self.model(torch.from_numpy(ary), torch.from_numpy(lengths))[0]
+        return logits.data.numpy()
+
+
+class TorchScriptEngine:
+    """Runs a traced TorchScript version of the frozen model.
+
+    Attributes
+    ----------
+    module : torch.jit.ScriptModule
+        The traced ScoringModule.
+
+    """
+
+    name = "torchscript"
+
+    def __init__(self, module):
+        self.module = module
+
+    def run(self, ary, lengths):
+        """Computes the logits of a padded batch. See EagerEngine.run."""
+        with torch.no_grad():
+            logits = self.module(torch.from_numpy(ary), torch.from_numpy(lengths))
+        return logits.numpy()
+
+
+class OnnxEngine:
+    """Runs an exported ONNX graph of the frozen model with onnxruntime on CPU.
+
+    Attributes
+    ----------
+    session : onnxruntime.InferenceSession
+        The session holding the exported graph.
+
+    """
+
+    name = "onnx"
+
+    def __init__(self, session):
+        self.session = session
+
+    def run(self, ary, lengths):
+        """Computes the logits of a padded batch. See EagerEngine.run."""
+        return self.session.run(None, {"input": ary, "lengths": lengths})[0]
+
+
+def example_inputs():
+    """Returns a small padded batch used to trace and export a model."""
+    return torch.ones(3, 2, dtype=torch.long), torch.tensor([3, 2])
+
+
+def export_torchscript(model, filename):
+    """Traces a frozen classifier and saves it as TorchScript.
+
+    Parameters
+    ----------
+    model : FrozenRNNClassifier
+        The frozen classifier, optionally quantized.
+    filename : str
+        The file to save the traced module to.
+
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        module = torch.jit.trace(ScoringModule(model).eval(), example_inputs())
+    save_atomically(filename, lambda tmp: torch.jit.save(module, tmp))
+
+
+def export_onnx(model, filename):
+    """Exports a frozen classifier as an ONNX graph with dynamic batch and sequence axes.
+
+    Parameters
+    ----------
+    model : FrozenRNNClassifier
+        The frozen float classifier.
+    filename : str
+        The file to save the graph to.
+
+    """
+    kwargs = dict(
+        input_names=["input", "lengths"],
+        output_names=["logits"],
+        dynamic_axes={
+            "input": {0: "seq_len", 1: "batch"},
+            "lengths": {0: "batch"},
+            "logits": {0: "batch"},
+        },
+        opset_version=14,
+    )
+    if "dynamo" in torch.onnx.export.__code__.co_varnames:
+        kwargs["dynamo"] = False
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        save_atomically(
+            filename,
+            lambda tmp: torch.onnx.export(
+                ScoringModule(model).eval(), example_inputs(), tmp, **kwargs
+            ),
+        )
+
+
+def export_filename(classifier_filename, backend, quantize=False):
+    """Returns the file next to the trained weights that caches a compiled engine.
+
+    Parameters
+    ----------
+    classifier_filename : str
+        The file containing the trained classifier, for example 'toxicity_model.h5'.
+    backend : str
+        Either 'torchscript' or 'onnx'.
+    quantize : bool
+        Whether the export holds dynamic int8 layers.
+
+    Returns
+    -------
+    str
+        For example 'toxicity_model.pt', 'toxicity_model.int8.pt' or 'toxicity_model.onnx'.
+
+    """
+    suffix = ".pt" if backend == "torchscript" else ".onnx"
+    if quantize:
+        suffix = ".int8" + suffix
+    return str(Path(classifier_filename).with_suffix(suffix))
+
+
+def make_engine(backend, model, filename=None, quantize=False):
+    """Wraps a loaded model in the given engine, exporting it first for the compiled engines.
+
+    Parameters
+    ----------
+    backend : str
+        One of 'eager', 'torchscript' and 'onnx'.
+    model : SequentialRNN or FrozenRNNClassifier
+        The classifier in eval mode. The compiled engines freeze it if it is not frozen yet.
+    filename : str
+        Where to save the export. Unused by the eager engine.
+    quantize : bool
+        Whether the model holds dynamic int8 layers.
+
+    Returns
+    -------
+    EagerEngine, TorchScriptEngine or OnnxEngine
+        The engine.
+
+    """
+    if backend not in BACKENDS:
+        raise ValueError("Unknown inference backend: {}".format(backend))
+    if backend == "eager":
+        return EagerEngine(model)
+    if not isinstance(model, FrozenRNNClassifier):
+        model = freeze_for_inference(model)
+    if backend == "torchscript":
+        export_torchscript(model, filename)
+    elif quantize:
+        raise ValueError("The onnx backend does not support dynamic int8 models.")
+    else:
+        export_onnx(model, filename)
+    return load_engine_file(backend, filename)
+
+
+def load_engine_file(backend, filename):
+    """Loads a cached TorchScript or ONNX export into its engine."""
+    if backend == "torchscript":
+        return TorchScriptEngine(torch.jit.load(filename))
+    try:
+        import onnxruntime
+    except ImportError:
+        raise ImportError("The onnx backend requires the onnxruntime package.")
+    session = onnxruntime.InferenceSession(filename, providers=["CPUExecutionProvider"])
+    return OnnxEngine(session)
+
+
+def load_engine(
+    backend,
+    vocab_size,
+    classifier_filename,
+    freeze=True,
+    quantize=False,
+    mmap=False,
+    chunk_size=0,
+):
+    """Loads a trained ULMFiT model into the given inference engine.
+
+    The TorchScript and ONNX exports are cached next to the trained weights and
+    are rebuilt only when the weights are newer than the cached export.
+
+    Parameters
+    ----------
+    backend : str
+        One of 'eager', 'torchscript' and 'onnx'.
+    vocab_size : int
+        The number of unique vocabulary tokens.
+    classifier_filename : str
+        The file containing the trained classifier.
+    freeze : bool
+        Whether to convert the eager model into a minimal eval-only module.
+        The compiled engines are always built from the frozen model.
+    quantize : bool
+        Whether to convert the LSTM and linear layers to dynamic int8.
+    mmap : bool
+        Whether the eager engine memory-maps the weights of the frozen model.
+    chunk_size : int
+        The number of tokens the eager engine streams through the frozen model
+        at a time, see FrozenRNNClassifier. The whole sequence is run at once if 0.
+
+    Returns
+    -------
+    EagerEngine, TorchScriptEngine or OnnxEngine
+        The engine.
+
+    """
+    if backend not in BACKENDS:
+        raise ValueError("Unknown inference backend: {}".format(backend))
+    if backend == "eager":
+        model = load_model(vocab_size, classifier_filename, freeze, quantize, mmap)
+        if isinstance(model, FrozenRNNClassifier):
+            model.chunk_size = chunk_size
+        return EagerEngine(model)
+    if backend == "onnx" and quantize:
+        raise ValueError("The onnx backend does not support dynamic int8 models.")
+    filename = export_filename(classifier_filename, backend, quantize)
+    if is_fresh(filename, classifier_filename):
+        return load_engine_file(backend, filename)
+    model = load_model(vocab_size, classifier_filename, True, quantize)
+    return make_engine(backend, model, filename, quantize)
@@ -0,0 +1,287 @@
+"""Contains implementation of functions used to batch encoded texts for the models.
+
+"""
+import time
+
+import numpy as np
+
+
+class BatchReport:
+    """Summarizes the padding overhead and throughput of one batched call.
+
+    Attributes
+    ----------
+    texts : int
+        The number of texts scored.
+    batches : int
+        The number of batches run.
+    real_tokens : int
+        The number of tokens belonging to texts.
+    padded_tokens : int
+        The number of tokens passed through the model, padding included.
+    seconds : float
+        The time spent running the batches.
+
+    """
+
+    def __init__(self):
+        self.texts = 0
+        self.batches = 0
+        self.real_tokens = 0
+        self.padded_tokens = 0
+        self.seconds = 0.0
+
+    @property
+    def padding_overhead(self):
+        """float: The fraction of tokens passed through the model that were padding."""
+        if not self.padded_tokens:
+            return 0.0
+        return 1 - self.real_tokens / self.padded_tokens
+
+    @property
+    def tokens_per_second(self):
+        """float: The number of real tokens scored per second."""
+        if not self.seconds:
+            return 0.0
+        return self.real_tokens / self.seconds
+
+    def __str__(self):
+        return "{} texts in {} batches, {:.1%} padding, {:.0f} tokens/s".format(
+            self.texts, self.batches, self.padding_overhead, self.tokens_per_second
+        )
+
+
+class DedupReport:
+    """Summarizes the duplicate texts found in one call.
+
+    Attributes
+    ----------
+    texts : int
+        The number of texts with at least one token.
+    unique : int
+        The number of distinct tokenized texts among them.
+    tokens : int
+        The number of tokens of all texts.
+    unique_tokens : int
+        The number of tokens of the distinct texts, which are the tokens scored.
+
+    """
+
+    def __init__(self, texts=0, unique=0, tokens=0, unique_tokens=0):
+        self.texts = texts
+        self.unique = unique
+        self.tokens = tokens
+        self.unique_tokens = unique_tokens
+
+    @property
+    def duplicate_ratio(self):
+        """float: The fraction of texts that duplicate an earlier text."""
+        if not self.texts:
+            return 0.0
+        return 1 - self.unique / self.texts
+
+    @property
+    def compute_saved(self):
+        """float: The fraction of tokens that were not scored thanks to deduplication."""
+        if not self.tokens:
+            return 0.0
+        return 1 - self.unique_tokens / self.tokens
+
+    def __str__(self):
+        return "{} texts, {} unique, {:.1%} duplicates, {:.1%} compute saved".format(
+            self.texts, self.unique, self.duplicate_ratio, self.compute_saved
+        )
+
+
+def group_duplicates(toks):
+    """Groups texts that have the same tokens, since the models score them the same.
+
+    Parameters
+    ----------
+    toks : list of list of str
+        The tokens of each text.
+
+    Returns
+    -------
+    list of list of int
+        The indices of the texts sharing each distinct list of tokens, in order of
+        first appearance.
+    list of list of str
+        The distinct lists of tokens.
+    DedupReport
+        The duplicate ratio and compute saved.
+
+    """
+    groups = dict()
+    for i, tok in enumerate(toks):
+        groups.setdefault("\x00".join(tok), (tok, list()))[1].append(i)
+    unique_toks = [tok for tok, _ in groups.values()]
+    report = DedupReport(
+        len(toks),
+        len(groups),
+        sum(len(tok) for tok in toks),
+        sum(len(tok) for tok in unique_toks),
+    )
+    return [indices for _, indices in groups.values()], unique_toks, report
+
+
+def pad_batch(encoded, pad_token=1):
+    """Right-pads encoded texts into a single (seq_len, batch) array.
+
+    Parameters
+    ----------
+    encoded : list of list of int
+        The token ids of each text.
+    pad_token : int
+        The token id used for padding.
+
+    Returns
+    -------
+    ndarray
+        The padded token ids, of shape (seq_len, batch).
+    ndarray
+        The number of real tokens in each text.
+
+    """
+    lengths = np.array([len(ids) for ids in encoded], dtype=np.int64)
+    ary = np.full((lengths.max(), len(encoded)), pad_token, dtype=np.int64)
+    for i, ids in enumerate(encoded):
+        ary[: len(ids), i] = ids
+    return ary, lengths
+
+
+def bucket_by_length(lengths, token_budget, max_batch_size):
+    """Groups texts of similar length into batches that fit a token budget.
+
+    Texts are sorted by length and added to the current batch until its padded
+    size, the longest length times the number of texts, would exceed the budget.
+    A text longer than the budget is given a batch of its own.
+
+    Parameters
+    ----------
+    lengths : list of int
+        The number of tokens in each text.
+    token_budget : int
+        The maximum number of padded tokens in a batch.
+    max_batch_size : int
+        The maximum number of texts in a batch.
+
+    Returns
+    -------
+    list of list of int
+        The indices of the texts in each batch.
+
+    """
+    buckets, bucket = list(), list()
+    for i in np.argsort(lengths, kind="stable"):
+        padded = lengths[i] * (len(bucket) + 1)
+        if bucket and (padded > token_budget or len(bucket) == max_batch_size):
+            buckets.append(bucket)
+            bucket = list()
+        bucket.append(int(i))
+    if bucket:
+        buckets.append(bucket)
+    return buckets
+
+
+def predict_bucketed(encoded, predict, token_budget, max_batch_size):
+    """Scores encoded texts in length buckets and returns results in input order.
+
+    Parameters
+    ----------
+    encoded : list of list of int
+        The token ids of each text. Each text must contain at least one token.
+    predict : callable
+        Takes a list of encoded texts and returns an array with a result for each.
+    token_budget : int
+        The maximum number of padded tokens in a batch.
+    max_batch_size : int
+        The maximum number of texts in a batch.
+
+    Returns
+    -------
+    ndarray
+        The result for each text.
+    BatchReport
+        The padding overhead and throughput of the call.
+
+    """
+    report = BatchReport()
+    results = np.zeros(len(encoded))
+    lengths = [len(ids) for ids in encoded]
+    start = time.perf_counter()
+    for bucket in bucket_by_length(lengths, token_budget, max_batch_size):
+        results[bucket] = predict([encoded[i] for i in bucket])
+        report.batches += 1
+        report.padded_tokens += max(lengths[i] for i in bucket) * len(bucket)
+    report.seconds = time.perf_counter() - start
+    report.texts = len(encoded)
+    report.real_tokens = sum(lengths)
+    return results, report
+
+
+def split_windows(encoded, size, stride):
+    """Splits encoded texts longer than a window into overlapping windows.
+
+    The windows of a text start every stride tokens and the last one ends with
+    the text, so every token is in at least one window.
+
+    Parameters
+    ----------
+    encoded : list of list of int
+        The token ids of each text.
+    size : int
+        The maximum number of tokens in a window.
+    stride : int
+        The number of tokens between the starts of consecutive windows, at
+        most size.
+
+    Returns
+    -------
+    list of list of int
+        The token ids of each window. Texts that fit are a single window.
+    ndarray
+        The index of the text of each window.
+
+    Raises
+    ------
+    ValueError
+        If the stride is not between 1 and size, which would skip tokens.
+
+    """
+    if not 0 < stride <= size:
+        raise ValueError("Window stride {} is not in 1..{}".format(stride, size))
+    windows, owners = list(), list()
+    for i, ids in enumerate(encoded):
+        starts = list(range(0, len(ids) - size, stride)) + [max(len(ids) - size, 0)]
+        windows.extend(ids[start : start + size] for start in starts)
+        owners.extend([i] * len(starts))
+    return windows, np.array(owners, dtype=np.int64)
+
+
+def aggregate_windows(results, owners, n_texts, aggregation="max"):
+    """Aggregates the results of the windows of each text.
+
+    Parameters
+    ----------
+    results : ndarray
+        The result for each window.
+    owners : ndarray
+        The index of the text of each window, see split_windows.
+    n_texts : int
+        The number of texts.
+    aggregation : str
+        'max' or 'mean'.
+
+    Returns
+    -------
+    ndarray
+        The result for each text.
+
+    """
+    if aggregation == "mean":
+        counts = np.bincount(owners, minlength=n_texts)
+        return np.bincount(owners, results, minlength=n_texts) / counts
+    aggregated = np.full(n_texts, -np.inf)
+    np.maximum.at(aggregated, owners, results)
+    return aggregated
@@ -0,0 +1,230 @@
+"""Code for an eval-only version of the ULMFiT classifier that is built from a trained SequentialRNN.
+
+"""
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+from youtoxic.app.utils.lm_rnn import WeightDrop
+
+
+class FrozenRNNClassifier(nn.Module):
+    """The ULMFiT classifier without dropout, weight drop and batch norm.
+
+    Each LSTM runs over the whole sequence in a single call. This gives the same
+    outputs as running it bptt tokens at a time while carrying the hidden state,
+    which is what MultiBatchRNN does. With a chunk_size, all the layers run over
+    one chunk at a time instead and only the pools of the last layer are kept,
+    so the activations held do not grow with the sequence length.
+
+    Attributes
+    ----------
+    encoder : nn.Embedding
+        The token embeddings.
+    rnns : nn.ModuleList
+        The plain LSTM layers.
+    layers : nn.ModuleList
+        The linear layers of the classifier head with batch norm folded in.
+    bptt : int
+        The chunk size used by the trained model, which decides the pooled region.
+    max_seq : int
+        Only chunks starting within max_seq tokens of the end are pooled over.
+    chunk_size : int
+        The number of tokens streamed through the layers at a time. The whole
+        sequence is run at once if 0. Not traceable, so only the eager engine
+        streams.
+
+    """
+
+    def __init__(self, encoder, rnns, layers, bptt, max_seq, chunk_size=0):
+        super().__init__()
+        self.encoder = encoder
+        self.rnns = nn.ModuleList(rnns)
+        self.layers = nn.ModuleList(layers)
+        self.bptt, self.max_seq = bptt, max_seq
+        self.chunk_size = chunk_size
+        for rnn in self.rnns:
+            rnn.flatten_parameters()
+
+    def reset(self):
+        pass
+
+    def first_pooled(self, lengths):
+        """Returns the start of the first pooled chunk for sequences of the given lengths."""
+        over = (lengths - self.max_seq).clamp(min=-1)
+        return (over + self.bptt) // self.bptt * self.bptt
+
+    def encode(self, input):
+        """Runs the embedding and LSTM layers and returns the outputs of the last layer."""
+        output = F.embedding(input, self.encoder.weight)
+        for rnn in self.rnns:
+            output, _ = rnn(output)
+        return output
+
+    def pool(self, output, lengths):
+        """Concatenates the last output with the max and mean pools over the pooled region."""
+        sl = output.size(0)
+        if lengths is None:
+            first = int(self.first_pooled(torch.tensor(sl)))
+            output = output[first:]
+            return torch.cat([output[-1], output.max(0)[0], output.mean(0)], 1)
+        steps = torch.arange(sl, device=output.device).view(-1, 1)
+        mask = (steps >= self.first_pooled(lengths).view(1, -1)) & (steps < lengths.view(1, -1))
+        fmask = mask.unsqueeze(2).type_as(output)
+        avgpool = (output * fmask).sum(0) / fmask.sum(0)
+        mxpool = output.masked_fill(mask.unsqueeze(2) == 0, float("-inf")).max(0)[0]
+        # Selecting the last step with a mask rather than advanced indexing keeps the
+        # graph traceable and exportable with dynamic batch and sequence sizes.
+        last = (output * (steps == lengths.view(1, -1) - 1).unsqueeze(2).type_as(output)).sum(0)
+        return torch.cat([last, mxpool, avgpool], 1)
+
+    def stream(self, input, lengths):
+        """Runs the layers chunk by chunk, keeping running pools of the last layer's outputs.
+
+        Returns the same as pool(encode(input), lengths), while holding the
+        activations of a single chunk at a time.
+
+        """
+        sl, bs = input.size()
+        if lengths is None:
+            lengths = torch.full((bs,), sl, dtype=torch.long)
+        first, ends = self.first_pooled(lengths).view(1, -1), lengths.view(1, -1)
+        states = [None] * len(self.rnns)
+        last = mxpool = total = None
+        for start in range(0, sl, self.chunk_size):
+            output = F.embedding(
+                input[start : start + self.chunk_size], self.encoder.weight
+            )
+            for k, rnn in enumerate(self.rnns):
+                output, states[k] = rnn(output, states[k])
+            steps = torch.arange(start, start + output.size(0)).view(-1, 1)
+            mask = ((steps >= first) & (steps < ends)).unsqueeze(2)
+            at_end = (steps == ends - 1).unsqueeze(2).type_as(output)
+            chunk_last = (output * at_end).sum(0)
+            chunk_max = output.masked_fill(~mask, float("-inf")).max(0)[0]
+            chunk_total = (output * mask.type_as(output)).sum(0)
+            if last is None:
+                last, mxpool, total = chunk_last, chunk_max, chunk_total
+            else:
+                last = last + chunk_last
+                mxpool = torch.max(mxpool, chunk_max)
+                total = total + chunk_total
+        avgpool = total / (ends - first).view(-1, 1).type_as(total)
+        return torch.cat([last, mxpool, avgpool], 1)
+
+    def forward(self, input, lengths=None):
+        with torch.no_grad():
+            if self.chunk_size:
+                x = self.stream(input, lengths)
+            else:
+                x = self.pool(self.encode(input), lengths)
+            for i, layer in enumerate(self.layers):
+                x = layer(x) if i == len(self.layers) - 1 else F.relu(layer(x))
+        return (x,)
+
+
+def unwrap_lstm(rnn):
+    """Returns a plain LSTM holding the eval-mode weights of a possibly weight-dropped LSTM.
+
+    Parameters
+    ----------
+    rnn : WeightDrop or nn.LSTM
+        A layer of a trained RNNEncoder.
+
+    Returns
+    -------
+    nn.LSTM
+        An LSTM without weight drop.
+
+    """
+    module = rnn.module if isinstance(rnn, WeightDrop) else rnn
+    lstm = nn.LSTM(
+        module.input_size,
+        module.hidden_size,
+        module.num_layers,
+        bidirectional=module.bidirectional,
+    )
+    params = dict(module.named_parameters())
+    for name, _ in lstm.named_parameters():
+        source = params.get(name + "_raw", params.get(name))
+        getattr(lstm, name).data.copy_(source.data)
+    return lstm
+
+
+def fold_linear_block(block):
+    """Folds the eval-mode batch norm of a LinearBlock into its linear layer.
+
+    Parameters
+    ----------
+    block : LinearBlock
+        A block of the trained PoolingLinearClassifier.
+
+    Returns
+    -------
+    nn.Linear
+        A linear layer computing lin(bn(x)).
+
+    """
+    bn, lin = block.bn, block.lin
+    scale = bn.weight.data / torch.sqrt(bn.running_var + bn.eps)
+    shift = bn.bias.data - bn.running_mean * scale
+    folded = nn.Linear(lin.in_features, lin.out_features)
+    folded.weight.data.copy_(lin.weight.data * scale.view(1, -1))
+    folded.bias.data.copy_(lin.bias.data + lin.weight.data.mv(shift))
+    return folded
+
+
+def freeze_for_inference(model):
+    """Converts a trained SequentialRNN into a minimal eval-only FrozenRNNClassifier.
+
+    Parameters
+    ----------
+    model : SequentialRNN
+        The trained classifier.
+
+    Returns
+    -------
+    FrozenRNNClassifier
+        A classifier with the same outputs in eval mode.
+
+    """
+    rnn_enc, classifier = model[0], model[1]
+    encoder = nn.Embedding(*rnn_enc.encoder.weight.size())
+    encoder.weight.data.copy_(rnn_enc.encoder.weight.data)
+    frozen = FrozenRNNClassifier(
+        encoder,
+        [unwrap_lstm(rnn) for rnn in rnn_enc.rnns],
+        [fold_linear_block(block) for block in classifier.layers],
+        rnn_enc.bptt,
+        rnn_enc.max_seq,
+    )
+    return frozen.eval()
+
+
+def quantize_for_inference(model, inplace=False):
+    """Converts the LSTM and linear layers of a frozen classifier to dynamic int8.
+
+    Weights are stored as int8 and activations are quantized on the fly, so the
+    matrix multiplications run on int8 kernels. The embeddings stay in float32.
+
+    Parameters
+    ----------
+    model : FrozenRNNClassifier
+        The frozen classifier.
+    inplace : bool
+        Whether to convert the layers of the classifier itself rather than of a
+        copy. A copy holds its own copy of every weight, including those mapped
+        from a file, so mapped classifiers are converted in place to keep their
+        embeddings mapped.
+
+    Returns
+    -------
+    FrozenRNNClassifier
+        The classifier with quantized layers, a copy unless inplace.
+
+    """
+    if not hasattr(torch, "quantization"):
+        raise RuntimeError("Dynamic int8 quantization requires torch 1.3 or newer.")
+    return torch.quantization.quantize_dynamic(
+        model, {nn.LSTM, nn.Linear}, dtype=torch.qint8, inplace=inplace
+    )
@@ -61,13 +61,45 @@ class PoolingLinearClassifier(nn.Module):
         f = F.adaptive_max_pool1d if is_max else F.adaptive_avg_pool1d
         return f(x.permute(1, 2, 0), (1,)).view(bs, -1)
 
+    def masked_pool(self, x, mask):
+        """Pools over the timesteps of a right-padded batch, ignoring padding.
+
+        Parameters
+        ----------
+        x : Tensor
+            The outputs of the last layer, of shape (seq_len, batch, n_hid).
+        mask : Tensor
+            Nonzero where x holds a real token, of shape (seq_len, batch).
+
+        Returns
+        -------
+        Tensor
+            The output at the last real timestep of each sequence.
+        Tensor
+            The max pool over the real timesteps.
+        Tensor
+            The mean pool over the real timesteps.
+
+        """
+        sl, bs, _ = x.size()
+        fmask = mask.unsqueeze(2).type_as(x)
+        avgpool = (x * fmask).sum(0) / fmask.sum(0)
+        mxpool = x.masked_fill(mask.unsqueeze(2) == 0, float("-inf")).max(0)[0]
+        steps = torch.arange(sl, device=x.device).unsqueeze(1)
+        last = (mask.long() * steps).max(0)[0]
+        return x[last, torch.arange(bs, device=x.device)], mxpool, avgpool
+
     def forward(self, input):
-        raw_outputs, outputs = input
+        raw_outputs, outputs = input[:2]
         output = outputs[-1]
         sl, bs, _ = output.size()
-        avgpool = self.pool(output, bs, False)
-        mxpool = self.pool(output, bs, True)
-        x = torch.cat([output[-1], mxpool, avgpool], 1)
+        if len(input) > 2:
+            last, mxpool, avgpool = self.masked_pool(output, input[2])
+        else:
+            last = output[-1]
+            avgpool = self.pool(output, bs, False)
+            mxpool = self.pool(output, bs, True)
+        x = torch.cat([last, mxpool, avgpool], 1)
         for l in self.layers:
             l_x = l(x)
             x = F.relu(l_x)
@@ -114,8 +146,17 @@ class WeightDrop(torch.nn.Module):
                 delattr(self.module, name_w)
             setattr(self.module, name_w, w)
 
+    def train(self, mode=True):
+        super().train(mode)
+        if not mode:
+            # The eval-mode weights are the raw weights, so they are set once here and
+            # forwards do not modify the module. This lets threads share it.
+            self._setweights()
+        return self
+
     def forward(self, *args):
-        self._setweights()
+        if self.training:
+            self._setweights()
         return self.module.forward(*args)
 
 
@@ -216,6 +257,32 @@ class RNNEncoder(nn.Module):
         if bs != self.bs:
             self.bs = bs
             self.reset()
+        raw_outputs, outputs, self.hidden = self.step(input, self.hidden)
+        return raw_outputs, outputs
+
+    def step(self, input, hidden):
+        """Runs the encoder over a chunk of input starting from the given hidden state.
+
+        Unlike forward, this does not read or modify the hidden state stored in the
+        module, so concurrent calls can share the module.
+
+        Parameters
+        ----------
+        input : Tensor
+            The token ids of the chunk, of shape (sl, batch).
+        hidden : list
+            The hidden state of each layer, as returned by zero_hidden or step.
+
+        Returns
+        -------
+        list of Tensor
+            The outputs of each layer before dropout.
+        list of Tensor
+            The outputs of each layer after dropout.
+        list
+            The detached hidden state of each layer at the end of the chunk.
+
+        """
         with set_grad_enabled(self.training):
             emb = self.encoder_with_dropout(
                 input, dropout=self.dropoute if self.training else 0
@@ -226,36 +293,38 @@ class RNNEncoder(nn.Module):
             for l, (rnn, drop) in enumerate(zip(self.rnns, self.dropouths)):
                 with warnings.catch_warnings():
                     warnings.simplefilter("ignore")
-                    raw_output, new_h = rnn(raw_output, self.hidden[l])
+                    raw_output, new_h = rnn(raw_output, hidden[l])
                 new_hidden.append(new_h)
                 raw_outputs.append(raw_output)
                 if l != self.n_layers - 1:
                     raw_output = drop(raw_output)
                 outputs.append(raw_output)
+        return raw_outputs, outputs, repackage_var(new_hidden)
 
-            self.hidden = repackage_var(new_hidden)
-        return raw_outputs, outputs
-
-    def one_hidden(self, l):
+    def one_hidden(self, l, bs=None):
         nh = (self.n_hid if l != self.n_layers - 1 else self.emb_sz) // self.ndir
+        bs = self.bs if bs is None else bs
+        weights = next(self.parameters()).data
         if IS_TORCH_04:
-            return Variable(self.weights.new(self.ndir, self.bs, nh).zero_())
+            return Variable(weights.new(self.ndir, bs, nh).zero_())
         else:
             return Variable(
-                self.weights.new(self.ndir, self.bs, nh).zero_(),
-                volatile=not self.training,
+                weights.new(self.ndir, bs, nh).zero_(), volatile=not self.training
             )
 
+    def zero_hidden(self, bs):
+        """Returns a new zero hidden state for a batch of the given size."""
+        if self.qrnn:
+            return [self.one_hidden(l, bs) for l in range(self.n_layers)]
+        return [
+            (self.one_hidden(l, bs), self.one_hidden(l, bs)) for l in range(self.n_layers)
+        ]
+
     def reset(self):
         if self.qrnn:
             [r.reset() for r in self.rnns]
         self.weights = next(self.parameters()).data
-        if self.qrnn:
-            self.hidden = [self.one_hidden(l) for l in range(self.n_layers)]
-        else:
-            self.hidden = [
-                (self.one_hidden(l), self.one_hidden(l)) for l in range(self.n_layers)
-            ]
+        self.hidden = self.zero_hidden(self.bs)
 
 
 class SequentialRNN(nn.Sequential):
@@ -264,6 +333,12 @@ class SequentialRNN(nn.Sequential):
             if hasattr(c, "reset"):
                 c.reset()
 
+    def forward(self, input, lengths=None):
+        if lengths is None:
+            return super().forward(input)
+        rnn_enc, classifier = self
+        return classifier(rnn_enc(input, lengths))
+
 
 class MultiBatchRNN(RNNEncoder):
     def __init__(self, bptt, max_seq, *args, **kwargs):
@@ -273,18 +348,50 @@ class MultiBatchRNN(RNNEncoder):
     def concat(self, arrs):
         return [torch.cat([l[si] for l in arrs]) for si in range(len(arrs[0]))]
 
-    def forward(self, input):
+    def padding_mask(self, lengths, first, sl):
+        """Marks the timesteps each sequence of a right-padded batch pools over.
+
+        A sequence of length n only keeps the bptt chunks that start after
+        n - max_seq, exactly as it would if it were run on its own.
+
+        Parameters
+        ----------
+        lengths : Tensor
+            The number of real tokens in each sequence.
+        first : int
+            The start of the first chunk kept for the batch.
+        sl : int
+            The padded length of the batch.
+
+        Returns
+        -------
+        Tensor
+            Nonzero for kept, real timesteps, of shape (sl - first, batch).
+
+        """
+        lengths = lengths.view(1, -1)
+        over = (lengths - self.max_seq).clamp(min=-1)
+        starts = (over + self.bptt) // self.bptt * self.bptt
+        steps = torch.arange(first, sl, device=lengths.device).view(-1, 1)
+        return (steps >= starts) & (steps < lengths)
+
+    def forward(self, input, lengths=None):
+        # The hidden state is created for each call and carried between the bptt
+        # chunks locally, so concurrent calls never share it.
         sl, bs = input.size()
-        for l in self.hidden:
-            for h in l:
-                h.data.zero_()
-        raw_outputs, outputs = [], []
+        hidden = self.zero_hidden(bs)
+        min_sl = sl if lengths is None else int(lengths.min())
+        raw_outputs, outputs, first = [], [], None
         for i in range(0, sl, self.bptt):
-            r, o = super().forward(input[i : min(i + self.bptt, sl)])
-            if i > (sl - self.max_seq):
+            r, o, hidden = self.step(input[i : min(i + self.bptt, sl)], hidden)
+            if i > (min_sl - self.max_seq):
+                first = i if first is None else first
                 raw_outputs.append(r)
                 outputs.append(o)
-        return self.concat(raw_outputs), self.concat(outputs)
+        if lengths is None:
+            return self.concat(raw_outputs), self.concat(outputs)
+        mask = self.padding_mask(lengths, first, sl)
+        return self.concat(raw_outputs), self.concat(outputs), mask
 
 
 def get_rnn_classifier(
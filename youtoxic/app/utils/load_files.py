@@ -1,7 +1,7 @@
 """Contains implementation of the functions used for loading the mappings and models.
 
 """
-import collections
+import os
 import pickle
 from pathlib import Path
 
@@ -9,51 +9,64 @@ import numpy as np
 
 import torch
 
+from youtoxic.app.utils.inference_rnn import freeze_for_inference, quantize_for_inference
 from youtoxic.app.utils.lm_rnn import get_rnn_classifier
+from youtoxic.app.utils.mapped_weights import load_mapped_model, save_mapped_weights
+from youtoxic.app.utils.vocabulary import load_vocabularies, save_vocabularies
 
 
-def load_mappings(mappings_filename):
-    """Loads the vocabulary mappings.
+def convert_mappings(mappings_filenames, filename):
+    """Converts the vocabulary mappings of several heads into one compact vocabularies file.
+
+    The file is only rewritten if it is missing a head or is older than any of the mappings.
 
     Parameters
     ----------
-    mappings_filename: str
-        The file containing the vocabulary mappings.
+    mappings_filenames: dict
+        Maps each head to the file containing its vocabulary mappings.
+    filename: str
+        The vocabularies file.
 
     Returns
     -------
-    defaultdict
-        The vocabulary mappings contained within the specified file.
+    str
+        The vocabularies file.
 
     """
-    itos = pickle.load(Path(mappings_filename).open("rb"))
-    stoi = collections.defaultdict(
-        lambda: 0, {str(v): int(k) for k, v in enumerate(itos)}
-    )
-    return stoi
-
-
-def load_model(vocab_size, classifier_filename):
-    """Loads a trained ULMFiT model.
+    if os.path.exists(filename):
+        heads = load_vocabularies(filename)
+        if all(
+            head in heads and is_fresh(filename, mappings_filename)
+            for head, mappings_filename in mappings_filenames.items()
+        ):
+            return filename
+    itos = {
+        head: pickle.load(Path(mappings_filename).open("rb"))
+        for head, mappings_filename in mappings_filenames.items()
+    }
+    save_atomically(filename, lambda tmp: save_vocabularies(itos, tmp))
+    return filename
+
+
+def build_model(vocab_size):
+    """Builds an untrained ULMFiT classifier with the architecture of the trained models.
 
     Parameters
     ----------
     vocab_size: int
         The number of unique vocabulary tokens.
-    classifier_filename: str
-        The file containing the trained classifier
 
     Returns
     -------
     SequentialRNN
-        The trained classifer model.
+        The classifier model.
 
     """
     bptt, em_sz, nh, nl = 70, 400, 1150, 3
     dps = np.array([0.4, 0.5, 0.05, 0.3, 0.4]) * 0.5
     vs = vocab_size
 
-    model = get_rnn_classifier(
+    return get_rnn_classifier(
         bptt,
         20 * bptt,
         2,
@@ -70,6 +83,94 @@ def load_model(vocab_size, classifier_filename):
         dropouth=dps[3],
     )
 
+
+def save_atomically(filename, save):
+    """Saves to a temporary file and renames it so that concurrent workers never read a partial file.
+
+    Parameters
+    ----------
+    filename: str
+        The file to save to.
+    save: callable
+        Takes the temporary filename and writes to it.
+
+    """
+    tmp = "{}.{}.tmp".format(filename, os.getpid())
+    try:
+        save(tmp)
+        os.replace(tmp, filename)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def is_fresh(filename, source_filename):
+    """Returns whether a file converted from a source file exists and is not older than it."""
+    if not os.path.exists(filename):
+        return False
+    if not os.path.exists(source_filename):
+        return True
+    return os.path.getmtime(filename) >= os.path.getmtime(source_filename)
+
+
+def mapped_weights_filename(classifier_filename):
+    """Returns the memory-mappable weights file next to the trained weights, for example 'toxicity_model.weights'."""
+    return str(Path(classifier_filename).with_suffix(".weights"))
+
+
+def convert_weights(vocab_size, classifier_filename):
+    """Converts trained weights into the memory-mappable format unless already converted.
+
+    Parameters
+    ----------
+    vocab_size: int
+        The number of unique vocabulary tokens.
+    classifier_filename: str
+        The file containing the trained classifier.
+
+    Returns
+    -------
+    str
+        The converted weights file, which is rewritten when the trained weights are newer.
+
+    """
+    filename = mapped_weights_filename(classifier_filename)
+    if not is_fresh(filename, classifier_filename):
+        model = load_model(vocab_size, classifier_filename, freeze=True)
+        save_atomically(filename, lambda tmp: save_mapped_weights(model, tmp))
+    return filename
+
+
+def load_model(vocab_size, classifier_filename, freeze=True, quantize=False, mmap=False):
+    """Loads a trained ULMFiT model.
+
+    Parameters
+    ----------
+    vocab_size: int
+        The number of unique vocabulary tokens.
+    classifier_filename: str
+        The file containing the trained classifier
+    freeze: bool
+        Whether to convert the model into a minimal eval-only module.
+    quantize: bool
+        Whether to also convert its LSTM and linear layers to dynamic int8. Implies freeze.
+    mmap: bool
+        Whether to memory-map the weights of the frozen model from the converted
+        weights file, which is created on first use. Ignored if not frozen. Only
+        the embeddings stay mapped if quantized.
+
+    Returns
+    -------
+    SequentialRNN or FrozenRNNClassifier
+        The trained classifer model.
+
+    """
+    if mmap and (freeze or quantize):
+        model = load_mapped_model(convert_weights(vocab_size, classifier_filename))
+        return quantize_for_inference(model, inplace=True) if quantize else model
+
+    model = build_model(vocab_size)
+
     sd = torch.load(classifier_filename, map_location=lambda storage, loc: storage)
     names = set(model.state_dict().keys())
     for n in list(sd.keys()):
@@ -81,4 +182,8 @@ def load_model(vocab_size, classifier_filename):
 
     model.reset()
     model.eval()
+    if quantize:
+        return quantize_for_inference(freeze_for_inference(model), inplace=True)
+    if freeze:
+        return freeze_for_inference(model)
     return model
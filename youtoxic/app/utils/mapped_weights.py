@@ -0,0 +1,177 @@
+"""Contains implementation of a flat array format that is memory-mapped at load time.
+
+The file starts with an 8 byte magic string and the little-endian uint64 length of
+a JSON header. The header holds the name, dtype, shape and offset of every array
+along with any metadata, such as the bptt and max_seq of a classifier. Each array
+starts on a 4096 byte boundary, so the mapped arrays are page-aligned views into
+the file. Processes that map the same file share one physical copy of the arrays
+through the page cache.
+
+"""
+import json
+import struct
+import warnings
+
+import numpy as np
+
+import torch
+import torch.nn as nn
+
+from youtoxic.app.utils.inference_rnn import FrozenRNNClassifier
+
+
+MAGIC = b"YTXWGT01"
+ALIGNMENT = 4096
+
+
+def align(offset):
+    """Rounds an offset up to the next multiple of ALIGNMENT."""
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def save_mapped_arrays(arrays, filename, **meta):
+    """Writes arrays in the memory-mappable format.
+
+    Parameters
+    ----------
+    arrays : list of tuple
+        The name and ndarray of each array.
+    filename : str
+        The file to write.
+    meta
+        JSON serializable metadata stored in the header.
+
+    """
+    entries, offset = list(), 0
+    for name, array in arrays:
+        entries.append(
+            dict(name=name, dtype=array.dtype.str, shape=list(array.shape), offset=offset)
+        )
+        offset = align(offset + array.nbytes)
+    header = dict(meta, arrays=entries)
+    header_bytes = json.dumps(header).encode("utf-8")
+    data_start = align(len(MAGIC) + 8 + len(header_bytes))
+
+    with open(filename, "wb") as f:
+        f.write(MAGIC + struct.pack("<Q", len(header_bytes)) + header_bytes)
+        for entry, (_, array) in zip(entries, arrays):
+            f.seek(data_start + entry["offset"])
+            f.write(np.ascontiguousarray(array).tobytes())
+        f.truncate(data_start + offset)
+
+
+def read_mapped_arrays(filename):
+    """Maps a file read-only and returns its arrays as views into the mapping.
+
+    Parameters
+    ----------
+    filename : str
+        A file written by save_mapped_arrays.
+
+    Returns
+    -------
+    dict
+        The header of the file.
+    dict
+        Maps each array name to a read-only ndarray backed by the file.
+
+    """
+    with open(filename, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError("Not a mapped arrays file: {}".format(filename))
+        (length,) = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(length).decode("utf-8"))
+    data_start = align(len(MAGIC) + 8 + length)
+    mapping = np.memmap(filename, dtype=np.uint8, mode="r")
+
+    arrays = dict()
+    for entry in header["arrays"]:
+        dtype = np.dtype(entry["dtype"])
+        count = int(np.prod(entry["shape"]))
+        start = data_start + entry["offset"]
+        array = mapping[start:start + count * dtype.itemsize].view(dtype)
+        arrays[entry["name"]] = array.reshape(entry["shape"])
+    return header, arrays
+
+
+def save_mapped_weights(model, filename):
+    """Writes the weights of a frozen classifier in the memory-mappable format.
+
+    Parameters
+    ----------
+    model : FrozenRNNClassifier
+        The frozen float classifier.
+    filename : str
+        The file to write.
+
+    """
+    arrays = [(name, t.detach().cpu().numpy()) for name, t in model.state_dict().items()]
+    save_mapped_arrays(arrays, filename, bptt=model.bptt, max_seq=model.max_seq)
+
+
+def read_mapped_weights(filename):
+    """Maps a weights file read-only and returns its tensors as views into the mapping.
+
+    Parameters
+    ----------
+    filename : str
+        A file written by save_mapped_weights.
+
+    Returns
+    -------
+    dict
+        The header of the file.
+    dict
+        Maps each tensor name to a read-only tensor backed by the file.
+
+    """
+    header, arrays = read_mapped_arrays(filename)
+    with warnings.catch_warnings():
+        # The arrays are read-only. Writing to the tensors would fail, which is intended.
+        warnings.simplefilter("ignore")
+        tensors = {name: torch.from_numpy(array) for name, array in arrays.items()}
+    return header, tensors
+
+
+def mapped_parameter(tensor):
+    return nn.Parameter(tensor, requires_grad=False)
+
+
+def load_mapped_model(filename):
+    """Builds a frozen classifier whose weights are views into a memory-mapped file.
+
+    Parameters
+    ----------
+    filename : str
+        A file written by save_mapped_weights.
+
+    Returns
+    -------
+    FrozenRNNClassifier
+        The frozen classifier in eval mode.
+
+    """
+    header, tensors = read_mapped_weights(filename)
+    encoder = nn.Embedding.from_pretrained(tensors["encoder.weight"], freeze=True)
+
+    rnns, i = list(), 0
+    while "rnns.{}.weight_ih_l0".format(i) in tensors:
+        prefix = "rnns.{}.".format(i)
+        weight_hh = tensors[prefix + "weight_hh_l0"]
+        lstm = nn.LSTM(tensors[prefix + "weight_ih_l0"].size(1), weight_hh.size(1))
+        for name, _ in list(lstm.named_parameters()):
+            setattr(lstm, name, mapped_parameter(tensors[prefix + name]))
+        rnns.append(lstm)
+        i += 1
+
+    layers, i = list(), 0
+    while "layers.{}.weight".format(i) in tensors:
+        weight = tensors["layers.{}.weight".format(i)]
+        layer = nn.Linear(weight.size(1), weight.size(0))
+        layer.weight = mapped_parameter(weight)
+        layer.bias = mapped_parameter(tensors["layers.{}.bias".format(i)])
+        layers.append(layer)
+        i += 1
+
+    model = FrozenRNNClassifier(encoder, rnns, layers, header["bptt"], header["max_seq"])
+    return model.eval()
@@ -0,0 +1,25 @@
+"""Contains implementation of functions used to measure the memory of the process.
+
+"""
+import resource
+
+
+def rss_mb():
+    """Returns the current resident set size of this process in MB.
+
+    Falls back to the peak resident set size where /proc is not available.
+
+    Returns
+    -------
+    float
+        The resident set size in MB.
+
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
@@ -1,6 +1,121 @@
 """Defines functions used to make predictions of different types of toxicity.
 
 """
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+
+from youtoxic.app.config import Config
+
+
+# Each row holds a type of toxicity as selected in the UI, the key of its results
+# and the Pipeline head that predicts it.
+SINGLE_TYPES = (
+    ("toxic", "Toxicity", "toxicity"),
+    ("insult", "Insult", "insult"),
+    ("obscene", "Obscenity", "obscenity"),
+    ("prejudice", "Prejudice", "identity"),
+)
+MULTIPLE_TYPES = (
+    ("Toxicity", "toxic", "toxicity"),
+    ("Insult", "insult", "insult"),
+    ("Obscenity", "obscene", "obscenity"),
+    ("Prejudice", "prejudice", "identity"),
+)
+
+# The number of texts of a background analysis predicted between its partial results.
+JOB_BATCH_SIZE = 256
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class HeadExecutor:
+    """Runs the heads selected for a request concurrently on a pool of threads.
+
+    The texts are tokenized and looked up once, then each head encodes them and
+    runs its model on its own thread. PyTorch releases the GIL while it computes,
+    so the heads overlap. The intra-op thread budget of PyTorch is shared by the
+    whole process, so it is split once between the workers to avoid
+    oversubscribing the cores.
+
+    Attributes
+    ----------
+    workers : int
+        The number of heads run at once.
+
+    """
+
+    def __init__(self, workers, intra_op_threads):
+        """Starts the thread pool and splits the intra-op threads between its workers.
+
+        Parameters
+        ----------
+        workers : int
+            The number of heads run at once. Heads run one after another if 1.
+        intra_op_threads : int
+            The total number of threads PyTorch may use for the operators of all heads.
+
+        """
+        self.workers = max(1, workers)
+        self.pool = None
+        if self.workers > 1:
+            torch.set_num_threads(max(1, intra_op_threads // self.workers))
+            self.pool = ThreadPoolExecutor(self.workers, thread_name_prefix="head")
+
+    def predict(self, pipeline, texts, heads):
+        """Predicts several types of toxicity for texts, running the heads concurrently.
+
+        Parameters
+        ----------
+        pipeline : Pipeline or ModelWorkerPool
+            The pipeline object to use to make predictions. The heads of a
+            ModelWorkerPool run on its worker processes.
+        texts : list of str
+            The texts to predict.
+        heads : list of str
+            The heads to run.
+
+        Returns
+        -------
+        dict
+            Maps each head to a list of numeric predictions and a list of judgements.
+
+        """
+        predict = getattr(pipeline, "predict_looked_up_ulm", None)
+        if self.pool is None or len(heads) < 2 or predict is None:
+            return pipeline.predict_heads_ulm(texts, heads)
+        return predict(len(texts), pipeline.lookup(texts), heads, self.pool.map)
+
+    def close(self):
+        """Shuts down the thread pool."""
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+
+def get_executor(config=None):
+    """Returns the HeadExecutor shared by the app, creating it on first use.
+
+    Parameters
+    ----------
+    config : Config
+        The application configuration the executor is created from on first use.
+        Read from the environment if None.
+
+    Returns
+    -------
+    HeadExecutor
+        The executor of the app.
+
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            config = config or Config()
+            _executor = HeadExecutor(config.head_workers, config.intra_op_threads)
+        return _executor
 
 
 def make_predictions(text, types, pipeline):
@@ -12,7 +127,7 @@ def make_predictions(text, types, pipeline):
         Predictions will be made for this text.
     types : list of str
         Predictions will be made for these types of toxicity.
-    pipeline : Pipeline
+    pipeline : Pipeline or ModelWorkerPool
         The pipeline object to use to make predicitons.
 
     Returns
@@ -27,18 +142,12 @@ def make_predictions(text, types, pipeline):
     """
     types_order, preds, judgements = list(), dict(), dict()
 
-    if "toxic" in types:
-        preds["Toxicity"], judgements["Toxicity"] = pipeline.predict_toxicity_ulm(text)
-        types_order.append("Toxicity")
-    if "insult" in types:
-        preds["Insult"], judgements["Insult"] = pipeline.predict_insult_ulm(text)
-        types_order.append("Insult")
-    if "obscene" in types:
-        preds["Obscenity"], judgements["Obscenity"] = pipeline.predict_obscenity_ulm(text)
-        types_order.append("Obscenity")
-    if "prejudice" in types:
-        preds["Prejudice"], judgements["Prejudice"] = pipeline.predict_identity_ulm(text)
-        types_order.append("Prejudice")
+    selected = [row for row in SINGLE_TYPES if row[0] in types]
+    heads = [head for _, _, head in selected]
+    results = get_executor().predict(pipeline, [text], heads)
+    for _, key, head in selected:
+        (preds[key],), (judgements[key],) = results[head]
+        types_order.append(key)
 
     return types_order, preds, judgements
 
@@ -52,7 +161,7 @@ def make_predictions_multiple(texts, types, pipeline):
         Predictions will be made for these texts.
     types : list of str
         Predictions will be made for these types of toxicity.
-    pipeline : Pipeline
+    pipeline : Pipeline or ModelWorkerPool
         The pipeline object to use to make predictions.
 
     Returns
@@ -65,19 +174,86 @@ def make_predictions_multiple(texts, types, pipeline):
     """
     preds, judgements = dict(), dict()
 
-    if "Toxicity" in types:
-        preds["toxic"], judgements["toxic"] = pipeline.predict_toxicity_ulm_multiple(
-            texts
-        )
-    if "Insult" in types:
-        preds["insult"], judgements["insult"] = pipeline.predict_insult_ulm_multiple(texts)
-    if "Obscenity" in types:
-        preds["obscene"], judgements["obscene"] = pipeline.predict_obscenity_ulm_multiple(
-            texts
-        )
-    if "Prejudice" in types:
-        preds["prejudice"], judgements[
-            "prejudice"
-        ] = pipeline.predict_identity_ulm_multiple(texts)
+    selected = [row for row in MULTIPLE_TYPES if row[0] in types]
+    heads = [head for _, _, head in selected]
+    results = get_executor().predict(pipeline, texts, heads)
+    for _, key, head in selected:
+        preds[key], judgements[key] = results[head]
 
     return preds, judgements
+
+
+def make_predictions_in_batches(texts, types, pipeline, batch_size=None):
+    """Makes the predictions of make_predictions_multiple a batch of texts at a time.
+
+    Parameters
+    ----------
+    texts : list of str
+        Predictions will be made for these texts.
+    types : list of str
+        Predictions will be made for these types of toxicity.
+    pipeline : Pipeline or ModelWorkerPool
+        The pipeline object to use to make predictions.
+    batch_size : int
+        The number of texts predicted at a time. JOB_BATCH_SIZE if None.
+
+    Yields
+    ------
+    done : int
+        The number of texts predicted so far.
+    preds : dict
+        The predictions of those texts, as returned by make_predictions_multiple.
+    judgements : dict
+        The judgements of those texts, as returned by make_predictions_multiple.
+
+    """
+    batch_size = batch_size or JOB_BATCH_SIZE
+    preds, judgements = dict(), dict()
+    for start in range(0, len(texts), batch_size):
+        batch_preds, batch_judgements = make_predictions_multiple(
+            texts[start : start + batch_size], types, pipeline
+        )
+        for key in batch_preds:
+            preds.setdefault(key, list()).extend(batch_preds[key])
+            judgements.setdefault(key, list()).extend(batch_judgements[key])
+        yield min(start + batch_size, len(texts)), preds, judgements
+
+
+def render_predictions(texts, types, pipeline, render, report=None):
+    """Makes the predictions for texts and renders them, with partial results if reported.
+
+    Parameters
+    ----------
+    texts : list of str
+        Predictions will be made for these texts.
+    types : list of str
+        Predictions will be made for these types of toxicity.
+    pipeline : Pipeline or ModelWorkerPool
+        The pipeline object to use to make predictions.
+    render : callable
+        Takes the number of texts predicted so far with their predictions and
+        judgements, and returns the layout of their results.
+    report : callable
+        The report function of a background job, see JobQueue. It is given the
+        progress after each batch of texts, and the layout of the results so
+        far once the number of texts predicted has doubled since the last
+        layout, so that rendering and storing the partial results takes time
+        linear in the number of texts. All the texts are predicted at once if
+        None.
+
+    Returns
+    -------
+    html.Div
+        The layout of the results of all the texts.
+
+    """
+    if report is None or not len(texts):
+        return render(len(texts), *make_predictions_multiple(texts, types, pipeline))
+    rendered = 0
+    for done, preds, judgements in make_predictions_in_batches(texts, types, pipeline):
+        if done == len(texts) or done >= 2 * rendered:
+            layout, rendered = render(done, preds, judgements), done
+            report(done, len(texts), layout)
+        else:
+            report(done, len(texts))
+    return layout
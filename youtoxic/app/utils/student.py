@@ -0,0 +1,247 @@
+"""Contains implementation of the student models distilled from the ULMFiT heads.
+
+A student is a logistic regression over hashed unigrams and bigrams of the
+positions of the tokens in the StringTable shared by the vocabularies. It is
+trained on the predictions of a head, its teacher, and answers the texts it is
+confident about. The texts in its uncertain band are escalated to the teacher.
+Students are saved in the memory-mappable format of mapped_weights.
+
+"""
+import hashlib
+import logging
+
+import numpy as np
+
+from youtoxic.app.utils.mapped_weights import read_mapped_arrays, save_mapped_arrays
+
+
+logger = logging.getLogger(__name__)
+
+# Multipliers of the feature hashes, both odd so they are invertible modulo 2 ** 64.
+UNIGRAM_HASH = np.uint64(0x9E3779B97F4A7C15)
+BIGRAM_HASH = np.uint64(0xC2B2AE3D27D4EB4F)
+
+
+def table_fingerprint(table):
+    """Returns a digest of the tokens of a StringTable, which the features depend on."""
+    digest = hashlib.blake2b(digest_size=8)
+    digest.update(np.ascontiguousarray(table.offsets).tobytes())
+    digest.update(np.ascontiguousarray(table.blob).tobytes())
+    return digest.hexdigest()
+
+
+def hashed_features(positions, lengths, n_features):
+    """Returns the hashed unigram and bigram features of texts.
+
+    Parameters
+    ----------
+    positions : ndarray
+        The int64 position of every token in the shared table, -1 if unknown.
+    lengths : ndarray
+        The number of tokens of each text.
+    n_features : int
+        The number of hashed features, a power of two.
+
+    Returns
+    -------
+    ndarray
+        The index of the text of each feature.
+    ndarray
+        The hashed index of each feature.
+
+    """
+    ids = (positions + 1).astype(np.uint64)
+    rows = np.repeat(np.arange(len(lengths)), lengths)
+    same_text = rows[1:] == rows[:-1]
+    bigrams = (ids[:-1] * BIGRAM_HASH + ids[1:])[same_text]
+    features = np.concatenate([ids * UNIGRAM_HASH, bigrams * UNIGRAM_HASH])
+    # The high bits of a multiplicative hash are the best mixed.
+    shift = np.uint64(64 - int(n_features).bit_length() + 1)
+    return (
+        np.concatenate([rows, rows[1:][same_text]]),
+        (features >> shift).astype(np.int64),
+    )
+
+
+def feature_scale(rows, n_texts):
+    """Returns one over the number of features of each text."""
+    return 1 / np.maximum(np.bincount(rows, minlength=n_texts), 1)
+
+
+def sigmoid(x):
+    return 1 / (1 + np.exp(-x))
+
+
+class StudentModel:
+    """A hashed n-gram logistic regression that answers the texts it is confident about.
+
+    Attributes
+    ----------
+    weights : ndarray
+        The float32 weight of each hashed feature.
+    bias : float
+        The bias of the regression.
+    low : float
+        Predictions at or below this are confidently not toxic.
+    high : float
+        Predictions at or above this are confidently toxic.
+    fingerprint : str
+        The table_fingerprint of the table the student was trained with.
+
+    """
+
+    def __init__(self, weights, bias, low, high, fingerprint):
+        self.weights = weights
+        self.bias = bias
+        self.low = low
+        self.high = high
+        self.fingerprint = fingerprint
+
+    def logits(self, rows, features, scale):
+        """Returns the logits of texts from their hashed features, averaged per text."""
+        sums = np.bincount(rows, self.weights[features], minlength=len(scale))
+        return self.bias + sums * scale
+
+    def predict(self, positions, lengths):
+        """Predicts texts from the positions of their tokens in the shared table.
+
+        Parameters
+        ----------
+        positions : ndarray
+            The int64 position of every token, or -1 for unknown tokens.
+        lengths : ndarray
+            The number of tokens of each text.
+
+        Returns
+        -------
+        ndarray
+            The prediction for each text.
+
+        """
+        rows, features = hashed_features(positions, lengths, len(self.weights))
+        return sigmoid(self.logits(rows, features, feature_scale(rows, len(lengths))))
+
+    def confident(self, preds):
+        """Returns a mask of the predictions outside the uncertain band."""
+        return (preds <= self.low) | (preds >= self.high)
+
+    def save(self, filename):
+        save_mapped_arrays(
+            [("weights", self.weights)],
+            filename,
+            bias=float(self.bias),
+            low=float(self.low),
+            high=float(self.high),
+            fingerprint=self.fingerprint,
+        )
+
+
+def load_student(filename):
+    """Maps a student saved by StudentModel.save.
+
+    Parameters
+    ----------
+    filename : str
+        The student file.
+
+    Returns
+    -------
+    StudentModel
+        The student, whose weights are a read-only view into the file.
+
+    """
+    header, arrays = read_mapped_arrays(filename)
+    return StudentModel(
+        arrays["weights"],
+        header["bias"],
+        header["low"],
+        header["high"],
+        header["fingerprint"],
+    )
+
+
+def train_student(
+    positions, lengths, targets, fingerprint, n_features=2 ** 20, epochs=100, lr=10.0
+):
+    """Trains a student on the predictions of its teacher.
+
+    The student minimizes the cross entropy with the teacher's predictions, so it
+    learns how confident the teacher is and not only its judgements.
+
+    Parameters
+    ----------
+    positions : ndarray
+        The int64 position of every token of the training texts.
+    lengths : ndarray
+        The number of tokens of each training text.
+    targets : ndarray
+        The teacher's prediction for each training text.
+    fingerprint : str
+        The table_fingerprint of the shared table.
+    n_features : int
+        The number of hashed features, a power of two.
+    epochs : int
+        The number of full passes of Adagrad.
+    lr : float
+        The learning rate of Adagrad.
+
+    Returns
+    -------
+    StudentModel
+        The student, without an uncertain band. See calibrate_band.
+
+    """
+    rows, features = hashed_features(positions, lengths, n_features)
+    scale = feature_scale(rows, len(lengths))
+    weights = np.zeros(n_features, dtype=np.float32)
+    student = StudentModel(weights, 0.0, -1.0, 2.0, fingerprint)
+    accumulated, accumulated_bias = np.full(n_features, 1e-8), 1e-8
+    for _ in range(epochs):
+        errors = sigmoid(student.logits(rows, features, scale)) - targets
+        grad = np.bincount(features, (errors * scale)[rows], minlength=n_features)
+        grad /= len(lengths)
+        grad_bias = errors.mean()
+        accumulated += grad ** 2
+        accumulated_bias += grad_bias ** 2
+        student.weights -= (lr * grad / np.sqrt(accumulated)).astype(np.float32)
+        student.bias -= lr * grad_bias / np.sqrt(accumulated_bias)
+    logger.info(
+        "Trained student in %d epochs, mean error %.4f", epochs, np.abs(errors).mean()
+    )
+    return student
+
+
+def calibrate_band(student, preds, teacher_preds, threshold=0.5, agreement=0.99):
+    """Sets the widest uncertain band outside which the student agrees with its teacher.
+
+    Parameters
+    ----------
+    student : StudentModel
+        The student to calibrate.
+    preds : ndarray
+        The student's prediction for each calibration text.
+    teacher_preds : ndarray
+        The teacher's prediction for each calibration text.
+    threshold : float
+        The threshold of the judgements.
+    agreement : float
+        The minimum fraction of the judgements of the confident texts on each side
+        of the band that must agree with the teacher.
+
+    """
+    toxic = teacher_preds > threshold
+    order = np.argsort(preds, kind="stable")
+    below = np.arange(1, len(order) + 1)
+    # The texts up to each rank in increasing order are judged not toxic.
+    clean_ok = np.cumsum(~toxic[order]) >= agreement * below
+    clean_ok &= preds[order] <= threshold
+    student.low = -1.0
+    if clean_ok.any():
+        student.low = float(preds[order][np.flatnonzero(clean_ok).max()])
+    # The texts from each rank in decreasing order are judged toxic.
+    reverse = order[::-1]
+    toxic_ok = np.cumsum(toxic[reverse]) >= agreement * below
+    toxic_ok &= preds[reverse] > threshold
+    student.high = 2.0
+    if toxic_ok.any():
+        student.high = float(preds[reverse][np.flatnonzero(toxic_ok).max()])
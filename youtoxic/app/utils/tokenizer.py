@@ -0,0 +1,439 @@
+"""Contains a lightweight re-implementation of the fastai tokenizer the models were trained with.
+
+The fastai rules (html fixes, xxrep/xxwrep, xxup/xxmaj and the spacing around special
+characters) are copied from fastai.text.transform. Words are split like spaCy's English
+tokenizer, with its prefix, suffix and infix patterns and its special cases, so that
+neither fastai nor spaCy has to be imported to make predictions.
+
+"""
+import html
+import json
+import re
+import unicodedata
+from pathlib import Path
+
+
+UNK, PAD, BOS, EOS, FLD = "xxunk", "xxpad", "xxbos", "xxeos", "xxfld"
+TK_MAJ, TK_UP, TK_REP, TK_WREP = "xxmaj", "xxup", "xxrep", "xxwrep"
+
+SPECIAL_CASES_FILENAME = Path(__file__).with_name("tokenizer_exceptions.json")
+
+
+def spec_add_spaces(t):
+    """Adds spaces around / and # in t."""
+    return re.sub(r"([/#\n])", r" \1 ", t)
+
+
+def rm_useless_spaces(t):
+    """Removes multiple spaces in t."""
+    return re.sub(" {2,}", " ", t)
+
+
+def replace_rep(t):
+    """Replaces repetitions at the character level in t."""
+
+    def _replace_rep(m):
+        c, cc = m.groups()
+        return " {} {} {} ".format(TK_REP, len(cc) + 1, c)
+
+    re_rep = re.compile(r"(\S)(\1{3,})")
+    return re_rep.sub(_replace_rep, t)
+
+
+def replace_wrep(t):
+    """Replaces word repetitions in t."""
+
+    def _replace_wrep(m):
+        c, cc = m.groups()
+        return " {} {} {} ".format(TK_WREP, len(cc.split()) + 1, c)
+
+    re_wrep = re.compile(r"(\b\w+\W+)(\1{3,})")
+    return re_wrep.sub(_replace_wrep, t)
+
+
+def fix_html(x):
+    """Replaces html strings in x."""
+    re1 = re.compile(r"  +")
+    x = (
+        x.replace("#39;", "'")
+        .replace("amp;", "&")
+        .replace("#146;", "'")
+        .replace("nbsp;", " ")
+        .replace("#36;", "$")
+        .replace("\\n", "\n")
+        .replace("quot;", "'")
+        .replace("<br />", "\n")
+        .replace('\\"', '"')
+        .replace("<unk>", UNK)
+        .replace(" @.@ ", ".")
+        .replace(" @-@ ", "-")
+        .replace(" @,@ ", ",")
+        .replace("\\", " \\ ")
+    )
+    return re1.sub(" ", html.unescape(x))
+
+
+def replace_all_caps(x):
+    """Replaces tokens in ALL CAPS in x by their lower version and adds TK_UP before."""
+    res = []
+    for t in x:
+        if t.isupper() and len(t) > 1:
+            res.append(TK_UP)
+            res.append(t.lower())
+        else:
+            res.append(t)
+    return res
+
+
+def deal_caps(x):
+    """Replaces all Capitalized tokens in x by their lower version and adds TK_MAJ before."""
+    res = []
+    for t in x:
+        if t == "":
+            continue
+        if t[0].isupper() and len(t) > 1 and t[1:].islower():
+            res.append(TK_MAJ)
+        res.append(t.lower())
+    return res
+
+
+PRE_RULES = [fix_html, replace_rep, replace_wrep, spec_add_spaces, rm_useless_spaces]
+POST_RULES = [replace_all_caps, deal_caps]
+
+
+def _char_classes(stop=0x30000):
+    """Builds the bodies of the regex character classes used by spaCy's patterns.
+
+    Returns
+    -------
+    dict
+        Maps 'alpha', 'lower', 'upper' and 'icons' to a character class body.
+        Letters without case count as both lower and upper, as they do in spaCy.
+
+    """
+    tests = {
+        "alpha": str.isalpha,
+        "lower": lambda c: c.isalpha() and not c.isupper(),
+        "upper": lambda c: c.isalpha() and not c.islower(),
+        "icons": lambda c: unicodedata.category(c) == "So",
+    }
+    classes = dict()
+    for name, test in tests.items():
+        ranges, start = list(), None
+        for code in range(stop + 1):
+            if code < stop and test(chr(code)):
+                start = code if start is None else start
+            elif start is not None:
+                ranges.append((start, code - 1))
+                start = None
+        classes[name] = "".join(
+            re.escape(chr(a)) if a == b else "{}-{}".format(re.escape(chr(a)), re.escape(chr(b)))
+            for a, b in ranges
+        )
+    return classes
+
+
+_CLASSES = _char_classes()
+_ALPHA, _LOWER, _UPPER = _CLASSES["alpha"], _CLASSES["lower"], _CLASSES["upper"]
+_ICONS = "[{}]".format(_CLASSES["icons"])
+
+_PUNCT = r"… …… , : ; \! \? ¿ ؟ ¡ \( \) \[ \] \{ \} < > _ # \* & 。 ？ ！ ， 、 ； ： ～ · । ، ۔ ؛ ٪"
+_QUOTES = r"' \" ” “ ` ‘ ´ ’ ‚ , „ » « 「 」 『 』 （ ） 〔 〕 【 】 《 》 〈 〉 ⟦ ⟧"
+_HYPHENS = "- – — -- --- —— ~"
+_CURRENCY = r"\$ £ € ¥ ฿ US\$ C\$ A\$ ₽ ﷼ ₴ ₠ ₡ ₢ ₣ ₤ ₥ ₦ ₧ ₨ ₩ ₪ ₫ ₭ ₮ ₯ ₰ ₱ ₲ ₳ ₵ ₶ ₷ ₸ ₹ ₺ ₻ ₼ ₾ ₿"
+_UNITS = (
+    "km km² km³ m m² m³ dm dm² dm³ cm cm² cm³ mm mm² mm³ ha µm nm yd in ft "
+    "kg g mg µg t lb oz m/s km/h kmh mph hPa Pa mbar mb MB kb KB gb GB tb TB T G M K %"
+)
+_ELLIPSES = [r"\.\.+", "…"]
+
+_PREFIXES = (
+    ["§", "%", "=", "—", "–", r"\+(?![0-9])"]
+    + _PUNCT.split()
+    + _ELLIPSES
+    + _QUOTES.split()
+    + _CURRENCY.split()
+    + [_ICONS]
+)
+_SUFFIXES = (
+    _PUNCT.split()
+    + _ELLIPSES
+    + _QUOTES.split()
+    + [_ICONS]
+    + ["'s", "'S", "’s", "’S", "—", "–"]
+    + [
+        r"(?<=[0-9])\+",
+        r"(?<=°[FfCcKk])\.",
+        r"(?<=[0-9])(?:{})".format("|".join(_CURRENCY.split())),
+        r"(?<=[0-9])(?:{})".format("|".join(_UNITS.split())),
+        r"(?<=[0-9{}%²\-\+{}(?:{})])\.".format(
+            _LOWER, "".join(_QUOTES.split()), "|".join(_PUNCT.split())
+        ),
+        r"(?<=[{u}][{u}])\.".format(u=_UPPER),
+    ]
+)
+_INFIXES = _ELLIPSES + [
+    _ICONS,
+    r"(?<=[0-9])[+\-\*^](?=[0-9-])",
+    r"(?<=[{l}{q}])\.(?=[{u}{q}])".format(l=_LOWER, u=_UPPER, q="".join(_QUOTES.split())),
+    r"(?<=[{a}]),(?=[{a}])".format(a=_ALPHA),
+    r"(?<=[{a}0-9])(?:{h})(?=[{a}])".format(a=_ALPHA, h="|".join(_HYPHENS.split())),
+    r"(?<=[{a}0-9])[:<>=/](?=[{a}])".format(a=_ALPHA),
+]
+
+_PREFIX_RE = re.compile("|".join("^" + piece for piece in _PREFIXES))
+_SUFFIX_RE = re.compile("|".join(piece + "$" for piece in _SUFFIXES))
+_INFIX_RE = re.compile("|".join(_INFIXES))
+_URL_RE = re.compile(
+    r"^(?:(?:[\w\+\-\.]{2,})://)?(?:\S+(?::\S*)?@)?"
+    r"(?:(?!(?:10|127)(?:\.\d{1,3}){3})(?!(?:169\.254|192\.168)(?:\.\d{1,3}){2})"
+    r"(?!172\.(?:1[6-9]|2\d|3[0-1])(?:\.\d{1,3}){2})"
+    r"(?:[1-9]\d?|1\d\d|2[01]\d|22[0-3])(?:\.(?:1?\d{1,2}|2[0-4]\d|25[0-5])){2}"
+    r"(?:\.(?:[1-9]\d?|1\d\d|2[0-4]\d|25[0-4]))"
+    r"|(?:(?:[A-Za-z0-9¡-￿][A-Za-z0-9¡-￿_-]{0,62})?[A-Za-z0-9¡-￿]\.)+"
+    r"(?:[" + _LOWER + r"]{2,63}))(?::\d{2,5})?(?:[/?#]\S*)?$"
+)
+
+
+def load_special_cases(filename=SPECIAL_CASES_FILENAME):
+    """Loads the special cases of spaCy's English tokenizer.
+
+    Parameters
+    ----------
+    filename : str
+        The json file mapping each special case to the tokens it is split into.
+
+    Returns
+    -------
+    dict
+        The special cases.
+
+    """
+    with open(str(filename), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def dump_special_cases(filename=SPECIAL_CASES_FILENAME):
+    """Writes the special cases of the installed spaCy's English tokenizer to a json file.
+
+    This is only needed to refresh the file shipped with the package and is the
+    only place spaCy is imported.
+
+    Parameters
+    ----------
+    filename : str
+        The json file to write.
+
+    """
+    import spacy
+    from spacy.symbols import ORTH
+
+    rules = spacy.blank("en").tokenizer.rules
+    special_cases = {
+        orth: [token[ORTH] for token in tokens]
+        for orth, tokens in rules.items()
+    }
+    lines = [
+        "{}: {}".format(json.dumps(orth, ensure_ascii=False), json.dumps(tokens, ensure_ascii=False))
+        for orth, tokens in sorted(special_cases.items())
+    ]
+    with open(str(filename), "w", encoding="utf-8") as f:
+        f.write("{\n" + ",\n".join(lines) + "\n}\n")
+
+
+class WordTokenizer:
+    """Splits text into words like spaCy's English tokenizer.
+
+    Attributes
+    ----------
+    special_cases : dict
+        Maps strings that are split in a fixed way to their tokens.
+    cache : dict
+        Maps whitespace-delimited strings that were already split to their tokens.
+    max_cache_size : int
+        The cache is cleared once it holds this many strings.
+
+    """
+
+    def __init__(self, special_cases=None, max_cache_size=100000):
+        self.special_cases = load_special_cases() if special_cases is None else special_cases
+        self.cache = dict()
+        self.max_cache_size = max_cache_size
+
+    def add_special_cases(self, toks):
+        """Keeps each of toks as a single token."""
+        for t in toks:
+            self.special_cases[t] = [t]
+
+    def tokenizer(self, t):
+        """Splits t into tokens."""
+        toks = list()
+        if not t:
+            return toks
+        in_ws, start = t[0].isspace(), 0
+        for i, c in enumerate(t):
+            if c.isspace() != in_ws:
+                if start < i:
+                    toks.extend(self.split(t[start:i]))
+                start = i + 1 if c == " " else i
+                in_ws = not in_ws
+        if start < len(t):
+            toks.extend(self.split(t[start:]))
+        return toks
+
+    def split(self, span):
+        """Splits a string containing no single spaces into tokens."""
+        toks = self.cache.get(span)
+        if toks is None:
+            toks = self.special_cases.get(span)
+            if toks is None:
+                toks = self._merge_special_cases(self._split_affixes(span))
+            if len(self.cache) >= self.max_cache_size:
+                self.cache.clear()
+            self.cache[span] = toks
+        return toks
+
+    def _split_affixes(self, string):
+        prefixes, suffixes, last_size = list(), list(), 0
+        specials = self.special_cases
+        while string and len(string) != last_size:
+            if string in specials:
+                break
+            last_size = len(string)
+            match = _PREFIX_RE.search(string)
+            pre_len = match.end() - match.start() if match else 0
+            if pre_len:
+                prefix, minus_pre = string[:pre_len], string[pre_len:]
+                if minus_pre in specials:
+                    string = minus_pre
+                    prefixes.append(prefix)
+                    break
+            match = _SUFFIX_RE.search(string[pre_len:])
+            suf_len = match.end() - match.start() if match else 0
+            if suf_len:
+                suffix, minus_suf = string[-suf_len:], string[:-suf_len]
+                if minus_suf in specials:
+                    string = minus_suf
+                    suffixes.append(suffix)
+                    break
+            if pre_len and suf_len and pre_len + suf_len <= len(string):
+                string = string[pre_len:-suf_len]
+                prefixes.append(prefix)
+                suffixes.append(suffix)
+            elif pre_len:
+                string = minus_pre
+                prefixes.append(prefix)
+            elif suf_len:
+                string = minus_suf
+                suffixes.append(suffix)
+            if string in specials:
+                break
+        return prefixes + self._split_infixes(string) + suffixes[::-1]
+
+    def _merge_special_cases(self, toks, max_run=6):
+        """Re-splits runs of tokens that together spell a special case, longest runs first."""
+        if len(toks) < 2:
+            return toks
+        runs = [
+            (i, j)
+            for i in range(len(toks) - 1)
+            for j in range(i + 2, min(i + max_run, len(toks)) + 1)
+            if "".join(toks[i:j]) in self.special_cases
+        ]
+        if not runs:
+            return toks
+        chosen, taken = dict(), set()
+        for i, j in sorted(runs, key=lambda run: (run[0] - run[1], run[0])):
+            if taken.isdisjoint(range(i, j)):
+                chosen[i] = j
+                taken.update(range(i, j))
+        merged, i = list(), 0
+        while i < len(toks):
+            if i in chosen:
+                merged.extend(self.special_cases["".join(toks[i : chosen[i]])])
+                i = chosen[i]
+            else:
+                merged.append(toks[i])
+                i += 1
+        return merged
+
+    def _split_infixes(self, string):
+        if not string:
+            return []
+        if string in self.special_cases:
+            return list(self.special_cases[string])
+        if _URL_RE.match(string):
+            return [string]
+        toks, start = list(), 0
+        for match in _INFIX_RE.finditer(string):
+            if match.start() == 0:
+                continue
+            if match.start() != start:
+                toks.append(string[start : match.start()])
+            if match.start() != match.end():
+                toks.append(string[match.start() : match.end()])
+            start = match.end()
+        if string[start:]:
+            toks.append(string[start:])
+        return toks
+
+
+class Tokenizer:
+    """Tokenizes texts with the rules of fastai's Tokenizer without importing fastai.
+
+    Attributes
+    ----------
+    pre_rules : list of callable
+        The rules applied to each text before it is split into words.
+    post_rules : list of callable
+        The rules applied to the words of each text.
+    tok : WordTokenizer
+        Splits the texts into words.
+
+    """
+
+    def __init__(self, pre_rules=None, post_rules=None, special_cases=None):
+        self.pre_rules = PRE_RULES if pre_rules is None else pre_rules
+        self.post_rules = POST_RULES if post_rules is None else post_rules
+        self.tok = WordTokenizer(special_cases)
+        self.tok.add_special_cases([UNK, PAD, BOS, EOS, FLD, TK_MAJ, TK_UP, TK_REP, TK_WREP])
+
+    def process_text(self, t):
+        """Processes one text.
+
+        Parameters
+        ----------
+        t : str
+            The text to tokenize.
+
+        Returns
+        -------
+        list of str
+            The tokens of the text.
+
+        """
+        for rule in self.pre_rules:
+            t = rule(t)
+        toks = self.tok.tokenizer(t)
+        for rule in self.post_rules:
+            toks = rule(toks)
+        return toks
+
+    def process_all(self, texts):
+        """Processes a list of texts in a single pass.
+
+        Words already split for an earlier text are looked up in the word
+        cache instead of being matched against the affix patterns again.
+
+        Parameters
+        ----------
+        texts : list of str
+            The texts to tokenize.
+
+        Returns
+        -------
+        list of list of str
+            The tokens of each text.
+
+        """
+        return [self.process_text(str(t)) for t in texts]
@@ -0,0 +1,252 @@
+"""Contains implementation of the compact vocabularies that map tokens to the ids of each head.
+
+The tokens of all heads are stored once in a StringTable, a sorted table of UTF-8
+bytes with offsets. Each head holds an int32 array with its id for every token of
+the table. Both are saved in the memory-mappable format of mapped_weights, so the
+vocabularies are shared between processes and are not rebuilt at startup.
+
+"""
+import itertools
+
+import numpy as np
+
+import pandas as pd
+
+from youtoxic.app.utils.mapped_weights import read_mapped_arrays, save_mapped_arrays
+
+
+# The number of leading bytes of each token that are binary searched.
+PREFIX_BYTES = 16
+
+
+class StringTable:
+    """A sorted table of unique tokens stored as UTF-8 bytes and offsets.
+
+    Attributes
+    ----------
+    blob : ndarray
+        The uint8 bytes of all tokens, in sorted order.
+    offsets : ndarray
+        The int64 start of each token in blob, followed by the length of blob.
+    prefixes : ndarray
+        The first PREFIX_BYTES bytes of each token, used for binary search.
+
+    """
+
+    def __init__(self, blob, offsets, prefixes):
+        self.blob = blob
+        self.offsets = offsets
+        self.prefixes = prefixes
+
+    def __len__(self):
+        return len(self.prefixes)
+
+    def token(self, position):
+        """Returns the token at a position of the table."""
+        start, end = self.offsets[position], self.offsets[position + 1]
+        return self.blob[start:end].tobytes().decode("utf-8")
+
+    def find(self, tokens):
+        """Returns the position of each token in the table.
+
+        Each distinct token is looked up once, by a binary search over the
+        prefixes. Only tokens with at least PREFIX_BYTES bytes are compared in full.
+
+        Parameters
+        ----------
+        tokens : list of str
+            The tokens to look up.
+
+        Returns
+        -------
+        ndarray
+            The int64 position of each token, or -1 for unknown tokens.
+
+        """
+        if not tokens:
+            return np.zeros(0, dtype=np.int64)
+        codes, uniques = pd.factorize(np.array(tokens, dtype=object))
+        keys = [token.encode("utf-8") for token in uniques]
+        lengths = np.array([len(key) for key in keys], dtype=np.int64)
+        # Casting to the fixed width dtype of the table keeps the leading bytes.
+        prefixes = np.array(keys, dtype=self.prefixes.dtype)
+        lo = np.searchsorted(self.prefixes, prefixes, "left")
+        hi = np.searchsorted(self.prefixes, prefixes, "right")
+
+        found = np.full(len(keys), -1, dtype=np.int64)
+        matched = hi > lo
+        first = np.minimum(lo, len(self) - 1)
+        table_lengths = self.offsets[first + 1] - self.offsets[first]
+        short = matched & (lengths < PREFIX_BYTES) & (table_lengths == lengths)
+        found[short] = lo[short]
+        for i in np.flatnonzero(matched & (lengths >= PREFIX_BYTES)):
+            for position in range(lo[i], hi[i]):
+                start, end = self.offsets[position], self.offsets[position + 1]
+                if self.blob[start:end].tobytes() == keys[i]:
+                    found[i] = position
+                    break
+        return found[codes]
+
+    def lookup(self, toks):
+        """Returns the positions of the tokens of several texts.
+
+        Parameters
+        ----------
+        toks : list of list of str
+            The tokens of each text.
+
+        Returns
+        -------
+        ndarray
+            The int64 position of every token, or -1 for unknown tokens.
+        ndarray
+            The number of tokens of each text.
+
+        """
+        lengths = np.array([len(tok) for tok in toks], dtype=np.int64)
+        return self.find(list(itertools.chain.from_iterable(toks))), lengths
+
+
+class Vocabulary:
+    """The vocabulary of one head, mapping the tokens of a shared StringTable to ids.
+
+    Unknown tokens are mapped to 0 and are never added to the vocabulary.
+
+    Attributes
+    ----------
+    table : StringTable
+        The tokens shared by all heads.
+    ids : ndarray
+        The int32 id of each token of the table for this head, 0 if not in its vocabulary.
+    size : int
+        The number of ids of the head, which is the vocabulary size of its model.
+
+    """
+
+    def __init__(self, table, ids, size):
+        self.table = table
+        self.ids = ids
+        self.size = size
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, token):
+        return int(self.encode([[token]])[0][0])
+
+    def encode(self, toks):
+        """Encodes the tokens of several texts.
+
+        Parameters
+        ----------
+        toks : list of list of str
+            The tokens of each text.
+
+        Returns
+        -------
+        list of ndarray
+            The int64 token ids of each text.
+
+        """
+        return self.encode_positions(*self.table.lookup(toks))
+
+    def encode_positions(self, positions, lengths):
+        """Encodes texts from the positions of their tokens in the shared table.
+
+        This lets several heads encode the same texts with a single lookup.
+
+        Parameters
+        ----------
+        positions : ndarray
+            The int64 position of every token, or -1 for unknown tokens.
+        lengths : ndarray
+            The number of tokens of each text.
+
+        Returns
+        -------
+        list of ndarray
+            The int64 token ids of each text.
+
+        """
+        ids = np.where(positions >= 0, self.ids[positions], 0).astype(np.int64)
+        return np.split(ids, np.cumsum(lengths)[:-1])
+
+
+def select_positions(positions, lengths, keep):
+    """Selects some texts from the positions of the tokens of several texts.
+
+    Parameters
+    ----------
+    positions : ndarray
+        The int64 position of every token, see StringTable.lookup.
+    lengths : ndarray
+        The number of tokens of each text.
+    keep : list of int
+        The indices of the texts to select, in the order to return them.
+
+    Returns
+    -------
+    ndarray
+        The positions of the tokens of the selected texts.
+    ndarray
+        The number of tokens of each selected text.
+
+    """
+    starts = np.concatenate([[0], np.cumsum(lengths)])
+    if not len(keep):
+        return positions[:0], lengths[:0]
+    selected = [positions[starts[k] : starts[k + 1]] for k in keep]
+    return np.concatenate(selected), lengths[keep]
+
+
+def save_vocabularies(itos, filename):
+    """Saves the vocabularies of several heads with their tokens stored once.
+
+    Parameters
+    ----------
+    itos : dict
+        Maps each head to its list of tokens, where the index of a token is its id.
+    filename : str
+        The file to write.
+
+    """
+    tokens = sorted(set(str(token) for head_itos in itos.values() for token in head_itos))
+    keys = [token.encode("utf-8") for token in tokens]
+    offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+    np.cumsum([len(key) for key in keys], out=offsets[1:])
+    arrays = [
+        ("blob", np.frombuffer(b"".join(keys), dtype=np.uint8)),
+        ("offsets", offsets),
+        ("prefixes", np.array(keys, dtype="S{}".format(PREFIX_BYTES))),
+    ]
+
+    positions = {token: i for i, token in enumerate(tokens)}
+    for head, head_itos in itos.items():
+        ids = np.zeros(len(tokens), dtype=np.int32)
+        for i, token in enumerate(head_itos):
+            ids[positions[str(token)]] = i
+        arrays.append(("ids.{}".format(head), ids))
+    sizes = {head: len(head_itos) for head, head_itos in itos.items()}
+    save_mapped_arrays(arrays, filename, sizes=sizes)
+
+
+def load_vocabularies(filename):
+    """Maps a file written by save_vocabularies and returns the vocabulary of each head.
+
+    Parameters
+    ----------
+    filename : str
+        The vocabularies file.
+
+    Returns
+    -------
+    dict
+        Maps each head to its Vocabulary. All of them share one StringTable.
+
+    """
+    header, arrays = read_mapped_arrays(filename)
+    table = StringTable(arrays["blob"], arrays["offsets"], arrays["prefixes"])
+    return {
+        head: Vocabulary(table, arrays["ids.{}".format(head)], size)
+        for head, size in header["sizes"].items()
+    }